@@ -0,0 +1,81 @@
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+
+from identity.passport import passport
+from portal.leaderboard import compute_leaderboard
+from portal.badge_history import history
+from portal.rss import feeds
+from payments.analytics import analyze
+
+router = APIRouter(prefix="/portal", tags=["portal"])
+
+FEED_MAX_AGE = 30  # seconds clients may reuse a feed before revalidating
+
+def _not_modified(request: Request, etag: str, last_modified: Optional[float]) -> bool:
+    """Whether a conditional GET can be answered with 304."""
+    match = request.headers.get("if-none-match")
+    if match is not None:
+        return etag in [t.strip() for t in match.split(",")] or match.strip() == "*"
+    since = request.headers.get("if-modified-since")
+    if since and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _cache_headers(etag: str, last_modified: Optional[float]) -> dict:
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={FEED_MAX_AGE}"}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+@router.get("/leaderboard")
+def leaderboard(by: str = "queries", limit: int = Query(10, ge=1, le=100)):
+    """
+    Most active agents, ranked by ``by`` (queries, swarm_queries,
+    ingests, chunks or confidence). Wallet totals are left out; see
+    /admin/leaderboard.
+    """
+    try:
+        return {"by": by, "agents": compute_leaderboard(by, limit)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/analytics")
+def platform_analytics(hours: int = Query(24, ge=1, le=24 * 30)):
+    return analyze(None, hours)
+
+@router.get("/agents/{agent_id}/analytics")
+def agent_analytics(agent_id: str, token: str, hours: int = Query(24, ge=1, le=24 * 30)):
+    """An agent's own usage and spend; needs its passport."""
+    if not passport.verify(agent_id, token):
+        raise HTTPException(status_code=401, detail="invalid_passport")
+    report = analyze(agent_id, hours)
+    if report["totals"] is None:
+        raise HTTPException(status_code=404, detail="agent_not_found")
+    return report
+
+@router.get("/rss")
+def rss(request: Request, agent: Optional[str] = None):
+    """RSS feed of badge awards (one agent's with ``agent``), newest first."""
+    feed = feeds.get(agent)
+    headers = _cache_headers(feed["etag"], feed["last_modified"])
+    if _not_modified(request, feed["etag"], feed["last_modified"]):
+        return Response(status_code=304, headers=headers)
+    return Response(feed["body"], media_type="application/rss+xml", headers=headers)
+
+@router.get("/badges")
+def badges(request: Request, agent: Optional[str] = None, since: Optional[float] = None,
+           limit: int = Query(100, ge=1, le=1000)):
+    """Badge history, oldest first; ``since`` (unix time) returns only newer entries."""
+    count, last = history.head(agent)
+    etag = f"\"{agent or '*'}-{count}-{since}-{limit}\""
+    headers = _cache_headers(etag, last)
+    if _not_modified(request, etag, last):
+        return Response(status_code=304, headers=headers)
+    entries = history.timeline(agent, since=since, limit=limit, upto=count)
+    return JSONResponse({"agent": agent, "count": len(entries), "badges": entries}, headers=headers)
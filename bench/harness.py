@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for ingest and query throughput.
+
+Generates deterministic synthetic corpora, drives SimpleRetriever,
+the tenant manager and the FastAPI app in-process, and reports ingest
+chunks/s, query p50/p99 latency and memory per tenant across corpus
+sizes and tenant counts, plus snapshot restore time. Embedding and reranking use the offline
+hashing/overlap backends from core.backends, so no network access or
+model download is needed.
+
+Usage:
+    python -m bench.harness --sizes 1000,10000,100000 --tenants 1,8
+    python -m bench.harness --app --json bench_output.json
+    python -m bench.harness --sizes 10000 --tenants 1 --app --encode-ms 5
+    python -m bench.harness --sizes 0 --restore 1000000
+    python -m bench.harness --sizes 100000 --tenants 1 --filters
+    python -m bench.harness --sizes 0 --storage 1000000
+    python -m bench.harness --sizes 200000 --tenants 1 --embed-workers 1,2,4,8,16,32
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO not in sys.path:
+    sys.path.insert(0, REPO)
+
+CHUNK_SIZE = 300
+
+def make_vocab(size: int = 5000, seed: int = 7) -> List[str]:
+    """Deterministic pseudo-word vocabulary."""
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+def make_corpus(n_chunks: int, vocab: List[str], seed: int) -> str:
+    """
+    Generate text that chunk_text splits into exactly n_chunks chunks.
+
+    Word frequencies follow a Zipf-like distribution so queries hit some
+    chunks much more than others, as with real documents.
+    """
+    rng = random.Random(seed)
+    weights = [1.0 / (i + 1) for i in range(len(vocab))]
+    parts, length, target = [], 0, n_chunks * CHUNK_SIZE
+    while length < target:
+        words = rng.choices(vocab, weights=weights, k=64)
+        sentence = " ".join(words) + ". "
+        parts.append(sentence)
+        length += len(sentence)
+    return "".join(parts)[:target]
+
+def make_queries(n: int, vocab: List[str], seed: int) -> List[str]:
+    rng = random.Random(seed)
+    head = vocab[:500]
+    return [" ".join(rng.choices(head, k=rng.randint(3, 8))) for _ in range(n)]
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+def _latency_summary(samples: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0
+    }
+
+class SlowEmbedder:
+    """
+    Offline embedder that also sleeps per call, standing in for a model
+    forward pass (which, like sleep, releases the GIL).
+    """
+
+    def __init__(self, inner, encode_ms: float):
+        self.inner = inner
+        self.encode_ms = encode_ms
+
+    def encode(self, texts, **kwargs):
+        time.sleep(self.encode_ms / 1000.0)
+        return self.inner.encode(texts, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+def _server_means(before: Dict[str, Any], after: Dict[str, Any], endpoint: str) -> Dict[str, float]:
+    """
+    Mean in-handler time and per-stage means for one endpoint between two
+    metrics snapshots (excludes the test client's own overhead).
+    """
+    sums: Dict[str, List[float]] = {}
+    for key, h in after["histograms"].items():
+        labels = h["labels"]
+        if labels.get("endpoint") != endpoint:
+            continue
+        name = "request" if h["name"] == "request_seconds" else labels.get("stage")
+        if name is None:
+            continue
+        prev = before["histograms"].get(key, {"sum": 0.0, "count": 0})
+        acc = sums.setdefault(name, [0.0, 0])
+        acc[0] += h["sum"] - prev["sum"]
+        acc[1] += h["count"] - prev["count"]
+    return {name: round(total / n * 1000, 3) for name, (total, n) in sorted(sums.items()) if n}
+
+def offline_factory(encode_ms: float = 0.0):
+    from core.backends import backends
+    from core.retriever import SimpleRetriever
+    embedder, reranker = backends.embedder("hashing"), backends.reranker("overlap")
+    if encode_ms > 0:
+        embedder = SlowEmbedder(embedder, encode_ms)
+    return lambda _id: SimpleRetriever(model=embedder, reranker=reranker)
+
+# ─── Library-level benchmarks ────────────────────────────────────────────
+
+def bench_retriever(size: int, n_tenants: int, n_queries: int, seed: int) -> Dict[str, Any]:
+    """
+    Ingest ``size`` chunks into each of ``n_tenants`` tenants and query them.
+
+    Returns:
+        Result row with ingest, tenant creation, query and memory figures
+    """
+    from core.retriever import chunk_text
+    from tenants.manager import Manager
+
+    vocab = make_vocab(seed=seed)
+    chunks = chunk_text(make_corpus(size, vocab, seed))
+    queries = make_queries(n_queries, vocab, seed + 1)
+    factory = offline_factory()
+
+    # Memory pass (tracemalloc slows allocation, so it is not timed)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    mem_tm = Manager(factory=factory)
+    for t in range(n_tenants):
+        mem_tm.get(f"bench-{t}").retriever.add_documents(chunks, source_name=f"doc-{t}.txt")
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    mem_bytes = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    del mem_tm
+    gc.collect()
+
+    # Timed pass
+    tm = Manager(factory=factory)
+    get_times, ingest_seconds = [], 0.0
+    for t in range(n_tenants):
+        start = time.perf_counter()
+        tenant = tm.get(f"bench-{t}")
+        get_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        tenant.retriever.add_documents(chunks, source_name=f"doc-{t}.txt")
+        ingest_seconds += time.perf_counter() - start
+
+    hot_get = []
+    for i in range(max(n_queries, 100)):
+        start = time.perf_counter()
+        tm.get(f"bench-{i % n_tenants}")
+        hot_get.append(time.perf_counter() - start)
+
+    samples = []
+    for i, q in enumerate(queries):
+        retriever = tm.get(f"bench-{i % n_tenants}").retriever
+        start = time.perf_counter()
+        retriever.search(q)
+        samples.append(time.perf_counter() - start)
+
+    total_chunks = len(chunks) * n_tenants
+    return {
+        "bench": "retriever",
+        "chunks_per_tenant": len(chunks),
+        "tenants": n_tenants,
+        "ingest_chunks_per_s": round(total_chunks / ingest_seconds, 1) if ingest_seconds else 0.0,
+        "tenant_create_ms": round(sum(get_times) / len(get_times) * 1000, 3),
+        "tenant_get_us": round(percentile(hot_get, 50) * 1e6, 3),
+        "query": _latency_summary(samples),
+        "mem_per_tenant_mb": round(mem_bytes / n_tenants / 2**20, 2)
+    }
+
+def bench_restore(size: int, n_queries: int, seed: int, dim: int = 384) -> Dict[str, Any]:
+    """
+    Snapshot a ``size``-chunk tenant and time restoring it in a fresh manager.
+
+    Embeddings are random unit vectors written straight into the index so
+    large sizes measure snapshot I/O rather than embedding throughput.
+
+    Returns:
+        Result row with save/restore times, snapshot size and first-query latency
+    """
+    import numpy as np
+    from core.chunkstore import ChunkStore
+    from core.metadata import MetadataIndex
+    from core.retriever import chunk_text
+    from tenants.manager import Manager
+    from tenants.snapshot import SnapshotStore
+
+    vocab = make_vocab(seed=seed)
+    base = chunk_text(make_corpus(min(size, 10000), vocab, seed))
+    chunks = [base[i % len(base)] for i in range(size)]
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((size, dim), dtype=np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+
+    factory = offline_factory()
+    store = SnapshotStore(root=tempfile.mkdtemp(prefix="snapshots-"))
+    tenant = Manager(factory=factory, store=store).get("bench-restore")
+    meta = MetadataIndex()
+    meta.append({"source": "doc.txt"}, len(chunks))
+    tenant.retriever.restore(ChunkStore.from_texts(chunks), meta, emb, 1)
+
+    start = time.perf_counter()
+    store.save(tenant)
+    save_seconds = time.perf_counter() - start
+    disk = sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(store.root) for f in files
+    )
+    del tenant, chunks, emb
+    gc.collect()
+
+    fresh = Manager(factory=factory, store=SnapshotStore(root=store.root))
+    start = time.perf_counter()
+    restored = fresh.get("bench-restore")
+    restore_seconds = time.perf_counter() - start
+
+    queries = make_queries(n_queries, vocab, seed + 1)
+    start = time.perf_counter()
+    restored.retriever.search(queries[0])
+    first_query = time.perf_counter() - start
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        restored.retriever.search(q)
+        samples.append(time.perf_counter() - start)
+
+    return {
+        "bench": "restore",
+        "chunks_per_tenant": len(restored.retriever.docs),
+        "tenants": 1,
+        "save_s": round(save_seconds, 3),
+        "restore_s": round(restore_seconds, 3),
+        "snapshot_mb": round(disk / 2**20, 1),
+        "first_query_ms": round(first_query * 1000, 3),
+        "query": _latency_summary(samples)
+    }
+
+def bench_filters(size: int, n_queries: int, seed: int, n_docs: int = 100) -> Dict[str, Any]:
+    """
+    Compare unscoped searches with metadata-scoped ones on one tenant.
+
+    The corpus is ingested as ``n_docs`` documents with tags so that a
+    source filter selects 1% of rows, ``group-*`` 10% and ``half-*`` 50%.
+
+    Returns:
+        Result row with query latency per scope
+    """
+    from core.retriever import chunk_text
+
+    vocab = make_vocab(seed=seed)
+    chunks = chunk_text(make_corpus(size, vocab, seed))
+    queries = make_queries(n_queries, vocab, seed + 1)
+    retriever = offline_factory()("bench-filters")
+    per_doc = max(1, len(chunks) // n_docs)
+    for d in range(n_docs):
+        retriever.add_documents(
+            chunks[d * per_doc:(d + 1) * per_doc],
+            source_name=f"doc-{d}.txt",
+            metadata={"tags": [f"group-{d % 10}", f"half-{d % 2}"], "timestamp": float(d)}
+        )
+
+    scopes = {
+        "unscoped": None,
+        "source_1pct": {"source": ["doc-7.txt"]},
+        "tag_10pct": {"tags": ["group-3"]},
+        "tag_50pct": {"tags": ["half-1"]},
+        "range_20pct": {"after": 10.0, "before": 29.0},
+    }
+    out = {}
+    for name, filters in scopes.items():
+        samples = []
+        for q in queries:
+            start = time.perf_counter()
+            retriever.search(q, filters=filters)
+            samples.append(time.perf_counter() - start)
+        out[name] = _latency_summary(samples)
+
+    return {
+        "bench": "filters",
+        "chunks_per_tenant": len(retriever.docs),
+        "tenants": 1,
+        "query": out["unscoped"],
+        "scopes": out
+    }
+
+def bench_storage(size: int, seed: int, chunks_per_doc: int = 100) -> Dict[str, Any]:
+    """
+    Memory of ``size`` chunks as lists of str/dict vs ChunkStore + MetadataIndex.
+
+    Embeddings are identical in both layouts and left out.
+
+    Returns:
+        Result row with bytes per chunk for each layout
+    """
+    from core.chunkstore import ChunkStore
+    from core.metadata import MetadataIndex
+    from core.retriever import chunk_text
+
+    base = chunk_text(make_corpus(10000, make_vocab(seed=seed), seed))
+    # distinct string objects, as chunks of real documents would be
+    make = lambda i: f"{i:08d}" + base[i % len(base)][8:]
+
+    def measure(build):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        kept = build()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        return kept, sum(s.size_diff for s in after.compare_to(before, "filename"))
+
+    def legacy():
+        docs = [make(i) for i in range(size)]
+        meta = [{"source": f"doc-{i // chunks_per_doc}.txt"} for i in range(size)]
+        return docs, meta
+
+    def compact():
+        docs, meta = ChunkStore(), MetadataIndex()
+        for start in range(0, size, chunks_per_doc):
+            end = min(start + chunks_per_doc, size)
+            meta.append({"source": f"doc-{start // chunks_per_doc}.txt"}, end - start)
+            docs.extend([make(i) for i in range(start, end)])
+        return docs, meta
+
+    kept, legacy_bytes = measure(legacy)
+    del kept
+    kept, compact_bytes = measure(compact)
+
+    samples = []
+    rng = random.Random(seed)
+    for _ in range(1000):
+        rows = [rng.randrange(size) for _ in range(5)]
+        start = time.perf_counter()
+        [kept[0][r] for r in rows], [kept[1][r] for r in rows]
+        samples.append(time.perf_counter() - start)
+
+    return {
+        "bench": "storage",
+        "chunks_per_tenant": size,
+        "tenants": 1,
+        "legacy_mb": round(legacy_bytes / 2**20, 1),
+        "compact_mb": round(compact_bytes / 2**20, 1),
+        "legacy_bytes_per_chunk": round(legacy_bytes / size, 1),
+        "compact_bytes_per_chunk": round(compact_bytes / size, 1),
+        "top5_materialize_us": round(percentile(samples, 50) * 1e6, 2)
+    }
+
+def bench_embed(size: int, workers: List[int], seed: int, batch: int) -> List[Dict[str, Any]]:
+    """
+    Ingest embedding throughput in-process vs across EmbedPool workers.
+
+    Returns:
+        One result row per worker count (0 = in-process)
+    """
+    import numpy as np
+    from core.backends import backends
+    from core.embed_pool import EmbedPool
+    from core.retriever import chunk_text
+
+    chunks = chunk_text(make_corpus(size, make_vocab(seed=seed), seed))
+    embedder = backends.embedder("hashing")
+
+    start = time.perf_counter()
+    expected = embedder.encode(chunks)
+    base_rate = len(chunks) / (time.perf_counter() - start)
+
+    out = [{"bench": "embed", "chunks_per_tenant": len(chunks), "workers": 0,
+            "chunks_per_s": round(base_rate, 1), "speedup": 1.0}]
+    for w in workers:
+        pool = EmbedPool(workers=w, batch=batch)
+        pool.encode(embedder, chunks[:w * batch])  # start the workers
+        start = time.perf_counter()
+        got = pool.encode(embedder, chunks)
+        rate = len(chunks) / (time.perf_counter() - start)
+        pool.shutdown()
+        if not np.allclose(got, expected):
+            raise AssertionError("parallel embeddings out of order")
+        out.append({"bench": "embed", "chunks_per_tenant": len(chunks), "workers": w,
+                    "chunks_per_s": round(rate, 1), "speedup": round(rate / base_rate, 2),
+                    "per_core_efficiency": round(rate / base_rate / w, 2)})
+    return out
+
+# ─── In-process FastAPI benchmarks ───────────────────────────────────────
+
+def bench_app(size: int, n_queries: int, seed: int, batch: int = 50, encode_ms: float = 0.0) -> Dict[str, Any]:
+    """
+    Drive /ingest, /query and /query/batch through the ASGI app in-process.
+
+    ``encode_ms`` adds simulated model latency to every embedding call, so
+    request pipelining can be measured without downloading a model.
+
+    Returns:
+        Result row with ingest throughput and endpoint latencies
+    """
+    try:
+        from fastapi.testclient import TestClient
+    except Exception as e:
+        return {"bench": "app", "skipped": f"TestClient unavailable: {e}"}
+
+    import main
+    from core.subscription import subs
+    from identity.passport import passport
+
+    main.tm.factory = offline_factory(encode_ms)
+    client = TestClient(main.app)
+
+    vocab = make_vocab(seed=seed)
+    agent = f"bench-app-{size}"
+    token = passport.issue(agent)
+    subs.activate(agent, "enterprise")  # no upload quota or plan rate limit in the way
+    body = make_corpus(size, vocab, seed).encode("utf-8")
+
+    start = time.perf_counter()
+    r = client.post(
+        "/ingest",
+        params={"agent_id": agent, "token": token},
+        files={"file": ("bench.txt", body, "text/plain")}
+    )
+    ingest_seconds = time.perf_counter() - start
+    r.raise_for_status()
+    chunks = r.json()["chunks"]
+
+    queries = make_queries(n_queries, vocab, seed + 1)
+    samples = []
+    before = main.metrics.snapshot()
+    for q in queries:
+        start = time.perf_counter()
+        r = client.post("/query", json={"text": q, "agent_id": agent, "token": token})
+        samples.append(time.perf_counter() - start)
+        r.raise_for_status()
+    server = _server_means(before, main.metrics.snapshot(), "/query")
+
+    batch_samples = []
+    for i in range(0, len(queries), batch):
+        start = time.perf_counter()
+        r = client.post("/query/batch", json={
+            "texts": queries[i:i + batch], "agent_id": agent, "token": token
+        })
+        batch_samples.append((time.perf_counter() - start) / len(queries[i:i + batch]))
+        r.raise_for_status()
+
+    return {
+        "bench": "app",
+        "chunks_per_tenant": chunks,
+        "tenants": 1,
+        "encode_ms": encode_ms,
+        "ingest_chunks_per_s": round(chunks / ingest_seconds, 1),
+        "query": _latency_summary(samples),
+        "query_server_ms": server,
+        "batch_query_per_item": _latency_summary(batch_samples)
+    }
+
+# ─── CLI ─────────────────────────────────────────────────────────────────
+
+def _print_row(row: Dict[str, Any]):
+    if "skipped" in row:
+        print(f"{row['bench']:<10} skipped: {row['skipped']}")
+        return
+    if row["bench"] == "embed":
+        line = (f"{row['bench']:<10} chunks={row['chunks_per_tenant']:<8} workers={row['workers']:<3} "
+                f"{row['chunks_per_s']:>10.1f} ch/s  speedup={row['speedup']:.2f}x")
+        if "per_core_efficiency" in row:
+            line += f"  per-core={row['per_core_efficiency']:.2f}"
+        print(line)
+        return
+    if row["bench"] == "storage":
+        print(
+            f"{row['bench']:<10} chunks={row['chunks_per_tenant']:<8} "
+            f"lists={row['legacy_mb']}MB ({row['legacy_bytes_per_chunk']} B/chunk)  "
+            f"compact={row['compact_mb']}MB ({row['compact_bytes_per_chunk']} B/chunk)  "
+            f"top-5 materialize p50={row['top5_materialize_us']}us"
+        )
+        return
+    q = row["query"]
+    if row["bench"] == "filters":
+        print(f"{row['bench']:<10} chunks={row['chunks_per_tenant']:<8} " + "  ".join(
+            f"{name} p50={lat['p50_ms']:.3f}ms" for name, lat in row["scopes"].items()
+        ))
+        return
+    if row["bench"] == "restore":
+        print(
+            f"{row['bench']:<10} chunks={row['chunks_per_tenant']:<8} save={row['save_s']:.3f}s "
+            f"restore={row['restore_s']:.3f}s size={row['snapshot_mb']}MB "
+            f"first query={row['first_query_ms']:.3f}ms p50={q['p50_ms']:.3f}ms"
+        )
+        return
+    line = (
+        f"{row['bench']:<10} chunks={row['chunks_per_tenant']:<8} tenants={row['tenants']:<4} "
+        f"ingest={row['ingest_chunks_per_s']:>10.1f} ch/s  "
+        f"query p50={q['p50_ms']:>8.3f}ms p99={q['p99_ms']:>8.3f}ms"
+    )
+    if "mem_per_tenant_mb" in row:
+        line += f"  mem/tenant={row['mem_per_tenant_mb']:>8.2f}MB"
+    if "query_server_ms" in row:
+        line += f"  in-handler mean={row['query_server_ms'].get('request', 0.0):.3f}ms"
+    if "batch_query_per_item" in row:
+        line += f"  batch p50/item={row['batch_query_per_item']['p50_ms']:.3f}ms"
+    print(line)
+
+def main(argv: List[str] = None) -> List[Dict[str, Any]]:
+    parser = argparse.ArgumentParser(description="Instant-RAG offline benchmark")
+    parser.add_argument("--sizes", default="1000,10000", help="chunks per tenant, comma separated")
+    parser.add_argument("--tenants", default="1,4", help="tenant counts, comma separated")
+    parser.add_argument("--queries", type=int, default=200, help="queries per configuration")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--app", action="store_true", help="also benchmark the FastAPI app in-process")
+    parser.add_argument("--encode-ms", type=float, default=0.0,
+                        help="simulated model latency per embedding call in --app")
+    parser.add_argument("--filters", action="store_true", help="also benchmark metadata-scoped queries")
+    parser.add_argument("--embed-workers", help="embedding pool worker counts to compare, comma separated")
+    parser.add_argument("--embed-batch", type=int, default=256, help="chunks per embedding task")
+    parser.add_argument("--storage", help="chunk storage memory comparison sizes, comma separated (e.g. 1000000)")
+    parser.add_argument("--restore", help="snapshot restore sizes in chunks, comma separated (e.g. 1000000)")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    out_path = os.path.abspath(args.json) if args.json else None
+
+    # App modules write audit logs, registry and metrics relative to cwd
+    os.chdir(tempfile.mkdtemp(prefix="instant-rag-bench-"))
+    os.makedirs("static/.well-known", exist_ok=True)
+
+    rows = []
+    for size in [int(s) for s in args.sizes.split(",") if int(s) > 0]:
+        for n_tenants in [int(t) for t in args.tenants.split(",")]:
+            row = bench_retriever(size, n_tenants, args.queries, args.seed)
+            _print_row(row)
+            rows.append(row)
+        if args.embed_workers:
+            for row in bench_embed(size, [int(w) for w in args.embed_workers.split(",")], args.seed, args.embed_batch):
+                _print_row(row)
+                rows.append(row)
+        if args.filters:
+            row = bench_filters(size, args.queries, args.seed)
+            _print_row(row)
+            rows.append(row)
+        if args.app:
+            row = bench_app(size, args.queries, args.seed, encode_ms=args.encode_ms)
+            _print_row(row)
+            rows.append(row)
+    for size in [int(s) for s in (args.storage or "").split(",") if s]:
+        row = bench_storage(size, args.seed)
+        _print_row(row)
+        rows.append(row)
+    for size in [int(s) for s in (args.restore or "").split(",") if s]:
+        row = bench_restore(size, args.queries, args.seed)
+        _print_row(row)
+        rows.append(row)
+
+    if out_path:
+        with open(out_path, "w") as f:
+            json.dump(rows, f, indent=2)
+    return rows
+
+if __name__ == "__main__":
+    main()
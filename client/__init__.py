@@ -0,0 +1,3 @@
+from client.sdk import MAX_BATCH, AsyncInstantRAG, InstantRAG, InstantRAGError
+
+__all__ = ["InstantRAG", "AsyncInstantRAG", "InstantRAGError", "MAX_BATCH"]
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Load generator for a running Instant-RAG server.
+
+Drives the server over HTTP through AsyncInstantRAG: a fixed number of
+workers issue queries in a closed loop (or at a fixed rate with
+--rate) for --duration seconds, and the run reports throughput,
+p50/p95/p99 latency and errors by status. Queries are built from the
+same synthetic vocabulary as bench.harness; --seed-docs first ingests
+a synthetic corpus so queries have something to hit.
+
+Usage:
+    python -m client.loadgen --url http://localhost:8000 --agent bench --token $TOKEN
+    python -m client.loadgen --mode batch --concurrency 64 --duration 60
+    python -m client.loadgen --mode swarm --rate 20
+    python -m client.loadgen --mode ingest --file big.txt --concurrency 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO not in sys.path:
+    sys.path.insert(0, REPO)
+
+from bench.harness import make_corpus, make_queries, make_vocab, percentile
+from client.sdk import AsyncInstantRAG, InstantRAGError
+
+MODES = ("query", "batch", "swarm", "ingest")
+
+async def _one(rag: AsyncInstantRAG, mode: str, args, query: str, n: int):
+    if mode == "query":
+        await rag.query(query)
+    elif mode == "batch":
+        await rag.query_many([query] * args.batch)
+    elif mode == "swarm":
+        await rag.swarm(query, agents=args.agents)
+    else:
+        await rag.ingest_file(args.file, filename=f"loadgen-{n}.txt", replace=True)
+
+async def run(args) -> Dict[str, Any]:
+    """
+    Run one load test.
+
+    Returns:
+        Summary dictionary (requests, ok, errors, rps, latency percentiles)
+    """
+    vocab = make_vocab(seed=args.seed)
+    queries = make_queries(1000, vocab, args.seed)
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    counter = [0]
+
+    async with AsyncInstantRAG(
+        args.url, args.agent, args.token, batch_window=args.batch_window,
+        max_concurrency=args.concurrency, max_connections=args.concurrency,
+        timeout=args.timeout, retries=args.retries
+    ) as rag:
+        for i in range(args.seed_docs):
+            await rag.ingest(make_corpus(args.seed_chunks, vocab, args.seed + i),
+                             f"loadgen-seed-{i}.txt", replace=True)
+
+        deadline = time.perf_counter() + args.duration
+        interval = args.concurrency / args.rate if args.rate else 0.0
+
+        async def worker(w: int):
+            next_at = time.perf_counter() + (interval * w / args.concurrency if interval else 0.0)
+            while True:
+                if interval:
+                    await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                    next_at += interval
+                if time.perf_counter() >= deadline:
+                    return
+                n = counter[0]
+                counter[0] += 1
+                start = time.perf_counter()
+                try:
+                    await _one(rag, args.mode, args, queries[n % len(queries)], n)
+                    latencies.append(time.perf_counter() - start)
+                except InstantRAGError as e:
+                    errors[str(e.status or "connection")] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    per_request = args.batch if args.mode == "batch" else 1
+    return {
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": counter[0],
+        "ok": len(latencies),
+        "errors": dict(errors),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "queries_per_s": round(len(latencies) * per_request / elapsed, 1) if elapsed and args.mode != "ingest" else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2)
+    }
+
+def main(argv: List[str] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Instant-RAG load generator")
+    parser.add_argument("--url", default=os.getenv("INSTANT_RAG_URL", "http://localhost:8000"))
+    parser.add_argument("--agent", default=os.getenv("INSTANT_RAG_AGENT", "loadgen"))
+    parser.add_argument("--token", default=os.getenv("INSTANT_RAG_TOKEN", ""))
+    parser.add_argument("--mode", choices=MODES, default="query")
+    parser.add_argument("--concurrency", type=int, default=16, help="workers (and pooled connections)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--rate", type=float, default=0.0, help="total requests/s; 0 runs closed-loop")
+    parser.add_argument("--batch", type=int, default=50, help="questions per request in batch mode")
+    parser.add_argument("--batch-window", type=float, default=0.0,
+                        help="client-side coalescing window for query mode (seconds)")
+    parser.add_argument("--agents", type=int, default=3, help="perspectives in swarm mode")
+    parser.add_argument("--file", help="file uploaded in ingest mode")
+    parser.add_argument("--seed-docs", type=int, default=0, help="synthetic documents to ingest first")
+    parser.add_argument("--seed-chunks", type=int, default=200, help="chunks per synthetic document")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--retries", type=int, default=0, help="client retries (0 shows raw errors)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", help="write the summary to this file")
+    args = parser.parse_args(argv)
+    if args.mode == "ingest" and not args.file:
+        parser.error("--mode ingest needs --file")
+
+    summary = asyncio.run(run(args))
+    print(json.dumps(summary, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import httpx
+
+MAX_BATCH = 200  # server limit for /query/batch
+RETRY_STATUSES = (502, 503, 504)
+# /query/batch errors that may come from one question or from the batch's
+# size rather than from every question in it
+BATCH_ONLY_STATUSES = (422, 429)
+
+class InstantRAGError(Exception):
+    """
+    Error response from the server (or a request that kept failing).
+
+    Attributes:
+        status: HTTP status, or None for connection errors
+        detail: Server error code (e.g. 'rate_limited', 'overloaded')
+        retry_after: Seconds the server asked us to wait, if any
+    """
+
+    def __init__(self, status: Optional[int], detail: str, retry_after: Optional[float] = None):
+        super().__init__(f"{status}: {detail}" if status else detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+def _error(response: httpx.Response) -> InstantRAGError:
+    try:
+        detail = response.json().get("detail", response.text)
+    except ValueError:
+        detail = response.text
+    retry_after = response.headers.get("retry-after")
+    try:
+        retry_after = float(retry_after) if retry_after is not None else None
+    except ValueError:
+        retry_after = None
+    return InstantRAGError(response.status_code, str(detail), retry_after)
+
+def _delay(attempt: int, base: float, cap: float, retry_after: Optional[float]) -> float:
+    """Full-jitter exponential backoff; a Retry-After header sets the floor."""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay += retry_after
+    return delay
+
+def _filters(source=None, tags=None, after=None, before=None) -> Optional[Dict[str, Any]]:
+    f = {"source": [source] if isinstance(source, str) else source,
+         "tags": [tags] if isinstance(tags, str) else tags,
+         "after": after, "before": before}
+    f = {k: v for k, v in f.items() if v is not None}
+    return f or None
+
+class _Base:
+    """
+    Settings and request building shared by the sync and async clients.
+
+    Args:
+        base_url: Server URL, e.g. 'http://localhost:8000'
+        agent_id: Agent identifier
+        token: Passport token
+        timeout: Seconds per request
+        retries: Extra attempts for connection errors and 502/503/504
+        backoff: Base of the exponential backoff in seconds
+        max_backoff: Upper bound of one backoff step
+        max_connections: Size of the keep-alive connection pool
+        transport: Optional httpx transport, e.g. httpx.ASGITransport to
+            talk to an in-process app
+    """
+
+    def __init__(self, base_url: str, agent_id: str, token: str, timeout: float = 30.0,
+                 retries: int = 3, backoff: float = 0.2, max_backoff: float = 10.0,
+                 max_connections: int = 20, transport=None):
+        self.base_url = base_url.rstrip("/")
+        self.agent_id = agent_id
+        self.token = token
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self.transport = transport
+
+    @property
+    def _auth(self) -> Dict[str, str]:
+        return {"agent_id": self.agent_id, "token": self.token}
+
+    def _query_body(self, text: str, filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        body = {"text": text, **self._auth}
+        if filters:
+            body["filters"] = filters
+        return body
+
+    def _ingest_params(self, replace: bool, tags: Optional[Sequence[str]], timestamp: Optional[float],
+                       metadata: Optional[str]) -> Dict[str, Any]:
+        params = {**self._auth, "replace": str(replace).lower()}
+        if tags:
+            params["tags"] = ",".join(tags)
+        if timestamp is not None:
+            params["timestamp"] = timestamp
+        if metadata is not None:
+            params["metadata"] = metadata
+        return params
+
+    def _retryable(self, attempt: int, status: Optional[int], idempotent: bool) -> bool:
+        if attempt >= self.retries:
+            return False
+        if status is None:
+            return True
+        # 503 is admission control shedding before any work was done; safe to resend
+        return status == 503 or (idempotent and status in RETRY_STATUSES)
+
+class InstantRAG(_Base):
+    """
+    Synchronous client on one pooled keep-alive connection pool.
+
+    Safe to share between threads. ``query_many`` sends questions in
+    batches of up to MAX_BATCH through /query/batch.
+
+    Example:
+        with InstantRAG("http://localhost:8000", "agent-1", token) as rag:
+            rag.ingest_file("notes.txt")
+            print(rag.query("what did we decide?")["answer"])
+    """
+
+    def __init__(self, base_url: str, agent_id: str, token: str, **kwargs):
+        super().__init__(base_url, agent_id, token, **kwargs)
+        self._http = httpx.Client(base_url=self.base_url, timeout=self.timeout, limits=self.limits,
+                                  transport=self.transport)
+
+    def __enter__(self) -> "InstantRAG":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._http.close()
+
+    def _request(self, method: str, path: str, idempotent: bool = True,
+                 build: Callable[[], Dict[str, Any]] = dict, **kwargs) -> Any:
+        attempt = 0
+        while True:
+            try:
+                response = self._http.request(method, path, **build(), **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                if not self._retryable(attempt, None, True):
+                    raise InstantRAGError(None, f"connection failed: {e}")
+                retry_after = None
+            except httpx.TransportError as e:
+                # the request may have reached the server; only resend reads
+                if not idempotent or not self._retryable(attempt, None, True):
+                    raise InstantRAGError(None, f"request failed: {e}")
+                retry_after = None
+            else:
+                if response.is_success:
+                    return response.json()
+                err = _error(response)
+                if not self._retryable(attempt, response.status_code, idempotent):
+                    raise err
+                retry_after = err.retry_after
+            time.sleep(_delay(attempt, self.backoff, self.max_backoff, retry_after))
+            attempt += 1
+
+    # ─── Queries ─────────────────────────────────────────────────────────
+
+    def query(self, text: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Ask one question.
+
+        Args:
+            text: Question
+            filters: Optional scope, e.g. {"source": ["a.txt"], "tags": ["x"]}
+
+        Returns:
+            Answer packet (answer, citations, confidence, explanation)
+        """
+        return self._request("POST", "/query", json=self._query_body(text, filters))
+
+    def query_many(self, texts: Sequence[str], filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Ask many questions through /query/batch, MAX_BATCH per request.
+
+        Returns:
+            One packet per question, in order; blocked questions have an 'error' key
+        """
+        out: List[Dict[str, Any]] = []
+        for i in range(0, len(texts), MAX_BATCH):
+            body = {"texts": list(texts[i:i + MAX_BATCH]), **self._auth}
+            if filters:
+                body["filters"] = filters
+            out.extend(self._request("POST", "/query/batch", json=body)["results"])
+        return out
+
+    def swarm(self, text: str, agents: int = 3, style: Optional[str] = None,
+              filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Run a swarm query with ``agents`` perspectives."""
+        body = {**self._query_body(text, filters), "agents": agents}
+        if style:
+            body["style"] = style
+        return self._request("POST", "/swarm/query", json=body)
+
+    # ─── Documents ───────────────────────────────────────────────────────
+
+    def ingest(self, text: Union[str, bytes], filename: str, replace: bool = False,
+               tags: Optional[Sequence[str]] = None, timestamp: Optional[float] = None,
+               metadata: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Index in-memory text as ``filename``.
+
+        Returns:
+            Server response with the chunk count
+        """
+        data = text.encode("utf-8") if isinstance(text, str) else text
+        return self._request(
+            "POST", "/ingest", idempotent=replace,
+            params=self._ingest_params(replace, tags, timestamp, metadata),
+            files={"file": (filename, data, "text/plain")}
+        )
+
+    def ingest_file(self, path: str, filename: Optional[str] = None, replace: bool = False,
+                    tags: Optional[Sequence[str]] = None, timestamp: Optional[float] = None,
+                    metadata: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Upload a file, streaming it from disk in chunks.
+
+        The file is reopened for every attempt, so retries resend it from
+        the start. Uploads are only resent after a failure that cannot
+        have indexed them (connection refused, 503), or with ``replace``.
+
+        Returns:
+            Server response with the chunk count
+        """
+        name = filename or os.path.basename(path)
+        handles = []
+
+        def build():
+            f = open(path, "rb")
+            handles.append(f)
+            return {"files": {"file": (name, f, "text/plain")}}
+
+        try:
+            return self._request(
+                "POST", "/ingest", idempotent=replace, build=build,
+                params=self._ingest_params(replace, tags, timestamp, metadata)
+            )
+        finally:
+            for f in handles:
+                f.close()
+
+    def delete_document(self, source: str) -> Dict[str, Any]:
+        return self._request("DELETE", "/documents", params={**self._auth, "source": source})
+
+    def documents(self) -> Dict[str, int]:
+        return self._request("GET", "/documents", params=self._auth)["documents"]
+
+class AsyncInstantRAG(_Base):
+    """
+    Asyncio client with automatic batching and bounded concurrency.
+
+    Concurrent ``query`` calls made within ``batch_window`` seconds of
+    each other (same filters) are coalesced into one /query/batch
+    request of up to MAX_BATCH questions, and each caller gets its own
+    packet back. A batch refused as a whole with 422 or 429 is re-asked
+    one question at a time, so one caller's question can't fail the
+    others. At most ``max_concurrency`` HTTP requests are in
+    flight; further calls wait for a slot.
+
+    Example:
+        async with AsyncInstantRAG(url, "agent-1", token) as rag:
+            answers = await asyncio.gather(*(rag.query(q) for q in questions))
+
+    Args:
+        batch_window: Seconds to wait for more questions; 0 disables batching
+        max_concurrency: In-flight request limit
+    """
+
+    def __init__(self, base_url: str, agent_id: str, token: str, batch_window: float = 0.005,
+                 max_concurrency: int = 16, **kwargs):
+        super().__init__(base_url, agent_id, token, **kwargs)
+        self.batch_window = batch_window
+        self._http = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits,
+                                       transport=self.transport)
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+
+    async def __aenter__(self) -> "AsyncInstantRAG":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        for key in list(self._pending):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._http.aclose()
+
+    async def _request(self, method: str, path: str, idempotent: bool = True,
+                       build: Callable[[], Dict[str, Any]] = dict, **kwargs) -> Any:
+        attempt = 0
+        while True:
+            try:
+                async with self._slots:
+                    response = await self._http.request(method, path, **build(), **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                if not self._retryable(attempt, None, True):
+                    raise InstantRAGError(None, f"connection failed: {e}")
+                retry_after = None
+            except httpx.TransportError as e:
+                if not idempotent or not self._retryable(attempt, None, True):
+                    raise InstantRAGError(None, f"request failed: {e}")
+                retry_after = None
+            else:
+                if response.is_success:
+                    return response.json()
+                err = _error(response)
+                if not self._retryable(attempt, response.status_code, idempotent):
+                    raise err
+                retry_after = err.retry_after
+            await asyncio.sleep(_delay(attempt, self.backoff, self.max_backoff, retry_after))
+            attempt += 1
+
+    # ─── Queries ─────────────────────────────────────────────────────────
+
+    async def query(self, text: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Ask one question; batched with concurrent calls when enabled.
+
+        Returns:
+            Answer packet
+
+        Raises:
+            InstantRAGError: On an error response or a blocked question
+        """
+        if self.batch_window <= 0:
+            return await self._request("POST", "/query", json=self._query_body(text, filters))
+
+        key = json.dumps(filters, sort_keys=True) if filters else ""
+        fut = asyncio.get_running_loop().create_future()
+        queue = self._pending.setdefault(key, [])
+        queue.append((text, fut))
+        if len(queue) >= MAX_BATCH:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.batch_window, self._flush, key)
+        return await fut
+
+    def _flush(self, key: str):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(key, [])
+        if items:
+            task = asyncio.ensure_future(self._send_batch(key, items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send_batch(self, key: str, items: List[Tuple[str, asyncio.Future]]):
+        filters = json.loads(key) if key else None
+        if len(items) == 1:
+            await self._send_one(items[0][0], items[0][1], filters)
+            return
+        body = {"texts": [t for t, _ in items], **self._auth}
+        if filters:
+            body["filters"] = filters
+        try:
+            results = (await self._request("POST", "/query/batch", json=body))["results"]
+        except InstantRAGError as e:
+            if e.status in BATCH_ONLY_STATUSES:
+                # one caller's bad question (422) or a batch bigger than the
+                # remaining rate limit (429): ask each question on its own
+                await asyncio.gather(*(self._send_one(text, fut, filters) for text, fut in items))
+                return
+            self._fail(items, e)
+            return
+        except Exception as e:
+            self._fail(items, e)
+            return
+        for (_, fut), packet in zip(items, results):
+            if fut.done():
+                continue
+            if "error" in packet:
+                fut.set_exception(InstantRAGError(400, packet["error"]))
+            else:
+                fut.set_result(packet)
+
+    async def _send_one(self, text: str, fut: asyncio.Future, filters: Optional[Dict[str, Any]]):
+        try:
+            packet = await self._request("POST", "/query", json=self._query_body(text, filters))
+        except Exception as e:
+            self._fail([(text, fut)], e)
+            return
+        if not fut.done():
+            fut.set_result(packet)
+
+    @staticmethod
+    def _fail(items: List[Tuple[str, asyncio.Future]], error: Exception):
+        for _, fut in items:
+            if not fut.done():
+                fut.set_exception(error)
+
+    async def query_many(self, texts: Sequence[str],
+                         filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Ask many questions concurrently through /query/batch."""
+        body = {**self._auth}
+        if filters:
+            body["filters"] = filters
+        parts = await asyncio.gather(*(
+            self._request("POST", "/query/batch", json={**body, "texts": list(texts[i:i + MAX_BATCH])})
+            for i in range(0, len(texts), MAX_BATCH)
+        ))
+        return [packet for part in parts for packet in part["results"]]
+
+    async def swarm(self, text: str, agents: int = 3, style: Optional[str] = None,
+                    filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        body = {**self._query_body(text, filters), "agents": agents}
+        if style:
+            body["style"] = style
+        return await self._request("POST", "/swarm/query", json=body)
+
+    # ─── Documents ───────────────────────────────────────────────────────
+
+    async def ingest(self, text: Union[str, bytes], filename: str, replace: bool = False,
+                     tags: Optional[Sequence[str]] = None, timestamp: Optional[float] = None,
+                     metadata: Optional[str] = None) -> Dict[str, Any]:
+        data = text.encode("utf-8") if isinstance(text, str) else text
+        return await self._request(
+            "POST", "/ingest", idempotent=replace,
+            params=self._ingest_params(replace, tags, timestamp, metadata),
+            files={"file": (filename, data, "text/plain")}
+        )
+
+    async def ingest_file(self, path: str, filename: Optional[str] = None, replace: bool = False,
+                          tags: Optional[Sequence[str]] = None, timestamp: Optional[float] = None,
+                          metadata: Optional[str] = None) -> Dict[str, Any]:
+        """Upload a file, streaming it from disk (see InstantRAG.ingest_file)."""
+        name = filename or os.path.basename(path)
+        handles = []
+
+        def build():
+            f = open(path, "rb")
+            handles.append(f)
+            return {"files": {"file": (name, f, "text/plain")}}
+
+        try:
+            return await self._request(
+                "POST", "/ingest", idempotent=replace, build=build,
+                params=self._ingest_params(replace, tags, timestamp, metadata)
+            )
+        finally:
+            for f in handles:
+                f.close()
+
+    async def delete_document(self, source: str) -> Dict[str, Any]:
+        return await self._request("DELETE", "/documents", params={**self._auth, "source": source})
+
+    async def documents(self) -> Dict[str, int]:
+        return (await self._request("GET", "/documents", params=self._auth))["documents"]
@@ -1,8 +1,39 @@
-from typing import Dict, Any
+from collections import deque
+from typing import Dict, Any, List, Optional
+import threading
+import time
 import logging
 
+import numpy as np
+
+from functions.webhooks import webhooks
+
 logger = logging.getLogger(__name__)
 
+# Degradation ladder, cheapest last. Each step trades quality for latency.
+MODES = ["normal", "reduced_pool", "no_rerank", "cache_only"]
+
+WINDOW_SIZE = 500          # latest requests per tenant kept for percentiles
+MIN_SAMPLES = 20           # don't degrade on too little evidence
+COOLDOWN_SECONDS = 30      # minimum time between mode changes per tenant
+COMPLIANCE_BUCKET = 60     # seconds per compliance history bucket
+COMPLIANCE_HISTORY = 60    # buckets kept (one hour at 60s)
+
+class TenantWindow:
+    """
+    Rolling latency/confidence window and SLA state for one tenant.
+    """
+
+    def __init__(self):
+        self.latencies = deque(maxlen=WINDOW_SIZE)
+        self.confidences = deque(maxlen=WINDOW_SIZE)
+        self.mode = "normal"
+        self.changed_at = 0.0
+        self.met = 0
+        self.total = 0
+        # (bucket start, met, total)
+        self.history = deque(maxlen=COMPLIANCE_HISTORY)
+
 class Engine:
     """
     SLA (Service Level Agreement) enforcement engine.
@@ -16,6 +47,8 @@ class Engine:
             "accuracy_min": 0.6,
             "availability": 0.99
         }
+        self.windows: Dict[str, TenantWindow] = {}
+        self._lock = threading.Lock()
     
     def check_sla(self, name: str, latency: float, accuracy: float) -> bool:
         """
@@ -43,6 +76,146 @@ class Engine:
         
         return sla_met
     
+    def record(self, tenant: str, latency: float, confidence: Optional[float] = None) -> bool:
+        """
+        Feed one measured request into the tenant's rolling window.
+        
+        Updates compliance counters and moves the tenant along the
+        degradation ladder when the latency budget is at risk. Only
+        latency counts toward compliance: answer confidence measures how
+        well the corpus covers a question, not reranking accuracy, so it
+        is kept for the report but never judged against accuracy_min.
+        Single slow requests are logged at debug; mode changes are what
+        get a warning.
+        
+        Args:
+            tenant: Agent identifier
+            latency: Measured request latency in milliseconds
+            confidence: Answer confidence (0-1), reported as a mean
+            
+        Returns:
+            True if this request met the latency budget
+        """
+        met = latency < self.sla_thresholds["latency_ms"]
+        if not met:
+            logger.debug(f"Latency budget missed for {tenant}: {latency:.0f}ms "
+                         f"(limit: {self.sla_thresholds['latency_ms']})")
+        now = time.time()
+        bucket = now - now % COMPLIANCE_BUCKET
+        
+        with self._lock:
+            w = self.windows.get(tenant)
+            if w is None:
+                w = self.windows[tenant] = TenantWindow()
+            w.latencies.append(latency)
+            if confidence is not None:
+                w.confidences.append(confidence)
+            w.total += 1
+            w.met += met
+            if w.history and w.history[-1][0] == bucket:
+                _, m, t = w.history[-1]
+                w.history[-1] = (bucket, m + met, t + 1)
+            else:
+                w.history.append((bucket, int(met), 1))
+            self._adapt(tenant, w, now)
+        
+        return met
+
+    def _adapt(self, tenant: str, w: TenantWindow, now: float):
+        """Escalate or relax the degradation mode from the rolling p95/p99."""
+        if len(w.latencies) < MIN_SAMPLES or now - w.changed_at < COOLDOWN_SECONDS:
+            return
+        
+        budget = self.sla_thresholds["latency_ms"]
+        p95, p99 = np.percentile(np.fromiter(w.latencies, dtype=float), [95, 99])
+        level = MODES.index(w.mode)
+        
+        if p99 > 2 * budget:
+            target = len(MODES) - 1
+        elif p95 > budget:
+            target = max(level + 1, 2)
+        elif p95 > 0.75 * budget:
+            target = max(level, 1)
+        elif p95 < 0.5 * budget:
+            target = level - 1
+        else:
+            target = level
+        target = max(0, min(len(MODES) - 1, target))
+        
+        if target != level:
+            w.mode = MODES[target]
+            w.changed_at = now
+            # Fresh evidence for the new mode
+            w.latencies.clear()
+            log = logger.warning if target > level else logger.info
+            log(f"SLA mode for {tenant}: {MODES[level]} -> {w.mode} (p95={p95:.0f}ms, p99={p99:.0f}ms)")
+            if target > level:
+                webhooks.emit("sla.breach", tenant, {
+                    "mode": w.mode,
+                    "previous_mode": MODES[level],
+                    "p95_ms": round(float(p95), 2),
+                    "p99_ms": round(float(p99), 2),
+                    "budget_ms": budget
+                })
+
+    def mode(self, tenant: str) -> str:
+        """
+        Get the current degradation mode for a tenant.
+        
+        Args:
+            tenant: Agent identifier
+            
+        Returns:
+            One of MODES
+        """
+        w = self.windows.get(tenant)
+        return w.mode if w else "normal"
+
+    def report(self, tenant: str) -> Dict[str, Any]:
+        """
+        Get rolling percentiles, mode and compliance history for a tenant.
+        
+        Args:
+            tenant: Agent identifier
+            
+        Returns:
+            SLA report dictionary
+        """
+        with self._lock:
+            w = self.windows.get(tenant)
+            if w is None:
+                return {"tenant": tenant, "mode": "normal", "requests": 0}
+            lat = np.fromiter(w.latencies, dtype=float)
+            conf = np.fromiter(w.confidences, dtype=float)
+            history: List[Dict[str, Any]] = [
+                {"start": b, "requests": t, "compliance": round(m / t, 4)}
+                for b, m, t in w.history
+            ]
+            p50, p95, p99 = np.percentile(lat, [50, 95, 99]) if len(lat) else (0.0, 0.0, 0.0)
+            return {
+                "tenant": tenant,
+                "mode": w.mode,
+                "requests": w.total,
+                "compliance": round(w.met / w.total, 4) if w.total else 1.0,
+                "latency_ms": {
+                    "p50": round(float(p50), 2),
+                    "p95": round(float(p95), 2),
+                    "p99": round(float(p99), 2),
+                    "window": len(lat)
+                },
+                "confidence_mean": round(float(conf.mean()), 4) if len(conf) else None,
+                "history": history
+            }
+
+    def report_all(self) -> Dict[str, Any]:
+        """
+        Get SLA reports for every tenant seen so far.
+        
+        Returns:
+            Dictionary keyed by tenant
+        """
+        return {t: self.report(t) for t in list(self.windows)}
+
     def get_thresholds(self) -> Dict[str, Any]:
         """
         Get current SLA thresholds.
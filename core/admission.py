@@ -0,0 +1,182 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict
+import logging
+
+from fastapi import HTTPException
+
+from core.metrics import metrics
+from core.subscription import Subs, SubscriptionPlan, subs
+
+logger = logging.getLogger(__name__)
+
+# Requests doing CPU-bound work at once, per controller
+QUERY_CONCURRENCY = int(os.getenv("ADMIT_QUERY_CONCURRENCY", str(2 * (os.cpu_count() or 1))))
+INGEST_CONCURRENCY = int(os.getenv("ADMIT_INGEST_CONCURRENCY", "2"))
+# Longest a request waits in a queue before it is shed
+ADMIT_TIMEOUT = float(os.getenv("ADMIT_TIMEOUT", "10"))
+MAX_RETRY_AFTER = 60
+
+# Served strictly in this order when a slot frees up
+PRIORITY = (
+    SubscriptionPlan.ENTERPRISE,
+    SubscriptionPlan.PRO,
+    SubscriptionPlan.BASIC,
+    SubscriptionPlan.FREE,
+)
+
+# Waiting requests allowed per plan before new ones are refused
+QUEUE_LIMITS = {
+    SubscriptionPlan.ENTERPRISE: 256,
+    SubscriptionPlan.PRO: 128,
+    SubscriptionPlan.BASIC: 64,
+    SubscriptionPlan.FREE: 32,
+}
+
+class Admission:
+    """
+    Priority admission control in front of CPU-bound endpoints.
+
+    At most ``concurrency`` requests hold a slot; the rest wait in one
+    bounded FIFO per subscription plan. A freed slot is handed to the
+    oldest waiter of the highest plan, so under overload ENTERPRISE is
+    served before PRO before BASIC before FREE. A request whose plan
+    queue is full, or that waits longer than ``timeout``, fails fast
+    with 503 and a Retry-After estimated from recent slot hold times.
+
+    Runs on the event loop; not for use from worker threads.
+    """
+
+    def __init__(self, name: str, concurrency: int,
+                 queue_limits: Dict[SubscriptionPlan, int] = QUEUE_LIMITS,
+                 timeout: float = ADMIT_TIMEOUT, subscriptions: Subs = subs):
+        self.name = name
+        self.concurrency = max(concurrency, 1)
+        self.queue_limits = queue_limits
+        self.timeout = timeout
+        self.subs = subscriptions
+        self.active = 0
+        self.queues: Dict[SubscriptionPlan, Deque[asyncio.Future]] = {plan: deque() for plan in PRIORITY}
+        self.hold = 0.05  # moving average of seconds a slot is held
+        self.shed = 0
+
+    def _plan(self, agent: str) -> SubscriptionPlan:
+        try:
+            return SubscriptionPlan(self.subs.get_plan(agent))
+        except ValueError:
+            return SubscriptionPlan.FREE
+
+    @asynccontextmanager
+    async def slot(self, agent: str):
+        """
+        Hold a slot for the body of the ``async with`` block.
+
+        Args:
+            agent: Agent identifier, used to look up its plan
+
+        Raises:
+            HTTPException: 503 when the plan's queue is full or the wait times out
+        """
+        plan = self._plan(agent)
+        start = time.perf_counter()
+        if self.active < self.concurrency:
+            self.active += 1
+        else:
+            queue = self.queues[plan]
+            if len(queue) >= self.queue_limits[plan]:
+                self._reject(plan, "queue_full")
+            fut = asyncio.get_running_loop().create_future()
+            queue.append(fut)
+            try:
+                await asyncio.wait_for(fut, self.timeout)
+            except asyncio.TimeoutError:
+                if not self._granted(fut, queue):
+                    self._reject(plan, "timeout")
+            except asyncio.CancelledError:
+                # client went away while queued
+                if self._granted(fut, queue):
+                    self._release()
+                raise
+        metrics.observe("admission_wait_seconds", time.perf_counter() - start,
+                        endpoint=self.name, plan=plan.value)
+
+        held = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.hold = 0.9 * self.hold + 0.1 * (time.perf_counter() - held)
+            self._release()
+
+    @property
+    def saturated(self) -> bool:
+        """True when every slot is taken, so new work would queue."""
+        return self.active >= self.concurrency
+
+    def _granted(self, fut: asyncio.Future, queue: Deque[asyncio.Future]) -> bool:
+        # a slot may have been handed over just as the wait ended
+        if fut.done() and not fut.cancelled():
+            return True
+        fut.cancel()
+        if fut in queue:
+            queue.remove(fut)
+        return False
+
+    def _release(self):
+        for plan in PRIORITY:
+            queue = self.queues[plan]
+            while queue:
+                fut = queue.popleft()
+                if not fut.done():
+                    fut.set_result(None)  # the slot passes straight to the waiter
+                    return
+        self.active -= 1
+
+    def retry_after(self, plan: SubscriptionPlan) -> int:
+        """
+        Seconds until a request of ``plan`` would likely be admitted.
+
+        Args:
+            plan: Subscription plan
+
+        Returns:
+            Whole seconds, between 1 and MAX_RETRY_AFTER
+        """
+        ahead = 0
+        for p in PRIORITY:
+            ahead += len(self.queues[p])
+            if p == plan:
+                break
+        wait = (ahead + 1) * self.hold / self.concurrency
+        return min(max(math.ceil(wait), 1), MAX_RETRY_AFTER)
+
+    def _reject(self, plan: SubscriptionPlan, reason: str):
+        self.shed += 1
+        metrics.inc("admission_rejected_total", endpoint=self.name, plan=plan.value, reason=reason)
+        logger.warning(f"Shedding {plan.value} {self.name} request ({reason}); {self.active} active")
+        raise HTTPException(
+            status_code=503,
+            detail="overloaded",
+            headers={"Retry-After": str(self.retry_after(plan))}
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Current load of the controller.
+
+        Returns:
+            Dictionary with active slots, queue lengths per plan and shed count
+        """
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "queued": {plan.value: len(q) for plan, q in self.queues.items()},
+            "hold_seconds": round(self.hold, 4),
+            "shed": self.shed
+        }
+
+query_admission = Admission("query", QUERY_CONCURRENCY)
+ingest_admission = Admission("ingest", INGEST_CONCURRENCY)
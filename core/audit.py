@@ -1,9 +1,13 @@
 import json
+import queue
+import threading
 import time
 import os
 from typing import Dict, Any, List
 import logging
 
+from core.rollups import rollups
+
 logger = logging.getLogger(__name__)
 
 LOG_DIR = "data"
@@ -15,8 +19,30 @@ os.makedirs(LOG_DIR, exist_ok=True)
 class Auditor:
     """
     Audit logging system for tracking all system events.
+
+    ``record`` writes synchronously; ``defer`` hands the event to a
+    background writer that appends everything queued in one write, for
+    request paths where the audit line need not exist before the
+    response is sent. Reads flush the queue first.
     """
     
+    def __init__(self):
+        self._queue: "queue.SimpleQueue[Dict[str, Any]]" = queue.SimpleQueue()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer = None
+    
+    def _write(self, entries: List[Dict[str, Any]]):
+        try:
+            with open(LOG_FILE, "a") as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            for entry in entries:
+                rollups.audit(entry["event"], entry["agent"], entry["payload"], entry["timestamp"])
+                logger.debug(f"Audit recorded: {entry['event']} for {entry['agent']}")
+        except Exception as e:
+            logger.error(f"Failed to record audit log: {e}")
+            # Don't raise - audit logging shouldn't break the app
+    
     def record(self, event: str, agent: str, payload: Dict[str, Any]):
         """
         Record an audit event.
@@ -26,22 +52,62 @@ class Auditor:
             agent: Agent identifier
             payload: Event-specific data
         """
-        try:
-            entry = {
-                "timestamp": time.time(),
-                "event": event,
-                "agent": agent,
-                "payload": payload
-            }
+        # through the queue, so it lands after anything already deferred
+        self._queue.put({
+            "timestamp": time.time(),
+            "event": event,
+            "agent": agent,
+            "payload": payload
+        })
+        self.flush()
+    
+    def defer(self, event: str, agent: str, payload: Dict[str, Any]):
+        """
+        Queue an audit event for the background writer.
+        
+        The timestamp is taken now, so entries keep request order.
+        
+        Args:
+            event: Event type (e.g., 'query', 'ingest')
+            agent: Agent identifier
+            payload: Event-specific data
+        """
+        self._queue.put({
+            "timestamp": time.time(),
+            "event": event,
+            "agent": agent,
+            "payload": payload
+        })
+        self._wake.set()
+        self._ensure_writer()
+    
+    def flush(self):
+        """Write every queued event now."""
+        with self._write_lock:
+            entries = []
+            while True:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if entries:
+                self._write(entries)
+    
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._write_lock:
+            if self._writer is not None:
+                return
             
-            with open(LOG_FILE, "a") as f:
-                f.write(json.dumps(entry) + "\n")
-                
-            logger.debug(f"Audit recorded: {event} for {agent}")
+            def loop():
+                while True:
+                    self._wake.wait()
+                    self._wake.clear()
+                    self.flush()
             
-        except Exception as e:
-            logger.error(f"Failed to record audit log: {e}")
-            # Don't raise - audit logging shouldn't break the app
+            self._writer = threading.Thread(target=loop, daemon=True)
+            self._writer.start()
     
     def read_all(self) -> List[Dict[str, Any]]:
         """
@@ -50,6 +116,7 @@ class Auditor:
         Returns:
             List of audit log entries
         """
+        self.flush()
         try:
             if not os.path.exists(LOG_FILE):
                 return []
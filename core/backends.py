@@ -0,0 +1,308 @@
+import hashlib
+import importlib
+import json
+import os
+import re
+import sys
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from core.startup import startup
+
+logger = logging.getLogger(__name__)
+
+EMBEDDER_MODEL = "all-MiniLM-L6-v2"
+RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Deployment-wide defaults; individual tenants can be pinned in TENANT_FILE
+DEFAULT_EMBEDDER = os.getenv("EMBEDDER_BACKEND", "sentence-transformers")
+DEFAULT_RERANKER = os.getenv("RERANKER_BACKEND", "cross-encoder")
+# Backend to use when the default cannot be loaded (e.g. no network); off by default
+EMBEDDER_FALLBACK = os.getenv("EMBEDDER_FALLBACK", "")
+RERANKER_FALLBACK = os.getenv("RERANKER_FALLBACK", "")
+TENANT_FILE = os.path.join("data", "tenant_backends.json")
+
+_TOKEN = re.compile(r"\w+")
+# Distinct tokens whose hash bucket is memoized by HashingEmbedder
+BUCKET_CACHE_SIZE = 65536
+
+def _lazy_import(module: str):
+    """Import a heavy dependency on first use, timing it as a startup phase."""
+    if module in sys.modules:
+        return sys.modules[module]
+    with startup.phase(f"import:{module}"):
+        return importlib.import_module(module)
+
+# ─── Interfaces ──────────────────────────────────────────────────────────
+
+class Embedder:
+    """
+    Embedding backend interface.
+    """
+
+    name = "base"
+    dim = 0
+
+    def encode(self, texts: Sequence[str], **kwargs) -> np.ndarray:
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Float32 matrix of shape (len(texts), dim)
+        """
+        raise NotImplementedError
+
+class Reranker:
+    """
+    Reranking backend interface.
+    """
+
+    name = "base"
+
+    def predict(self, pairs: List[List[str]], **kwargs) -> np.ndarray:
+        """
+        Score (query, passage) pairs; higher is more relevant.
+
+        Args:
+            pairs: List of [query, passage] pairs
+
+        Returns:
+            Float array with one score per pair
+        """
+        raise NotImplementedError
+
+# ─── sentence-transformers ───────────────────────────────────────────────
+
+class SentenceTransformerEmbedder(Embedder):
+    """Bi-encoder from sentence-transformers."""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = EMBEDDER_MODEL):
+        _lazy_import("torch")
+        st = _lazy_import("sentence_transformers")
+        self.model = st.SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: Sequence[str], **kwargs) -> np.ndarray:
+        return np.asarray(self.model.encode(list(texts), **kwargs), dtype=np.float32)
+
+class CrossEncoderReranker(Reranker):
+    """Cross-encoder from sentence-transformers."""
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name: str = RERANKER_MODEL):
+        _lazy_import("torch")
+        st = _lazy_import("sentence_transformers")
+        self.model = st.CrossEncoder(model_name, device="cpu")
+
+    def predict(self, pairs: List[List[str]], **kwargs) -> np.ndarray:
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        return np.asarray(self.model.predict(pairs, **kwargs), dtype=np.float32)
+
+def _quantize(module):
+    """Dynamic int8 quantization of Linear layers for CPU inference."""
+    torch = _lazy_import("torch")
+    return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+class QuantizedSentenceTransformerEmbedder(SentenceTransformerEmbedder):
+    """Bi-encoder with int8 dynamically quantized Linear layers (CPU)."""
+
+    name = "sentence-transformers-int8"
+
+    def __init__(self, model_name: str = EMBEDDER_MODEL):
+        super().__init__(model_name)
+        self.model = _quantize(self.model)
+
+class QuantizedCrossEncoderReranker(CrossEncoderReranker):
+    """Cross-encoder with int8 dynamically quantized Linear layers (CPU)."""
+
+    name = "cross-encoder-int8"
+
+    def __init__(self, model_name: str = RERANKER_MODEL):
+        super().__init__(model_name)
+        self.model.model = _quantize(self.model.model)
+
+# ─── Offline backends ────────────────────────────────────────────────────
+
+@lru_cache(maxsize=BUCKET_CACHE_SIZE)
+def _bucket(token: str, dim: int) -> Tuple[int, float]:
+    """Column and sign a token hashes to; bounded so open vocabularies can't grow it."""
+    h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+    # sign bit keeps collisions from only ever adding up
+    return h % dim, 1.0 if (h >> 63) & 1 else -1.0
+
+class HashingEmbedder(Embedder):
+    """
+    Bag-of-words hashing-trick embedder.
+    Deterministic, dependency-free and fast; used for tests, benchmarks
+    and as a degraded mode when model backends are unavailable.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, texts: Sequence[str], **kwargs) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for tok in _TOKEN.findall(text.lower()):
+                col, sign = _bucket(tok, self.dim)
+                out[row, col] += sign
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+class OverlapReranker(Reranker):
+    """
+    Token-overlap (Jaccard) reranker; the offline counterpart of HashingEmbedder.
+    """
+
+    name = "overlap"
+
+    def predict(self, pairs: List[List[str]], **kwargs) -> np.ndarray:
+        scores = np.zeros(len(pairs), dtype=np.float32)
+        for i, (q, doc) in enumerate(pairs):
+            qt = set(_TOKEN.findall(q.lower()))
+            dt = set(_TOKEN.findall(doc.lower()))
+            scores[i] = len(qt & dt) / (len(qt | dt) or 1)
+        return scores
+
+EMBEDDERS = {
+    "sentence-transformers": SentenceTransformerEmbedder,
+    "sentence-transformers-int8": QuantizedSentenceTransformerEmbedder,
+    "hashing": HashingEmbedder,
+}
+
+RERANKERS = {
+    "cross-encoder": CrossEncoderReranker,
+    "cross-encoder-int8": QuantizedCrossEncoderReranker,
+    "overlap": OverlapReranker,
+}
+
+# ─── Registry ────────────────────────────────────────────────────────────
+
+class Backends:
+    """
+    Shared backend instances and per-tenant backend selection.
+
+    Each backend is loaded once per process and shared by every tenant
+    that uses it. Tenants use the deployment defaults unless pinned with
+    ``assign``; the choice applies when the tenant's index is created, since
+    embeddings from different backends are not comparable.
+    """
+
+    def __init__(self, path: str = TENANT_FILE):
+        self.path = path
+        self._instances: Dict[Tuple[str, str], object] = {}
+        self._lock = threading.Lock()
+        # one lock per backend so a slow model load doesn't block the others
+        self._loading: Dict[Tuple[str, str], threading.Lock] = {}
+        self.tenants: Dict[str, Dict[str, str]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load tenant backends: {e}")
+        return {}
+
+    def _get(self, kind: str, name: str, table: Dict[str, type], fallback: str):
+        if name not in table:
+            raise ValueError(f"unknown {kind} backend: {name}")
+        key = (kind, name)
+        inst = self._instances.get(key)
+        if inst is not None:
+            return inst
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            inst = self._instances.get(key)
+            if inst is None:
+                try:
+                    inst = table[name]()
+                    logger.info(f"Loaded {kind} backend: {name}")
+                except Exception as e:
+                    if not fallback or fallback == name:
+                        logger.error(f"Error loading {kind} backend {name}: {e}")
+                        raise
+                    logger.error(f"Error loading {kind} backend {name}, falling back to {fallback}: {e}")
+                    inst = table[fallback]()
+                with self._lock:
+                    self._instances[key] = inst
+            return inst
+
+    def embedder(self, name: Optional[str] = None) -> Embedder:
+        """
+        Get a shared embedder instance.
+
+        Args:
+            name: Backend name (defaults to EMBEDDER_BACKEND)
+
+        Returns:
+            Embedder
+        """
+        return self._get("embedder", name or DEFAULT_EMBEDDER, EMBEDDERS, EMBEDDER_FALLBACK)
+
+    def reranker(self, name: Optional[str] = None) -> Reranker:
+        """
+        Get a shared reranker instance.
+
+        Args:
+            name: Backend name (defaults to RERANKER_BACKEND)
+
+        Returns:
+            Reranker
+        """
+        return self._get("reranker", name or DEFAULT_RERANKER, RERANKERS, RERANKER_FALLBACK)
+
+    def for_tenant(self, tenant: str) -> Tuple[Embedder, Reranker]:
+        """
+        Resolve the backends a tenant should use.
+
+        Args:
+            tenant: Tenant identifier
+
+        Returns:
+            Tuple of (embedder, reranker)
+        """
+        choice = self.tenants.get(tenant, {})
+        return self.embedder(choice.get("embedder")), self.reranker(choice.get("reranker"))
+
+    def assign(self, tenant: str, embedder: Optional[str] = None, reranker: Optional[str] = None):
+        """
+        Pin a tenant to specific backends (persisted under data/).
+
+        Args:
+            tenant: Tenant identifier
+            embedder: Embedder backend name, or None for the default
+            reranker: Reranker backend name, or None for the default
+        """
+        if embedder is not None and embedder not in EMBEDDERS:
+            raise ValueError(f"unknown embedder backend: {embedder}")
+        if reranker is not None and reranker not in RERANKERS:
+            raise ValueError(f"unknown reranker backend: {reranker}")
+
+        choice = {k: v for k, v in (("embedder", embedder), ("reranker", reranker)) if v}
+        with self._lock:
+            if choice:
+                self.tenants[tenant] = choice
+            else:
+                self.tenants.pop(tenant, None)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w") as f:
+                json.dump(self.tenants, f, indent=2)
+        logger.info(f"Assigned backends for {tenant}: {choice or 'defaults'}")
+
+backends = Backends()
@@ -0,0 +1,115 @@
+from typing import Iterable, Iterator, List, Sequence, Tuple, Union
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class ChunkStore:
+    """
+    Chunk texts packed into one UTF-8 arena with an int64 offsets array.
+
+    Behaves like a read-mostly ``List[str]``: ``len``, indexing, slicing,
+    iteration and ``extend``. Strings are only decoded when a row is
+    accessed (e.g. for the top-k results), so a tenant costs roughly its
+    UTF-8 size plus 8 bytes per chunk instead of a Python ``str`` object
+    and a list slot per chunk.
+    """
+
+    def __init__(self, arena: bytes = b"", offsets: np.ndarray = None):
+        # a bytearray is adopted as-is, anything else is copied
+        self._arena = arena if isinstance(arena, bytearray) else bytearray(arena)
+        if offsets is None:
+            offsets = np.zeros(1, dtype=np.int64)
+        # offsets[i]..offsets[i + 1] is row i; grown geometrically like the embeddings
+        self._offsets = np.empty(max(len(offsets), 1024), dtype=np.int64)
+        self._offsets[:len(offsets)] = offsets
+        self._n = len(offsets) - 1
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str]) -> "ChunkStore":
+        """
+        Build a store from strings.
+
+        Args:
+            texts: Chunk texts
+
+        Returns:
+            ChunkStore
+        """
+        store = cls()
+        store.extend(list(texts))
+        return store
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._n))]
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError("chunk index out of range")
+        return self._arena[self._offsets[i]:self._offsets[i + 1]].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._n):
+            yield self[i]
+
+    def extend(self, texts: Sequence[str]):
+        """
+        Append chunk texts.
+
+        Args:
+            texts: Chunk texts
+        """
+        encoded = [t.encode("utf-8") for t in texts]
+        n, m = self._n, len(encoded)
+        if n + m + 1 > len(self._offsets):
+            grown = np.empty(max(2 * len(self._offsets), n + m + 1), dtype=np.int64)
+            grown[:n + 1] = self._offsets[:n + 1]
+            self._offsets = grown
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=m)
+        np.cumsum(lengths, out=self._offsets[n + 1:n + m + 1])
+        self._offsets[n + 1:n + m + 1] += self._offsets[n]
+        self._arena += b"".join(encoded)
+        # length last: concurrent readers bound by len() never see a partial row
+        self._n = n + m
+
+    def take(self, rows: np.ndarray) -> "ChunkStore":
+        """
+        Copy the given rows into a new store, in order.
+
+        Args:
+            rows: Row indices
+
+        Returns:
+            ChunkStore
+        """
+        starts, ends = self._offsets[rows], self._offsets[rows + 1]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(ends - starts, out=offsets[1:])
+        arena = bytearray(int(offsets[-1]))
+        view = memoryview(self._arena)
+        try:
+            for dst, a, b in zip(offsets[:-1].tolist(), starts.tolist(), ends.tolist()):
+                arena[dst:dst + b - a] = view[a:b]
+        finally:
+            view.release()
+        return ChunkStore(arena, offsets)
+
+    def arena(self, start: int, end: int) -> Tuple[bytes, np.ndarray]:
+        """
+        Raw UTF-8 bytes and rebased offsets for rows [start, end).
+
+        Returns:
+            Tuple of (arena bytes, offsets array of length end - start + 1)
+        """
+        a, b = int(self._offsets[start]), int(self._offsets[end])
+        return bytes(self._arena[a:b]), self._offsets[start:end + 1] - a
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the arena and the used part of the offsets array."""
+        return len(self._arena) + 8 * (self._n + 1)
@@ -0,0 +1,126 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+import numpy as np
+import logging
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+QUERY_EMBED_CACHE_MB = float(os.getenv("QUERY_EMBED_CACHE_MB", "64"))
+ENTRY_OVERHEAD = 200  # dict slot, tuple key and ndarray header
+
+class QueryEmbeddingCache:
+    """
+    Process-wide LRU of query embeddings, bounded by memory.
+
+    Keys are ``(embedder, normalized text)``: backend instances are shared
+    by every tenant that uses them (see core.backends), so a question one
+    tenant asked is reused by all others on the same embedder, while
+    tenants pinned to another backend never see foreign vectors. Stored
+    vectors are read-only views so callers can't corrupt shared entries.
+    """
+
+    def __init__(self, max_bytes: int = int(QUERY_EMBED_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Tuple[Hashable, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._cost: Dict[Hashable, float] = {}  # embedder -> moving average seconds per encode call
+
+    @staticmethod
+    def _size(text: str, vec: np.ndarray) -> int:
+        return vec.nbytes + sys.getsizeof(text) + ENTRY_OVERHEAD
+
+    def get_many(self, model: Hashable, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up normalized texts.
+
+        Args:
+            model: Embedder instance the vectors belong to
+            texts: Normalized query texts
+
+        Returns:
+            Cached vector or None per text
+        """
+        out: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for t in texts:
+                vec = self._data.get((model, t))
+                if vec is not None:
+                    self._data.move_to_end((model, t))
+                out.append(vec)
+            hits = sum(v is not None for v in out)
+            self.hits += hits
+            self.misses += len(out) - hits
+        if hits:
+            metrics.inc("query_embedding_cache_total", hits, outcome="hit")
+        if len(out) > hits:
+            metrics.inc("query_embedding_cache_total", len(out) - hits, outcome="miss")
+        return out
+
+    def contains(self, model: Hashable, text: str) -> bool:
+        """Whether a normalized text is cached (not counted as a lookup)."""
+        return (model, text) in self._data
+
+    def encode_cost(self, model: Hashable) -> Optional[float]:
+        """Moving average of seconds one encode call took, None if never measured."""
+        return self._cost.get(model)
+
+    def put_many(self, model: Hashable, texts: Sequence[str], vecs: np.ndarray,
+                 seconds: Optional[float] = None):
+        """
+        Store vectors, evicting least recently used entries past the budget.
+
+        Args:
+            model: Embedder instance the vectors belong to
+            texts: Normalized query texts
+            vecs: Matrix with one row per text
+            seconds: How long encoding them took
+        """
+        if seconds is not None:
+            cost = self._cost.get(model)
+            self._cost[model] = seconds if cost is None else 0.9 * cost + 0.1 * seconds
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            for t, v in zip(texts, vecs):
+                key = (model, t)
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    continue
+                v = np.array(v, dtype=np.float32)  # own the row, not a view of the batch
+                v.setflags(write=False)
+                self._data[key] = v
+                self.nbytes += self._size(t, v)
+            while self.nbytes > self.max_bytes and self._data:
+                (_, t), v = self._data.popitem(last=False)
+                self.nbytes -= self._size(t, v)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, memory use and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None
+            }
+
+query_embeddings = QueryEmbeddingCache()
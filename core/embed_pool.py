@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Sequence
+import logging
+
+import numpy as np
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Worker processes per embedding backend; 0 embeds in the calling thread
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+# Chunks per task sent to a worker
+EMBED_BATCH = int(os.getenv("EMBED_BATCH", "256"))
+# Workers start from a clean process and receive the backend pickled. 'fork'
+# is not offered: forking the threaded server can copy a lock held by
+# another thread (logging, torch's pools) and hang the child.
+EMBED_START_METHOD = os.getenv("EMBED_START_METHOD", "forkserver" if sys.platform == "linux" else "spawn")
+START_METHODS = ("forkserver", "spawn")
+
+_worker_embedder = None
+
+def _init_worker(embedder):
+    global _worker_embedder
+    _worker_embedder = embedder
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        # one intra-op thread per process; the pool provides the parallelism
+        torch.set_num_threads(1)
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_embedder.encode(texts), dtype=np.float32)
+
+class EmbedPool:
+    """
+    Process pool for embedding large ingests on several cores.
+
+    One pool per embedding backend, created on first use. Workers receive
+    the already-loaded backend through the pool initializer rather than
+    loading their own from the network. Batches are mapped in order and
+    concatenated, so rows line up with the input texts. If a worker dies
+    the pool is discarded and that call is embedded in-process; the next
+    large ingest starts a fresh pool.
+    """
+
+    def __init__(self, workers: int = EMBED_WORKERS, batch: int = EMBED_BATCH,
+                 start_method: str = EMBED_START_METHOD):
+        if start_method not in START_METHODS:
+            raise ValueError(f"unsupported embedding start method: {start_method}")
+        self.workers = workers
+        self.batch = batch
+        self.start_method = start_method
+        self._pools: Dict[str, ProcessPoolExecutor] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def worth_it(self, n: int) -> bool:
+        """Whether ``n`` texts are enough to spread over the workers."""
+        return self.enabled and n >= 2 * self.batch
+
+    def _pool(self, embedder) -> ProcessPoolExecutor:
+        with self._lock:
+            pool = self._pools.get(embedder.name)
+            if pool is None:
+                pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(embedder,)
+                )
+                self._pools[embedder.name] = pool
+                logger.info(f"Started {self.workers} embedding workers for {embedder.name} ({self.start_method})")
+            return pool
+
+    def encode(self, embedder, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed texts across the worker processes.
+
+        Args:
+            embedder: Loaded embedding backend
+            texts: Texts to embed
+
+        Returns:
+            Float32 matrix with one row per text, in input order
+        """
+        batches = [list(texts[i:i + self.batch]) for i in range(0, len(texts), self.batch)]
+        pool = self._pool(embedder)
+        try:
+            with metrics.stage("encode_parallel"):
+                parts = list(pool.map(_encode_batch, batches))
+        except BrokenProcessPool as e:
+            logger.error(f"Embedding workers for {embedder.name} died, embedding in-process: {e}")
+            self._discard(embedder.name, pool)
+            with metrics.stage("encode"):
+                return np.asarray(embedder.encode(list(texts)), dtype=np.float32)
+        return np.concatenate(parts) if parts else np.zeros((0, embedder.dim), dtype=np.float32)
+
+    def _discard(self, name: str, pool: ProcessPoolExecutor):
+        with self._lock:
+            if self._pools.get(name) is pool:
+                del self._pools[name]
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.shutdown(cancel_futures=True)
+            self._pools.clear()
+
+embed_pool = EmbedPool()
@@ -0,0 +1,244 @@
+import bisect
+import json
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FILTER_KEYS = ("source", "tags", "after", "before")
+# Approximate bytes per record for its column entries and list slots
+RECORD_OVERHEAD = 64
+
+class MetadataIndex:
+    """
+    Columnar chunk metadata with an inverted index.
+
+    Metadata is stored once per ingested document (a *record*), not once
+    per chunk: a document's chunks occupy a contiguous run of rows, so a
+    row's record is found by bisecting the run starts. Sources and tags
+    are indexed to record ids; timestamps live in a parallel column.
+    Indexing ``index[row]`` returns the citation dict for that row.
+    """
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self.starts: List[int] = []
+        self.counts: List[int] = []
+        self.live: List[bool] = []
+        self.timestamps: List[float] = []  # NaN when absent
+        self._postings: Dict[Tuple[str, str], List[int]] = {}
+        self._rows = 0
+        self._nbytes = 0
+        self.n_sources = 0  # sources with at least one live record
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        return self.records[bisect.bisect_right(self.starts, row) - 1]
+
+    # ─── Writes ──────────────────────────────────────────────────────────
+
+    def append(self, meta: Dict[str, Any], count: int) -> int:
+        """
+        Add a record covering the next ``count`` rows.
+
+        Args:
+            meta: Document metadata; must include 'source'
+            count: Number of chunks in the document
+
+        Returns:
+            Record id
+
+        Raises:
+            ValueError: If the source or tags are not strings; nothing is
+                added in that case
+        """
+        # everything that can fail runs before the first mutation, so a
+        # bad record can't leave the columns out of step with each other
+        source = meta["source"]
+        tags = meta.get("tags", ())
+        if not isinstance(source, str):
+            raise ValueError("source must be a string")
+        if not isinstance(tags, (list, tuple)) or not all(isinstance(t, str) for t in tags):
+            raise ValueError("tags must be a list of strings")
+        ts = meta.get("timestamp")
+        ts = float(ts) if ts is not None else math.nan
+        size = RECORD_OVERHEAD + len(json.dumps(meta, default=str)) + 8 * len(tags)
+
+        rid = len(self.records)
+        self.records.append(meta)
+        self.starts.append(self._rows)
+        self.counts.append(count)
+        self.live.append(True)
+        self.timestamps.append(ts)
+        if ("source", source) not in self._postings:
+            self.n_sources += 1
+        self._postings.setdefault(("source", source), []).append(rid)
+        for tag in tags:
+            self._postings.setdefault(("tag", tag), []).append(rid)
+        self._rows += count
+        self._nbytes += size
+        return rid
+
+    def kill(self, rids: Iterable[int]):
+        """
+        Mark records deleted and drop them from the inverted index.
+
+        Args:
+            rids: Record ids
+        """
+        for rid in rids:
+            if not self.live[rid]:
+                continue
+            self.live[rid] = False
+            meta = self.records[rid]
+            keys = [("source", meta["source"])] + [("tag", t) for t in meta.get("tags", ())]
+            for key in keys:
+                posting = self._postings.get(key)
+                if posting is not None:
+                    posting.remove(rid)
+                    if not posting:
+                        del self._postings[key]
+                        if key[0] == "source":
+                            self.n_sources -= 1
+
+    def compacted(self) -> "MetadataIndex":
+        """
+        Get a copy holding only live records, renumbered from row 0.
+
+        Returns:
+            New MetadataIndex
+        """
+        out = MetadataIndex()
+        for rid, meta in enumerate(self.records):
+            if self.live[rid]:
+                out.append(meta, self.counts[rid])
+        return out
+
+    # ─── Lookups ─────────────────────────────────────────────────────────
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by records, columns and postings."""
+        return self._nbytes
+
+    def source_records(self, source: str) -> List[int]:
+        """Live record ids for a source."""
+        return list(self._postings.get(("source", source), ()))
+
+    def sources(self) -> Dict[str, int]:
+        """
+        Live chunk counts per source.
+
+        Returns:
+            Dictionary mapping source name to chunk count
+        """
+        out: Dict[str, int] = {}
+        for rid, meta in enumerate(self.records):
+            if self.live[rid]:
+                out[meta["source"]] = out.get(meta["source"], 0) + self.counts[rid]
+        return out
+
+    def rows(self, rids: Iterable[int]) -> np.ndarray:
+        """
+        Row indices covered by records, ascending.
+
+        Args:
+            rids: Record ids
+
+        Returns:
+            Int64 array of row indices
+        """
+        spans = sorted((self.starts[r], self.counts[r]) for r in rids)
+        if not spans:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.arange(s, s + c, dtype=np.int64) for s, c in spans])
+
+    def match(self, filters: Dict[str, Any]) -> List[int]:
+        """
+        Resolve a filter to live record ids.
+
+        Filters are ANDed: ``source`` is one source or a list (any of),
+        ``tags`` a tag or list (all of), ``after``/``before`` bound the
+        document timestamp (inclusive).
+
+        Args:
+            filters: Filter dictionary
+
+        Returns:
+            Matching record ids
+        """
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"unknown filter: {', '.join(sorted(unknown))}")
+
+        candidates: Optional[set] = None
+        sources = filters.get("source")
+        if sources is not None:
+            if isinstance(sources, str):
+                sources = [sources]
+            candidates = set()
+            for src in sources:
+                candidates.update(self._postings.get(("source", src), ()))
+
+        tags = filters.get("tags")
+        if tags is not None:
+            for tag in [tags] if isinstance(tags, str) else tags:
+                posting = self._postings.get(("tag", tag), ())
+                candidates = set(posting) if candidates is None else candidates & set(posting)
+
+        after, before = filters.get("after"), filters.get("before")
+        if candidates is None:
+            candidates = [rid for rid, alive in enumerate(self.live) if alive]
+        if after is not None or before is not None:
+            lo = -math.inf if after is None else float(after)
+            hi = math.inf if before is None else float(before)
+            # NaN (no timestamp) fails both comparisons
+            candidates = [rid for rid in candidates if lo <= self.timestamps[rid] <= hi]
+        return sorted(candidates)
+
+    # ─── Serialization ───────────────────────────────────────────────────
+
+    def runs(self, start: int, end: int) -> List[List[Any]]:
+        """
+        Serialize the records covering rows [start, end).
+
+        Returns:
+            List of [metadata, row count, record id] in row order
+        """
+        out = []
+        first = max(bisect.bisect_right(self.starts, start) - 1, 0)
+        for rid in range(first, len(self.records)):
+            s, c = self.starts[rid], self.counts[rid]
+            if s >= end:
+                break
+            n = min(s + c, end) - max(s, start)
+            if n > 0:
+                out.append([self.records[rid], n, rid])
+        return out
+
+    @classmethod
+    def from_runs(cls, runs: Iterable[List[Any]]) -> "MetadataIndex":
+        """
+        Rebuild an index from serialized runs.
+
+        Args:
+            runs: [metadata, row count, record id] in row order
+
+        Returns:
+            MetadataIndex
+        """
+        out, last = cls(), None
+        for meta, count, rid in runs:
+            if rid == last:
+                # a record split across snapshot segments
+                out.counts[-1] += count
+                out._rows += count
+            else:
+                out.append(meta, count)
+            last = rid
+        return out
@@ -0,0 +1,356 @@
+import bisect
+import contextvars
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join("data", "metrics"))
+FLUSH_INTERVAL = 5.0
+PREFIX = "instant_rag_"
+UNAUTHENTICATED = "unauthenticated"
+
+# Latency bucket upper bounds in seconds (50us .. 10s)
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.4, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+HELP = {
+    "request_seconds": "End-to-end request latency per endpoint and tenant",
+    "stage_seconds": "Latency of individual request stages per endpoint",
+    "singleflight_executed_total": "Searches executed by a single-flight leader",
+    "singleflight_coalesced_total": "Requests served by joining an in-flight search",
+    "query_embedding_cache_total": "Query embedding cache lookups by outcome",
+    "admission_wait_seconds": "Time admitted requests spent queued per endpoint and plan",
+    "admission_rejected_total": "Requests shed by admission control per endpoint, plan and reason",
+    "webhook_events_total": "Webhook deliveries queued per event type",
+    "webhook_deliveries_total": "Webhook events delivered, rescheduled or given up on",
+    "webhook_delivery_seconds": "Latency of one webhook POST per outcome",
+    "webhook_lag_seconds": "Time from emitting an event to its successful delivery",
+}
+
+_endpoint = contextvars.ContextVar("metrics_endpoint", default="internal")
+_request_labels = contextvars.ContextVar("metrics_request_labels", default=None)
+
+def _key(name: str, labels: Dict[str, str]) -> str:
+    return name + "|" + ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+
+def _combine(out: Dict[str, Any], snap: Dict[str, Any]):
+    """Add one snapshot's histograms and counters into another."""
+    for k, h in snap["histograms"].items():
+        agg = out["histograms"].get(k)
+        if agg is None:
+            out["histograms"][k] = {**h, "counts": list(h["counts"])}
+            continue
+        agg["counts"] = [a + b for a, b in zip(agg["counts"], h["counts"])]
+        agg["sum"] += h["sum"]
+        agg["count"] += h["count"]
+    for k, c in snap["counters"].items():
+        agg = out["counters"].get(k)
+        if agg is None:
+            out["counters"][k] = dict(c)
+        else:
+            agg["value"] += c["value"]
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram (cumulative on render).
+    """
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Metrics:
+    """
+    Process-local metrics registry with cross-worker aggregation.
+
+    Each worker periodically writes a snapshot of its histograms and
+    counters to METRICS_DIR; rendering merges every live worker's
+    snapshot so a scrape returns the same totals whichever worker
+    answers it.
+    """
+
+    def __init__(self, directory: str = METRICS_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, Dict[str, str]]] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+        self._flusher = None
+
+    # ─── Recording ───────────────────────────────────────────────────────
+
+    def observe(self, name: str, seconds: float, **labels):
+        """
+        Record a latency observation.
+
+        Args:
+            name: Metric name (without prefix)
+            seconds: Observed duration in seconds
+            **labels: Metric labels
+        """
+        key = _key(name, labels)
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = Histogram()
+                self._meta[key] = (name, labels)
+            h.observe(seconds)
+        self._ensure_flusher()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        Increment a counter.
+
+        Args:
+            name: Metric name (without prefix)
+            value: Amount to add
+            **labels: Metric labels
+        """
+        key = _key(name, labels)
+        with self._lock:
+            if key not in self.counters:
+                self._meta[key] = (name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+        self._ensure_flusher()
+
+    @contextmanager
+    def request(self, endpoint: str):
+        """
+        Time a whole request and label nested stages with its endpoint.
+
+        The request is labelled tenant="unauthenticated" until the handler
+        calls authenticated(): agent ids in the body are client input, and
+        labelling by them before the passport checks out would let anyone
+        mint unbounded label values.
+
+        Args:
+            endpoint: Endpoint path (e.g. '/query')
+        """
+        labels = {"endpoint": endpoint, "tenant": UNAUTHENTICATED}
+        token = _endpoint.set(endpoint)
+        labels_token = _request_labels.set(labels)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("request_seconds", time.perf_counter() - start, **labels)
+            _request_labels.reset(labels_token)
+            _endpoint.reset(token)
+
+    def authenticated(self, tenant: str):
+        """
+        Label the current request with a tenant whose passport verified.
+
+        Args:
+            tenant: Agent identifier
+        """
+        labels = _request_labels.get()
+        if labels is not None:
+            labels["tenant"] = tenant
+
+    @contextmanager
+    def stage(self, stage: str):
+        """
+        Time one stage of the current request.
+
+        Args:
+            stage: Stage name (e.g. 'encode', 'rerank')
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start,
+                         endpoint=_endpoint.get(), stage=stage)
+
+    # ─── Aggregation ─────────────────────────────────────────────────────
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get a serializable copy of this process's metrics.
+
+        Returns:
+            Dictionary with histograms and counters
+        """
+        with self._lock:
+            return {
+                "histograms": {
+                    k: {"name": self._meta[k][0], "labels": self._meta[k][1],
+                        "counts": list(h.counts), "sum": h.sum, "count": h.count}
+                    for k, h in self.histograms.items()
+                },
+                "counters": {
+                    k: {"name": self._meta[k][0], "labels": self._meta[k][1], "value": v}
+                    for k, v in self.counters.items()
+                }
+            }
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"worker-{pid}.json")
+
+    def _retire(self, path: str):
+        """
+        Fold a dead worker's snapshot into retired.json.
+
+        Without this its totals would vanish from the merge and every
+        counter would go backwards when a worker restarts. The rename
+        claims the file so only one surviving worker folds it in.
+        """
+        claimed = path + f".retiring-{os.getpid()}"
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return  # another worker claimed it
+        retired = os.path.join(self.directory, "retired.json")
+        try:
+            with open(claimed) as f:
+                snap = json.load(f)
+            with open(retired + ".lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                total = {"histograms": {}, "counters": {}}
+                if os.path.exists(retired):
+                    with open(retired) as f:
+                        total = json.load(f)
+                _combine(total, snap)
+                with open(retired + ".tmp", "w") as f:
+                    json.dump(total, f)
+                os.replace(retired + ".tmp", retired)
+        except Exception as e:
+            logger.warning(f"Dropping metrics snapshot {os.path.basename(path)}: {e}")
+        finally:
+            os.remove(claimed)
+
+    def flush(self):
+        """Write this worker's snapshot for other workers to merge."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(os.getpid())
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            logger.error(f"Failed to flush metrics: {e}")
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+
+            def loop():
+                while True:
+                    time.sleep(FLUSH_INTERVAL)
+                    self.flush()
+
+            self._flusher = threading.Thread(target=loop, daemon=True)
+            self._flusher.start()
+
+    def _worker_snapshots(self) -> List[Dict[str, Any]]:
+        snaps = [self.snapshot()]
+        if not os.path.isdir(self.directory):
+            return snaps
+        for fname in os.listdir(self.directory):
+            if not (fname.startswith("worker-") and fname.endswith(".json")):
+                continue
+            pid = int(fname[len("worker-"):-len(".json")])
+            if pid == os.getpid():
+                continue
+            path = os.path.join(self.directory, fname)
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                # Dead worker; keep its totals so counters stay monotonic
+                self._retire(path)
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(path) as f:
+                    snaps.append(json.load(f))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable metrics snapshot {fname}: {e}")
+        retired = os.path.join(self.directory, "retired.json")
+        if os.path.exists(retired):
+            try:
+                with open(retired) as f:
+                    snaps.append(json.load(f))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable retired metrics: {e}")
+        return snaps
+
+    def merged(self) -> Dict[str, Any]:
+        """
+        Merge snapshots from every live worker plus retired totals.
+
+        Returns:
+            Snapshot-shaped dictionary with summed values
+        """
+        out = {"histograms": {}, "counters": {}}
+        for snap in self._worker_snapshots():
+            _combine(out, snap)
+        return out
+
+    # ─── Exposition ──────────────────────────────────────────────────────
+
+    def render(self) -> str:
+        """
+        Render merged metrics in Prometheus text exposition format.
+
+        Returns:
+            Exposition text
+        """
+        data = self.merged()
+        lines: List[str] = []
+
+        def fmt(labels: Dict[str, str]) -> str:
+            if not labels:
+                return ""
+            esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in sorted(labels.items())) + "}"
+
+        by_name: Dict[str, List[Dict[str, Any]]] = {}
+        for h in data["histograms"].values():
+            by_name.setdefault(h["name"], []).append(h)
+        for name in sorted(by_name):
+            full = PREFIX + name
+            lines.append(f"# HELP {full} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {full} histogram")
+            for h in by_name[name]:
+                cumulative = 0
+                for bound, n in zip(list(BUCKETS) + ["+Inf"], h["counts"]):
+                    cumulative += n
+                    lines.append(f"{full}_bucket{fmt({**h['labels'], 'le': str(bound)})} {cumulative}")
+                lines.append(f"{full}_sum{fmt(h['labels'])} {h['sum']}")
+                lines.append(f"{full}_count{fmt(h['labels'])} {h['count']}")
+
+        by_name = {}
+        for c in data["counters"].values():
+            by_name.setdefault(c["name"], []).append(c)
+        for name in sorted(by_name):
+            full = PREFIX + name
+            lines.append(f"# HELP {full} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {full} counter")
+            for c in by_name[name]:
+                lines.append(f"{full}{fmt(c['labels'])} {c['value']}")
+
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
@@ -0,0 +1,146 @@
+import json
+from typing import Optional
+from urllib.parse import parse_qs
+import logging
+
+from fastapi import HTTPException
+
+from core.subscription import Subs, subs
+
+logger = logging.getLogger(__name__)
+
+# Allowance for multipart boundaries and form fields around the file
+UPLOAD_SLACK = 64 * 1024
+# Bytes per chunk besides its text: offsets entry and tombstone flag
+CHUNK_OVERHEAD = 9
+
+def _within(value: int, limit: int) -> bool:
+    return limit < 0 or value <= limit
+
+class Quotas:
+    """
+    Enforces the per-plan ingest limits from ``Subs.get_limits``.
+
+    ``max_file_size`` bounds a single upload, ``documents`` the number
+    of distinct sources a tenant holds and ``storage_bytes`` its index
+    footprint (see SimpleRetriever.footprint). A limit of -1 means
+    unlimited.
+    """
+
+    def __init__(self, subscriptions: Subs = subs):
+        self.subs = subscriptions
+
+    def upload_limit(self, agent: str) -> int:
+        """
+        Largest request body accepted for an agent's upload.
+
+        Args:
+            agent: Agent identifier
+
+        Returns:
+            Byte limit, or -1 for unlimited
+        """
+        limit = self.subs.get_limits(agent)["max_file_size"]
+        return limit + UPLOAD_SLACK if limit >= 0 else -1
+
+    def check_upload(self, agent: str, size: int) -> Optional[str]:
+        """
+        Check an upload's size against the agent's plan.
+
+        Args:
+            agent: Agent identifier
+            size: Upload size in bytes
+
+        Returns:
+            'file_too_large' if over the limit, else None
+        """
+        if not _within(size, self.subs.get_limits(agent)["max_file_size"]):
+            return "file_too_large"
+        return None
+
+    def check_ingest(self, agent: str, retriever, source: str, replace: bool,
+                     size: int, text_bytes: int, chunks: int) -> Optional[str]:
+        """
+        Check an ingest against the agent's plan.
+
+        Args:
+            agent: Agent identifier
+            retriever: The tenant's retriever
+            source: Source name of the upload
+            replace: Whether the upload replaces ``source``
+            size: Upload size in bytes
+            text_bytes: UTF-8 size of the chunks to index
+            chunks: Number of chunks to index
+
+        Returns:
+            Error code if a limit would be exceeded, else None
+        """
+        refused = self.check_upload(agent, size)
+        if refused:
+            return refused
+
+        limits = self.subs.get_limits(agent)
+        usage = retriever.footprint()
+        is_new = not (replace and retriever.meta.source_records(source))
+        if is_new and not _within(usage["documents"] + 1, limits["documents"]):
+            return "document_limit_reached"
+
+        # replaced rows stay allocated until compaction, so count them too
+        dim = retriever.model.dim
+        added = text_bytes + chunks * (dim * 4 + CHUNK_OVERHEAD)
+        if not _within(usage["total_bytes"] + added, limits.get("storage_bytes", -1)):
+            return "storage_quota_exceeded"
+        return None
+
+quotas = Quotas()
+
+class UploadLimit:
+    """
+    ASGI middleware rejecting oversized uploads before their body is read.
+
+    Requests to ``paths`` with a Content-Length above the agent's upload
+    limit get a 413 straight away; bodies without a length are counted
+    as they stream in and fail with 413 once they pass the limit.
+    """
+
+    def __init__(self, app, paths=("/ingest",), quota: Quotas = quotas):
+        self.app = app
+        self.paths = set(paths)
+        self.quota = quota
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        agent = parse_qs(scope.get("query_string", b"").decode()).get("agent_id", [""])[0]
+        limit = self.quota.upload_limit(agent)
+        if limit < 0:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        length = headers.get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            logger.warning(f"Rejected {int(length)} byte upload from {agent} (limit {limit})")
+            body = json.dumps({"detail": "file_too_large"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode()),
+                            (b"connection", b"close")]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        received = 0
+
+        async def counted():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail="file_too_large")
+            return message
+
+        await self.app(scope, counted, send)
@@ -16,12 +16,13 @@ class Limit:
         self.per_day = per_day
         self.window_seconds = 86400  # 24 hours
     
-    def allow(self, agent: str) -> bool:
+    def allow(self, agent: str, units: int = 1) -> bool:
         """
         Check if an agent is allowed to make a request.
         
         Args:
             agent: Agent identifier
+            units: Number of calls the request counts as (batch size)
             
         Returns:
             True if request is allowed, False if rate limited
@@ -36,12 +37,12 @@ class Limit:
             ]
             
             # Check if limit exceeded
-            if len(self.calls[agent]) >= self.per_day:
+            if len(self.calls[agent]) + units > self.per_day:
                 logger.warning(f"Rate limit exceeded for agent: {agent}")
                 return False
             
             # Record this call
-            self.calls[agent].append(now)
+            self.calls[agent].extend([now] * units)
             return True
             
         except Exception as e:
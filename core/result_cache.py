@@ -0,0 +1,55 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """
+    Bounded LRU of recent search results.
+    Keys include the tenant's index version, so entries never outlive
+    the index they were computed against.
+    """
+    
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a cached result.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            Cached value or None
+        """
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: Hashable, value: Any):
+        """
+        Store a result, evicting the least recently used entry if full.
+        
+        Args:
+            key: Cache key
+            value: Result to cache
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+results_cache = ResultCache()
@@ -1,10 +1,29 @@
-from sentence_transformers import SentenceTransformer, CrossEncoder
+import os
+import threading
+import time
+from contextlib import contextmanager
 import numpy as np
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 import logging
 
+from core.metrics import metrics
+from core.chunkstore import ChunkStore
+from core.embed_pool import embed_pool
+from core.embed_cache import query_embeddings
+from core.metadata import MetadataIndex
+from core.backends import backends, Embedder, Reranker
+
 logger = logging.getLogger(__name__)
 
+# Compact once this fraction of rows is tombstoned
+COMPACT_RATIO = float(os.getenv("COMPACT_RATIO", "0.25"))
+COMPACT_MIN_ROWS = 1024
+# How long compaction waits for in-flight searches before retrying later
+COMPACT_WAIT = 5.0
+# Filters matching less than this fraction of rows score only the matching
+# rows; broader filters score everything and mask the rest out
+PREFILTER_RATIO = 0.3
+
 def chunk_text(t: str, n: int = 300) -> List[str]:
     """
     Split text into chunks of size n.
@@ -20,51 +39,520 @@ def chunk_text(t: str, n: int = 300) -> List[str]:
         return []
     return [t[i:i+n] for i in range(0, len(t), n)]
 
+def normalize_query(q: str) -> str:
+    """
+    Canonical form of a query for cache and coalescing keys.
+    
+    Args:
+        q: Query text
+        
+    Returns:
+        Lowercased query with collapsed whitespace
+    """
+    return " ".join(q.lower().split())
+
 class SimpleRetriever:
     """
-    Simple semantic retriever using sentence transformers and cross-encoder reranking.
+    Simple semantic retriever: dense embedding search plus reranking.
+    Backends are pluggable (see core.backends); by default sentence
+    transformers and a cross-encoder.
+
+    Deleting or replacing a source only tombstones its rows, which
+    searches mask out. Once enough rows are dead a background thread
+    compacts the index; callers that hold row indices across several
+    calls wrap them in ``reading()`` so compaction cannot renumber rows
+    underneath them.
+
+    Searches take optional metadata ``filters`` (see
+    core.metadata.MetadataIndex.match) applied before scoring.
     """
     
-    def __init__(self):
-        self.docs: List[str] = []
-        self.meta: List[Dict[str, Any]] = []
+    def __init__(self, model: Embedder = None, reranker: Reranker = None):
+        """
+        Args:
+            model: Embedding backend; defaults to the deployment embedder
+            reranker: Reranking backend; defaults to the deployment reranker
+        """
+        self.docs = ChunkStore()  # chunk texts, decoded on access
+        self.meta = MetadataIndex()  # per-document metadata, indexed by row
+        self._emb: np.ndarray = None  # row buffer, grown geometrically
+        self._tomb: np.ndarray = None  # deleted-row bitmap, same capacity as _emb
+        self.deleted = 0  # tombstoned rows not yet compacted
+        self.version = 0  # bumped on every index change
+        self.generation = 0  # bumped when compaction renumbers rows
+        self._write_lock = threading.Lock()
+        self._readers = 0
+        self._readers_cv = threading.Condition()
+        self._compacting = False
         
         try:
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
-            self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-            logger.info("Retriever models loaded successfully")
+            self.model = model or backends.embedder()
+            self.reranker = reranker or backends.reranker()
+            logger.info(f"Retriever using {self.model.name} / {self.reranker.name}")
         except Exception as e:
             logger.error(f"Error loading retriever models: {e}")
             raise
 
-    def add_documents(self, chunks: List[str], source_name: str):
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Document embedding matrix, one row per entry in ``docs``."""
+        if self._emb is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._emb[:len(self.docs)]
+
+    def _append_embeddings(self, vecs: np.ndarray):
+        n = len(self.docs)
+        if self._emb is None:
+            cap = max(len(vecs), 1024)
+            self._emb = np.empty((cap, vecs.shape[1]), dtype=np.float32)
+            self._tomb = np.zeros(cap, dtype=bool)
+        elif n + len(vecs) > len(self._emb):
+            cap = max(2 * len(self._emb), n + len(vecs))
+            grown = np.empty((cap, self._emb.shape[1]), dtype=np.float32)
+            grown[:n] = self._emb[:n]
+            tomb = np.zeros(cap, dtype=bool)
+            tomb[:n] = self._tomb[:n]
+            self._emb, self._tomb = grown, tomb
+        self._emb[n:n + len(vecs)] = vecs
+
+    def restore(self, docs: ChunkStore, meta: MetadataIndex, embeddings: np.ndarray,
+                version: int, tombstones: List[int] = (), generation: int = 0):
+        """
+        Replace the index with previously persisted state.
+        
+        ``embeddings`` may be a read-only memory map; it is copied into a
+        writable buffer only when the next ingest needs to grow it.
+        
+        Args:
+            docs: Chunk texts
+            meta: Metadata covering every row
+            embeddings: Embedding matrix with one row per chunk
+            version: Index version to resume from
+            tombstones: Indices of deleted rows
+            generation: Compaction generation the rows belong to
+        """
+        with self._write_lock:
+            self._emb = embeddings if len(docs) else None
+            self._tomb = np.zeros(len(docs), dtype=bool) if len(docs) else None
+            if len(tombstones):
+                self._tomb[np.asarray(tombstones, dtype=np.int64)] = True
+            self.deleted = int(len(tombstones))
+            if self.deleted:
+                # deletes are per document, so a dead first row means a dead record
+                meta.kill(r for r in range(len(meta.records)) if self._tomb[meta.starts[r]])
+            self.meta = meta
+            self.docs = docs
+            self.version = version
+            self.generation = generation
+        self._maybe_compact()
+
+    @property
+    def tombstones(self) -> np.ndarray:
+        """Indices of deleted rows awaiting compaction."""
+        if not self.deleted:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self._tomb[:len(self.docs)])
+
+    def sources(self) -> Dict[str, int]:
+        """
+        Live chunk counts per source.
+        
+        Returns:
+            Dictionary mapping source name to chunk count
+        """
+        return self.meta.sources()
+
+    def footprint(self) -> Dict[str, int]:
+        """
+        Memory held by the index, from sizes the stores keep up to date.
+
+        Rows and bytes include tombstoned rows until compaction frees
+        them; ``allocated_bytes`` adds the spare capacity of the
+        geometrically grown buffers.
+
+        Returns:
+            Dictionary of counts and byte sizes
+        """
+        rows = len(self.docs)
+        emb_bytes = rows * self._emb.shape[1] * 4 if self._emb is not None else 0
+        index_bytes = self.meta.nbytes + (len(self._tomb) if self._tomb is not None else 0)
+        total = emb_bytes + self.docs.nbytes + index_bytes
+        return {
+            "documents": self.meta.n_sources,
+            "chunks": rows - self.deleted,
+            "rows": rows,
+            "embedding_bytes": emb_bytes,
+            "text_bytes": self.docs.nbytes,
+            "index_bytes": index_bytes,
+            "total_bytes": total,
+            "allocated_bytes": total - emb_bytes + (self._emb.nbytes if self._emb is not None else 0)
+        }
+
+    def add_documents(self, chunks: List[str], source_name: str, metadata: Optional[Dict[str, Any]] = None):
         """
         Add document chunks to the retriever.
         
+        Chunks are embedded once here so searches only encode the query.
+        
         Args:
             chunks: List of text chunks to add
             source_name: Source filename or identifier
+            metadata: Optional document metadata (e.g. tags, timestamp)
+                shared by all of its chunks
         """
         try:
-            for c in chunks:
-                if c.strip():  # Only add non-empty chunks
-                    self.docs.append(c)
-                    self.meta.append({"source": source_name})
+            kept = [c for c in chunks if c.strip()]  # Only add non-empty chunks
+            if kept:
+                vecs = self.encode(kept)
+                with self._write_lock:
+                    self._add(kept, vecs, source_name, metadata)
+                    self.version += 1
             logger.info(f"Added {len(chunks)} chunks from {source_name}")
         except Exception as e:
             logger.error(f"Error adding documents: {e}")
             raise
 
-    def search(self, q: str, top_k: int = 5) -> Tuple[List[str], List[Dict], List[float]]:
+    def _add(self, kept: List[str], vecs: np.ndarray, source_name: str, metadata: Optional[Dict[str, Any]]):
+        self._append_embeddings(vecs)
+        # meta before docs: concurrent searches bound by len(docs)
+        self.meta.append({"source": source_name, **(metadata or {})}, len(kept))
+        self.docs.extend(kept)
+
+    def _tombstone(self, source_name: str) -> int:
+        rids = self.meta.source_records(source_name)
+        rows = self.meta.rows(rids)
+        if len(rows):
+            self._tomb[rows] = True
+            self.deleted += len(rows)
+            self.meta.kill(rids)
+        return len(rows)
+
+    def delete_source(self, source_name: str) -> int:
+        """
+        Delete every chunk that came from a source.
+        
+        Rows are tombstoned and masked out of searches immediately; their
+        storage is reclaimed by background compaction.
+        
+        Args:
+            source_name: Source filename or identifier
+            
+        Returns:
+            Number of chunks deleted
+        """
+        with self._write_lock:
+            removed = self._tombstone(source_name)
+            if removed:
+                self.version += 1
+        if removed:
+            logger.info(f"Deleted {removed} chunks from {source_name}")
+            self._maybe_compact()
+        return removed
+
+    def replace_source(self, chunks: List[str], source_name: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Replace a source's chunks with a new version of the document.
+        
+        The new chunks are embedded first; the old rows are then
+        tombstoned and the new ones appended in one step, so searches see
+        either the old document or the new one, never both or neither.
+        
+        Args:
+            chunks: List of text chunks for the new version
+            source_name: Source filename or identifier
+            metadata: Optional document metadata for the new version
+            
+        Returns:
+            Number of old chunks replaced
+        """
+        try:
+            kept = [c for c in chunks if c.strip()]
+            vecs = self.encode(kept) if kept else None
+            with self._write_lock:
+                removed = self._tombstone(source_name)
+                if kept:
+                    self._add(kept, vecs, source_name, metadata)
+                if removed or kept:
+                    self.version += 1
+            logger.info(f"Replaced {removed} chunks from {source_name} with {len(kept)}")
+            if removed:
+                self._maybe_compact()
+            return removed
+        except Exception as e:
+            logger.error(f"Error replacing documents: {e}")
+            raise
+
+    # ─── Compaction ──────────────────────────────────────────────────────
+
+    @contextmanager
+    def reading(self):
+        """
+        Pin row indices for the duration of a multi-step read.
+        
+        Compaction renumbers rows, so it waits until no reader is active.
+        """
+        with self._readers_cv:
+            self._readers += 1
+        try:
+            yield self
+        finally:
+            with self._readers_cv:
+                self._readers -= 1
+                if not self._readers:
+                    self._readers_cv.notify_all()
+
+    def _maybe_compact(self):
+        n = len(self.docs)
+        if n < COMPACT_MIN_ROWS or self.deleted < COMPACT_RATIO * n or self._compacting:
+            return
+        self._compacting = True
+        threading.Thread(target=self.compact, name="compact", daemon=True).start()
+
+    def compact(self) -> bool:
+        """
+        Drop tombstoned rows and renumber the index.
+        
+        Returns:
+            True if the index was compacted
+        """
+        try:
+            with self._write_lock:
+                if not self.deleted:
+                    return False
+                live = np.flatnonzero(~self._tomb[:len(self.docs)])
+                emb = np.ascontiguousarray(self.embeddings[live], dtype=np.float32)
+                docs = self.docs.take(live)
+                meta = self.meta.compacted()
+                dropped = len(self.docs) - len(docs)
+
+                with self._readers_cv:
+                    if not self._readers_cv.wait_for(lambda: self._readers == 0, timeout=COMPACT_WAIT):
+                        logger.warning("Compaction deferred: searches still in flight")
+                        return False
+                    self._emb = emb if len(docs) else None
+                    self._tomb = np.zeros(len(docs), dtype=bool) if len(docs) else None
+                    self.meta, self.docs = meta, docs
+                    self.deleted = 0
+                    self.generation += 1
+            logger.info(f"Compacted index: dropped {dropped} rows, {len(docs)} remain")
+            return True
+        except Exception as e:
+            logger.error(f"Error compacting index: {e}")
+            return False
+        finally:
+            self._compacting = False
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a batch of texts in a single forward pass.
+        
+        Large batches (ingests) are spread over the embedding process
+        pool when EMBED_WORKERS is set.
+        
+        Args:
+            texts: Texts to embed
+            
+        Returns:
+            Float32 matrix with one row per text
+        """
+        if embed_pool.worth_it(len(texts)):
+            return embed_pool.encode(self.model, texts)
+        with metrics.stage("encode"):
+            return self.model.encode(texts)
+
+    def encode_queries(self, qs: List[str]) -> np.ndarray:
+        """
+        Embed query texts through the process-wide query embedding cache.
+        
+        Queries are normalized (see ``normalize_query``) and only texts
+        not cached for this embedder are encoded, in one batch; the
+        normalized text is what gets embedded, so a cached vector is the
+        same whichever spelling filled it.
+        
+        Args:
+            qs: Query texts
+            
+        Returns:
+            Float32 matrix with one row per query
+        """
+        keys = [normalize_query(q) for q in qs]
+        vecs = query_embeddings.get_many(self.model, keys)
+        missing = list(dict.fromkeys(k for k, v in zip(keys, vecs) if v is None))
+        if missing:
+            start = time.perf_counter()
+            fresh = np.asarray(self.encode(missing), dtype=np.float32)
+            query_embeddings.put_many(self.model, missing, fresh, time.perf_counter() - start)
+            found = dict(zip(missing, fresh))
+            vecs = [found[k] if v is None else v for k, v in zip(keys, vecs)]
+        return np.stack(vecs) if vecs else np.zeros((0, 0), dtype=np.float32)
+
+    def select(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Resolve metadata filters to the rows a search may return.
+        
+        Args:
+            filters: Filter dictionary, or None/empty for no filter
+            
+        Returns:
+            Ascending row indices, or None when unfiltered
+        """
+        if not filters:
+            return None
+        with metrics.stage("filter"):
+            rows = self.meta.rows(self.meta.match(filters))
+            return rows[rows < len(self.docs)]
+
+    def _scores(self, qvs: np.ndarray, rows: Optional[np.ndarray]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Similarities of query vectors against the searchable rows.
+        
+        Returns:
+            Tuple of (score matrix, row ids of its columns or None for all rows);
+            excluded rows score -inf
+        """
+        n = len(self.docs)
+        if rows is not None and len(rows) < PREFILTER_RATIO * n:
+            # Selective filter: only score matching rows (live by construction)
+            return qvs @ self.embeddings[rows].T, rows
+        sims = qvs @ self.embeddings.T
+        if rows is not None:
+            excluded = np.ones(n, dtype=bool)
+            excluded[rows] = False
+            sims[:, excluded] = -np.inf
+        elif self.deleted:
+            sims[:, self._tomb[:n]] = -np.inf
+        return sims, None
+
+    def dense_search(self, qv: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> List[int]:
+        """
+        Rank documents by dot-product similarity to a query vector.
+        
+        Args:
+            qv: Query embedding
+            k: Number of candidates to return
+            rows: Restrict to these rows (see ``select``)
+            
+        Returns:
+            Document indices, best first
+        """
+        return self.dense_search_batch(qv[None, :], k, rows)[0]
+
+    def rerank(self, q: str, idx: List[int]) -> Tuple[List[int], List[float]]:
+        """
+        Score candidates with the cross-encoder in one batch.
+        
+        Args:
+            q: Query text
+            idx: Candidate document indices
+            
+        Returns:
+            Tuple of (indices ordered by reranker score, scores)
+        """
+        if not idx:
+            return [], []
+        with metrics.stage("rerank"):
+            scores = self.reranker.predict([[q, self.docs[i]] for i in idx])
+        order = np.argsort(-np.asarray(scores))
+        return [idx[o] for o in order], [float(scores[o]) for o in order]
+
+    def dense_search_batch(self, qvs: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> List[List[int]]:
+        """
+        Rank documents for many query vectors with one matrix multiply.
+        
+        Args:
+            qvs: Query embedding matrix, one row per query
+            k: Number of candidates per query
+            rows: Restrict to these rows (see ``select``)
+            
+        Returns:
+            Per-query document indices, best first
+        """
+        if not self.docs or (rows is not None and not len(rows)):
+            return [[] for _ in range(len(qvs))]
+        with metrics.stage("score"):
+            sims, cols = self._scores(qvs, rows)
+            k = min(k, sims.shape[1])
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            top_sims = np.take_along_axis(sims, top, axis=1)
+            order = np.argsort(-top_sims, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_sims = np.take_along_axis(top_sims, order, axis=1)
+            if cols is not None:
+                top = cols[top]
+            return [
+                [int(i) for i, v in zip(row, vals) if v != -np.inf]
+                for row, vals in zip(top, top_sims)
+            ]
+
+    def rerank_batch(self, qs: List[str], idx_lists: List[List[int]]) -> List[Tuple[List[int], List[float]]]:
+        """
+        Rerank candidates for many queries in a single cross-encoder call.
+        
+        Args:
+            qs: Query texts
+            idx_lists: Candidate indices per query
+            
+        Returns:
+            Per-query (indices ordered by score, scores)
+        """
+        pairs = [[q, self.docs[i]] for q, idx in zip(qs, idx_lists) for i in idx]
+        with metrics.stage("rerank"):
+            flat = np.asarray(self.reranker.predict(pairs)) if pairs else np.zeros(0)
+        out, pos = [], 0
+        for idx in idx_lists:
+            scores = flat[pos:pos + len(idx)]
+            pos += len(idx)
+            order = np.argsort(-scores)
+            out.append(([idx[o] for o in order], [float(scores[o]) for o in order]))
+        return out
+
+    def search_batch(self, qs: List[str], top_k: int = 5,
+                     filters: Optional[Dict[str, Any]] = None) -> List[Tuple[List[str], List[Dict], List[float]]]:
+        """
+        Search for many queries at once.
+        
+        Encodes all queries in one forward pass, scores them against the
+        embedding matrix in one multiply and reranks every pair in one call.
+        
+        Args:
+            qs: Query texts
+            top_k: Number of results per query
+            filters: Metadata filters applied to every query
+            
+        Returns:
+            Per-query tuples of (candidate texts, citations, reranker scores)
+        """
+        if not self.docs or not qs:
+            return [([], [], []) for _ in qs]
+        
+        try:
+            qvs = self.encode_queries(qs)
+            with self.reading():
+                rows = self.select(filters)
+                ranked = self.rerank_batch(qs, self.dense_search_batch(qvs, top_k, rows))
+                logger.info(f"Batch search completed: {len(qs)} queries")
+                return [
+                    ([self.docs[i] for i in idx], [self.meta[i] for i in idx], scores)
+                    for idx, scores in ranked
+                ]
+        except Exception as e:
+            logger.error(f"Error during batch search: {e}")
+            return [([], [], []) for _ in qs]
+
+    def search(self, q: str, top_k: int = 5, rerank: bool = True,
+               filters: Optional[Dict[str, Any]] = None) -> Tuple[List[str], List[Dict], List[float]]:
         """
         Search for relevant documents using semantic similarity and reranking.
         
         Args:
             q: Query text
             top_k: Number of results to return
+            rerank: Score with the cross-encoder; when False the dense
+                similarities are returned instead (degraded mode)
+            filters: Metadata filters (source, tags, after, before)
             
         Returns:
-            Tuple of (candidate texts, citations, reranker scores)
+            Tuple of (candidate texts, citations, scores)
         """
         if not self.docs:
             logger.warning("No documents available for search")
@@ -75,30 +563,19 @@ class SimpleRetriever:
             return [], [], []
         
         try:
-            # Encode query
-            qv = self.model.encode([q])[0]
-            
-            # Encode all documents
-            dv = self.model.encode(self.docs)
-            
-            # Compute similarities
-            sims = np.dot(dv, qv)
-            
-            # Get top-k candidates
-            top_k = min(top_k, len(self.docs))
-            idx = sims.argsort()[-top_k:][::-1]
-            
-            cands = [self.docs[i] for i in idx]
-            
-            # Rerank candidates
-            pairs = [[q, c] for c in cands]
-            scores = self.reranker.predict(pairs)
-            
-            # Get citations
-            cites = [self.meta[i] for i in idx]
+            qv = self.encode_queries([q])[0]
+            with self.reading():
+                idx = self.dense_search(qv, top_k, self.select(filters))
+                if rerank:
+                    idx, scores = self.rerank(q, idx)
+                else:
+                    scores = [float(x) for x in self.embeddings[idx] @ qv]
+                
+                cands = [self.docs[i] for i in idx]
+                cites = [self.meta[i] for i in idx]
             
             logger.info(f"Search completed: {len(cands)} results")
-            return cands, cites, list(scores)
+            return cands, cites, scores
             
         except Exception as e:
             logger.error(f"Error during search: {e}")
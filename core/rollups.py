@@ -0,0 +1,295 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_DB = os.getenv("ROLLUP_DB", os.path.join("data", "rollups.db"))
+BUCKET_SECONDS = 3600  # one row per agent per hour
+RETENTION_BUCKETS = 24 * 30  # hourly rows kept for 30 days
+FLUSH_INTERVAL = 2.0
+READ_TTL = 2.0  # seconds a computed leaderboard is reused
+
+# Counter columns, in table order
+COLUMNS = ("queries", "swarm_queries", "ingests", "chunks", "blocked",
+           "spend", "credit", "confidence_sum", "confidence_n")
+RANKABLE = ("queries", "swarm_queries", "ingests", "chunks", "spend", "credit", "confidence")
+ALL = "*"  # agent key of the platform-wide rows
+
+def _zero() -> List[float]:
+    return [0.0] * len(COLUMNS)
+
+class Rollups:
+    """
+    Incrementally maintained usage rollups per agent and per hour.
+
+    ``audit`` and ``ledger`` are called as events happen and only add to
+    in-memory deltas; a background thread folds the deltas into SQLite
+    tables (all-time totals per agent, hourly buckets per agent and for
+    the platform) with additive upserts, so several workers can share
+    the database. Reads never scan the audit log or wallet file: they
+    are primary-key lookups or an indexed top-N.
+    """
+
+    def __init__(self, path: str = ROLLUP_DB):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._rebuilding = threading.Lock()
+        self._pending: Dict[tuple, List[float]] = {}  # (agent, bucket or None) -> deltas
+        self._flusher = None
+        self._cache: Dict[tuple, Any] = {}
+
+    # ─── Store ───────────────────────────────────────────────────────────
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            cols = ", ".join(f"{c} REAL NOT NULL DEFAULT 0" for c in COLUMNS)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS totals (agent TEXT PRIMARY KEY, {cols}, last_seen REAL)")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS buckets (bucket INTEGER NOT NULL, agent TEXT NOT NULL, {cols}, "
+                "PRIMARY KEY (agent, bucket))"
+            )
+            for c in RANKABLE[:-1]:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS totals_{c} ON totals ({c} DESC)")
+            conn.execute("CREATE INDEX IF NOT EXISTS buckets_time ON buckets (bucket)")
+            self._local.conn = conn
+        return conn
+
+    # ─── Updates ─────────────────────────────────────────────────────────
+
+    def _add(self, agent: str, ts: float, **deltas: float):
+        bucket = int(ts - ts % BUCKET_SECONDS)
+        idx = [(COLUMNS.index(k), v) for k, v in deltas.items()]
+        with self._lock:
+            for key in ((agent, None), (agent, bucket), (ALL, bucket)):
+                row = self._pending.get(key)
+                if row is None:
+                    row = self._pending[key] = _zero()
+                for i, v in idx:
+                    row[i] += v
+        self._ensure_flusher()
+
+    def audit(self, event: str, agent: str, payload: Dict[str, Any], ts: Optional[float] = None):
+        """
+        Fold one audit event into the rollups.
+
+        Args:
+            event: Audit event type
+            agent: Agent identifier
+            payload: Event payload
+            ts: Event time; defaults to now
+        """
+        ts = ts or time.time()
+        conf = payload.get("confidence")
+        deltas: Dict[str, float] = {}
+        if event == "query":
+            deltas["queries"] = 1
+        elif event == "query_batch":
+            deltas["queries"] = payload.get("answered", 0)
+        elif event == "swarm_query":
+            deltas["swarm_queries"] = 1
+        elif event == "ingest":
+            deltas["ingests"] = 1
+            deltas["chunks"] = payload.get("chunks", 0)
+        elif event == "ethics_block":
+            deltas["blocked"] = 1
+        else:
+            return
+        if isinstance(conf, (int, float)):
+            deltas["confidence_sum"] = conf
+            deltas["confidence_n"] = 1
+        self._add(agent, ts, **deltas)
+
+    def ledger(self, kind: str, agent: str, amount: float, ts: Optional[float] = None):
+        """
+        Fold one wallet movement into the rollups.
+
+        Args:
+            kind: 'spend' or 'credit'
+            agent: Agent identifier
+            amount: Amount in USDC
+            ts: Event time; defaults to now
+        """
+        self._add(agent, ts or time.time(), **{kind: amount})
+
+    def flush(self):
+        """Write pending deltas to the database."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        sets = ", ".join(f"{c} = {c} + excluded.{c}" for c in COLUMNS)
+        marks = ", ".join("?" * len(COLUMNS))
+        now = time.time()
+        totals = [(agent, *row, now) for (agent, bucket), row in pending.items() if bucket is None]
+        buckets = [(bucket, agent, *row) for (agent, bucket), row in pending.items() if bucket is not None]
+        conn = self._db()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                f"INSERT INTO totals VALUES (?, {marks}, ?) ON CONFLICT (agent) DO UPDATE SET {sets}, "
+                "last_seen = excluded.last_seen", totals
+            )
+            conn.executemany(
+                f"INSERT INTO buckets VALUES (?, ?, {marks}) ON CONFLICT (agent, bucket) DO UPDATE SET {sets}",
+                buckets
+            )
+            conn.execute("DELETE FROM buckets WHERE bucket < ?", (now - RETENTION_BUCKETS * BUCKET_SECONDS,))
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            logger.error(f"Failed to flush rollups: {e}")
+            # keep the deltas for the next flush
+            with self._lock:
+                for key, row in pending.items():
+                    mine = self._pending.setdefault(key, _zero())
+                    for i, v in enumerate(row):
+                        mine[i] += v
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+
+            def loop():
+                while True:
+                    time.sleep(FLUSH_INTERVAL)
+                    self.flush()
+
+            self._flusher = threading.Thread(target=loop, daemon=True)
+            self._flusher.start()
+
+    def rebuild(self, audit_entries, wallet_txs) -> int:
+        """
+        Recompute every rollup from history (one-off backfill).
+
+        The wallet file only records credits, so spend starts from zero.
+
+        Args:
+            audit_entries: Audit log entries
+            wallet_txs: Wallet credit transactions
+
+        Returns:
+            Number of events folded in
+
+        Raises:
+            RuntimeError: If a rebuild is already running (two would
+                replay the history twice)
+        """
+        if not self._rebuilding.acquire(blocking=False):
+            raise RuntimeError("rollup rebuild already running")
+        try:
+            with self._lock:
+                self._pending.clear()  # already in the history being replayed
+            conn = self._db()
+            conn.execute("DELETE FROM totals")
+            conn.execute("DELETE FROM buckets")
+            n = 0
+            for entry in audit_entries:
+                self.audit(entry.get("event"), entry.get("agent"), entry.get("payload") or {}, entry.get("timestamp"))
+                n += 1
+            for tx in wallet_txs:
+                self.ledger("credit", tx["agent"], tx["amount"], tx.get("time"))
+                n += 1
+            self.flush()
+            self._cache.clear()
+            return n
+        finally:
+            self._rebuilding.release()
+
+    # ─── Reads ───────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _row(values) -> Dict[str, Any]:
+        out = {c: v for c, v in zip(COLUMNS, values)}
+        n = out.pop("confidence_n")
+        total = out.pop("confidence_sum")
+        for c in ("queries", "swarm_queries", "ingests", "chunks", "blocked"):
+            out[c] = int(out[c])
+        out["avg_confidence"] = round(total / n, 4) if n else None
+        return out
+
+    def agent(self, agent: str) -> Optional[Dict[str, Any]]:
+        """
+        All-time totals for one agent.
+
+        Args:
+            agent: Agent identifier
+
+        Returns:
+            Totals dictionary, or None if the agent has no activity
+        """
+        self.flush()
+        row = self._db().execute(
+            f"SELECT {', '.join(COLUMNS)}, last_seen FROM totals WHERE agent = ?", (agent,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"agent": agent, **self._row(row[:-1]), "last_seen": row[-1]}
+
+    def series(self, agent: str = ALL, hours: int = 24) -> List[Dict[str, Any]]:
+        """
+        Hourly buckets for an agent (or the platform), oldest first.
+
+        Args:
+            agent: Agent identifier; '*' for platform-wide
+            hours: Number of most recent buckets
+
+        Returns:
+            List of bucket dictionaries; hours without activity are omitted
+        """
+        self.flush()
+        now = time.time()
+        since = int(now - now % BUCKET_SECONDS) - (hours - 1) * BUCKET_SECONDS
+        rows = self._db().execute(
+            f"SELECT bucket, {', '.join(COLUMNS)} FROM buckets WHERE agent = ? AND bucket >= ? ORDER BY bucket",
+            (agent, since)
+        ).fetchall()
+        return [{"start": r[0], **self._row(r[1:])} for r in rows]
+
+    def top(self, by: str = "queries", limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Agents ranked by an all-time counter.
+
+        Args:
+            by: One of RANKABLE ('confidence' ranks by average confidence)
+            limit: Number of agents
+
+        Returns:
+            Ranked list of totals dictionaries
+
+        Raises:
+            ValueError: If ``by`` is not rankable
+        """
+        if by not in RANKABLE:
+            raise ValueError(f"cannot rank by {by}")
+        key = (by, limit)
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < READ_TTL:
+            return cached[1]
+        self.flush()
+        order = "confidence_sum / confidence_n DESC" if by == "confidence" else f"{by} DESC"
+        where = "confidence_n > 0" if by == "confidence" else f"{by} > 0"
+        rows = self._db().execute(
+            f"SELECT agent, {', '.join(COLUMNS)}, last_seen FROM totals WHERE {where} ORDER BY {order} LIMIT ?",
+            (limit,)
+        ).fetchall()
+        ranked = [
+            {"rank": i + 1, "agent": r[0], **self._row(r[1:-1]), "last_seen": r[-1]}
+            for i, r in enumerate(rows)
+        ]
+        self._cache[key] = (time.monotonic(), ranked)
+        return ranked
+
+rollups = Rollups()
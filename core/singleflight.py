@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, Callable, Dict, Hashable
+import logging
+
+from fastapi.concurrency import run_in_threadpool
+
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls into one execution.
+    The first caller for a key runs the function on the thread pool;
+    callers arriving while it is in flight await the same future on the
+    event loop, so N identical requests hold one worker thread, not N.
+    Runs on the event loop; not for use from worker threads.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.executed = 0
+        self.coalesced = 0
+    
+    async def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) once per key across concurrent callers.
+        
+        The execution is a task of its own, so a caller that goes away
+        (client disconnect) doesn't cancel it for the others.
+        
+        Args:
+            key: Identity of the computation
+            fn: Blocking function to execute on the thread pool
+            
+        Returns:
+            The shared result
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = asyncio.ensure_future(run_in_threadpool(fn, *args, **kwargs))
+            self._waiters[key] = 0
+            call.add_done_callback(lambda _: self._done(key))
+            self.executed += 1
+            metrics.inc("singleflight_executed_total")
+        else:
+            self._waiters[key] += 1
+            self.coalesced += 1
+            metrics.inc("singleflight_coalesced_total")
+        return await asyncio.shield(call)
+    
+    def _done(self, key: Hashable):
+        call = self._calls.pop(key)
+        waiters = self._waiters.pop(key, 0)
+        if waiters:
+            logger.debug(f"Coalesced {waiters} requests into one search")
+        if not call.cancelled():
+            call.exception()  # retrieved here in case every caller went away
+    
+    def stats(self) -> Dict[str, float]:
+        """
+        Get coalescing counters.
+        
+        Returns:
+            Dictionary with executed, coalesced and in-flight counts
+        """
+        total = self.executed + self.coalesced
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0
+        }
+
+flight = SingleFlight()
@@ -0,0 +1,127 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Startup:
+    """
+    Tracks cold-start phases and model warm state.
+
+    Phases are named ``import:*``, ``load:*`` and ``warmup:*`` so the
+    report shows where startup time goes (a ``load`` phase includes any
+    ``import`` it triggered). The service is ready only once every
+    configured backend is loaded and has run a dummy inference, and any
+    registered steps (e.g. snapshot restore) have completed.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.state = "starting"
+        self.error = None
+        self.ready_after = None
+        self.steps: List[Tuple[str, Callable[[], Any]]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time a named startup phase.
+
+        Args:
+            name: Phase name, e.g. 'load:embedder:hashing'
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases.append((name, elapsed))
+            logger.info(f"Startup phase {name}: {elapsed * 1000:.1f}ms")
+
+    def record(self, name: str, seconds: float):
+        """
+        Record a phase measured elsewhere.
+
+        Args:
+            name: Phase name
+            seconds: Duration in seconds
+        """
+        with self._lock:
+            self.phases.append((name, seconds))
+
+    def add_step(self, name: str, fn: Callable[[], Any]):
+        """
+        Register work to run after model warmup and before the service is ready.
+
+        Args:
+            name: Phase name, e.g. 'restore:tenants'
+            fn: Callable taking no arguments
+        """
+        self.steps.append((name, fn))
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def warmup(self):
+        """
+        Load every configured backend and run one dummy encode/rerank each.
+        """
+        from core.backends import backends
+
+        self.state = "warming"
+        try:
+            names = {(None, None)} | {
+                (c.get("embedder"), c.get("reranker")) for c in backends.tenants.values()
+            }
+            for emb_name, rr_name in names:
+                with self.phase(f"load:embedder:{emb_name or 'default'}"):
+                    embedder = backends.embedder(emb_name)
+                with self.phase(f"load:reranker:{rr_name or 'default'}"):
+                    reranker = backends.reranker(rr_name)
+                with self.phase(f"warmup:encode:{embedder.name}"):
+                    embedder.encode(["warmup query"])
+                with self.phase(f"warmup:rerank:{reranker.name}"):
+                    reranker.predict([["warmup query", "warmup passage"]])
+            for name, fn in self.steps:
+                with self.phase(name):
+                    fn()
+            self.state = "ready"
+            self.ready_after = time.perf_counter() - self.t0
+            logger.info(f"Warm and ready after {self.ready_after:.2f}s")
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.error(f"Warmup failed: {e}")
+
+    def start(self):
+        """Run warmup in the background so the process can answer probes meanwhile."""
+        threading.Thread(target=self.warmup, name="warmup", daemon=True).start()
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Get the startup state and per-phase timings.
+
+        Returns:
+            Dictionary with state, phase breakdown and totals
+        """
+        with self._lock:
+            phases = [{"phase": n, "ms": round(s * 1000, 2)} for n, s in self.phases]
+        totals: Dict[str, float] = {}
+        for p in phases:
+            kind = p["phase"].split(":", 1)[0]
+            totals[kind] = round(totals.get(kind, 0.0) + p["ms"], 2)
+        return {
+            "state": self.state,
+            "error": self.error,
+            "ready_after_s": round(self.ready_after, 3) if self.ready_after else None,
+            "totals_ms": totals,
+            "phases": phases
+        }
+
+startup = Startup()
@@ -1,9 +1,19 @@
-from typing import Dict, Any, Optional
+import os
+import sqlite3
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, Tuple
 from enum import Enum
 import logging
 
 logger = logging.getLogger(__name__)
 
+SUBSCRIPTION_DB = os.getenv("SUBSCRIPTION_DB", os.path.join("data", "subscriptions.db"))
+# Seconds a worker may serve cached records before checking the store for changes
+SUBS_TTL = float(os.getenv("SUBS_TTL", "2"))
+SUBS_CACHE_SIZE = 100000
+
 class SubscriptionStatus(str, Enum):
     """Subscription status types"""
     ACTIVE = "active"
@@ -18,14 +28,62 @@ class SubscriptionPlan(str, Enum):
     PRO = "pro"
     ENTERPRISE = "enterprise"
 
+# Usage limits per plan; built once and shared read-only by every lookup
+PLAN_LIMITS: Dict[str, Mapping[str, int]] = {
+    plan.value: MappingProxyType(limits) for plan, limits in {
+        SubscriptionPlan.FREE: {
+            "queries_per_day": 100,
+            "documents": 10,
+            "max_file_size": 1024 * 1024,  # 1MB
+            "storage_bytes": 64 * 1024 * 1024  # 64MB
+        },
+        SubscriptionPlan.BASIC: {
+            "queries_per_day": 1000,
+            "documents": 100,
+            "max_file_size": 10 * 1024 * 1024,  # 10MB
+            "storage_bytes": 512 * 1024 * 1024  # 512MB
+        },
+        SubscriptionPlan.PRO: {
+            "queries_per_day": 5000,
+            "documents": 1000,
+            "max_file_size": 50 * 1024 * 1024,  # 50MB
+            "storage_bytes": 4 * 1024 * 1024 * 1024  # 4GB
+        },
+        SubscriptionPlan.ENTERPRISE: {
+            "queries_per_day": -1,  # Unlimited
+            "documents": -1,  # Unlimited
+            "max_file_size": 100 * 1024 * 1024,  # 100MB
+            "storage_bytes": -1  # Unlimited
+        }
+    }.items()
+}
+
+FREE_LIMITS = PLAN_LIMITS[SubscriptionPlan.FREE.value]
+
+# Agents without a record
+DEFAULT_RECORD = (SubscriptionStatus.ACTIVE.value, SubscriptionPlan.FREE.value)
+
 class Subs:
     """
     Subscription management system.
     Tracks agent subscription status and plans.
+    
+    Records live in a SQLite database shared by every worker process;
+    lookups are served from an in-process read-through cache. Writes go
+    to the database and the local cache at once and bump a change
+    counter; other workers compare that counter at most every ``ttl``
+    seconds and drop their cache when it moved, so a change made in
+    one worker is seen everywhere within ``ttl``.
     """
     
-    def __init__(self):
-        self.records: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, path: str = SUBSCRIPTION_DB, ttl: float = SUBS_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.records: Dict[str, Tuple[str, str]] = {}  # agent -> (status, plan)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._version = -1
+        self._revalidate_at = 0.0
         self._init_default_subscriptions()
     
     def _init_default_subscriptions(self):
@@ -33,6 +91,95 @@ class Subs:
         # You can remove this in production
         pass
     
+    # ─── Store ───────────────────────────────────────────────────────────
+    
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS subscriptions ("
+                "agent TEXT PRIMARY KEY, status TEXT NOT NULL, plan TEXT NOT NULL, "
+                "activated_at REAL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('version', 0)")
+            self._local.conn = conn
+        return conn
+    
+    def _revalidate(self, now: float):
+        try:
+            (version,) = self._db().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        except sqlite3.Error as e:
+            # keep serving the cache; try again after the next TTL
+            logger.error(f"Subscription store unavailable: {e}")
+            self._revalidate_at = now + self.ttl
+            return
+        with self._lock:
+            if version != self._version:
+                self.records.clear()
+                self._version = version
+            self._revalidate_at = now + self.ttl
+    
+    def _lookup(self, agent: str) -> Tuple[str, str]:
+        if time.monotonic() >= self._revalidate_at:
+            self._revalidate(time.monotonic())
+        record = self.records.get(agent)
+        if record is None:
+            version = self._version
+            try:
+                row = self._db().execute(
+                    "SELECT status, plan FROM subscriptions WHERE agent = ?", (agent,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"Subscription lookup failed for {agent}: {e}")
+                return DEFAULT_RECORD
+            record = tuple(row) if row else DEFAULT_RECORD
+            with self._lock:
+                # a write (or revalidation) since the read may have made the row stale
+                if self._version == version:
+                    if len(self.records) >= SUBS_CACHE_SIZE:
+                        self.records.clear()
+                    self.records[agent] = record
+        return record
+    
+    def _write(self, agent: str, status: str, plan: Optional[str] = None):
+        now = time.time()
+        conn = self._db()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if plan is None:
+                    cur = conn.execute(
+                        "UPDATE subscriptions SET status = ?, updated_at = ? WHERE agent = ?",
+                        (status, now, agent)
+                    )
+                    if not cur.rowcount:
+                        conn.execute("ROLLBACK")
+                        return False
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO subscriptions VALUES (?, ?, ?, ?, ?)",
+                        (agent, status, plan, now, now)
+                    )
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+                (version,) = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            # our own write: forget just this agent rather than the whole cache,
+            # unless other workers wrote since we last looked
+            if version != self._version + 1:
+                self.records.clear()
+            self._version = version
+            self.records.pop(agent, None)
+        return True
+    
+    # ─── Lookups ─────────────────────────────────────────────────────────
+    
     def check(self, agent: str) -> str:
         """
         Check subscription status for an agent.
@@ -43,86 +190,76 @@ class Subs:
         Returns:
             Subscription status (active, inactive, suspended, trial)
         """
-        record = self.records.get(agent, {})
-        status = record.get("status", SubscriptionStatus.ACTIVE)
-        
-        logger.debug(f"Subscription check for {agent}: {status}")
-        return status
+        return self._lookup(agent)[0]
     
-    def activate(self, agent: str, plan: str = SubscriptionPlan.FREE):
+    def get_plan(self, agent: str) -> str:
         """
-        Activate a subscription for an agent.
+        Get the subscription plan for an agent.
         
         Args:
             agent: Agent identifier
-            plan: Subscription plan
+            
+        Returns:
+            Subscription plan name
         """
-        self.records[agent] = {
-            "status": SubscriptionStatus.ACTIVE,
-            "plan": plan,
-            "activated_at": None  # Add timestamp in production
-        }
-        logger.info(f"Activated {plan} subscription for {agent}")
+        return self._lookup(agent)[1]
     
-    def suspend(self, agent: str):
+    def get_limits(self, agent: str) -> Mapping[str, int]:
         """
-        Suspend a subscription.
+        Get usage limits based on subscription plan.
         
         Args:
             agent: Agent identifier
+            
+        Returns:
+            Read-only mapping of limits, shared by every agent on the plan
         """
-        if agent in self.records:
-            self.records[agent]["status"] = SubscriptionStatus.SUSPENDED
-            logger.warning(f"Suspended subscription for {agent}")
+        return PLAN_LIMITS.get(self._lookup(agent)[1], FREE_LIMITS)
     
-    def get_plan(self, agent: str) -> str:
+    def get(self, agent: str) -> Dict[str, Any]:
         """
-        Get the subscription plan for an agent.
+        Get an agent's stored subscription record, bypassing the cache.
         
         Args:
             agent: Agent identifier
             
         Returns:
-            Subscription plan name
+            Record dictionary, or the defaults if the agent has none
         """
-        record = self.records.get(agent, {})
-        return record.get("plan", SubscriptionPlan.FREE)
+        row = self._db().execute(
+            "SELECT status, plan, activated_at, updated_at FROM subscriptions WHERE agent = ?", (agent,)
+        ).fetchone()
+        if row is None:
+            status, plan = DEFAULT_RECORD
+            return {"agent": agent, "status": status, "plan": plan, "activated_at": None, "stored": False}
+        return {"agent": agent, "status": row[0], "plan": row[1], "activated_at": row[2],
+                "updated_at": row[3], "stored": True}
+    
+    # ─── Writes ──────────────────────────────────────────────────────────
     
-    def get_limits(self, agent: str) -> Dict[str, int]:
+    def activate(self, agent: str, plan: str = SubscriptionPlan.FREE):
         """
-        Get usage limits based on subscription plan.
+        Activate a subscription for an agent.
         
         Args:
             agent: Agent identifier
+            plan: Subscription plan
             
-        Returns:
-            Dictionary of limits
+        Raises:
+            ValueError: If the plan is unknown
         """
-        plan = self.get_plan(agent)
-        
-        limits = {
-            SubscriptionPlan.FREE: {
-                "queries_per_day": 100,
-                "documents": 10,
-                "max_file_size": 1024 * 1024  # 1MB
-            },
-            SubscriptionPlan.BASIC: {
-                "queries_per_day": 1000,
-                "documents": 100,
-                "max_file_size": 10 * 1024 * 1024  # 10MB
-            },
-            SubscriptionPlan.PRO: {
-                "queries_per_day": 5000,
-                "documents": 1000,
-                "max_file_size": 50 * 1024 * 1024  # 50MB
-            },
-            SubscriptionPlan.ENTERPRISE: {
-                "queries_per_day": -1,  # Unlimited
-                "documents": -1,  # Unlimited
-                "max_file_size": 100 * 1024 * 1024  # 100MB
-            }
-        }
+        plan = SubscriptionPlan(plan).value
+        self._write(agent, SubscriptionStatus.ACTIVE.value, plan)
+        logger.info(f"Activated {plan} subscription for {agent}")
+    
+    def suspend(self, agent: str):
+        """
+        Suspend a subscription.
         
-        return limits.get(plan, limits[SubscriptionPlan.FREE])
-
+        Args:
+            agent: Agent identifier
+        """
+        if self._write(agent, SubscriptionStatus.SUSPENDED.value):
+            logger.warning(f"Suspended subscription for {agent}")
+    
 subs = Subs()
@@ -1,7 +1,22 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
 from payments.ledger import _load
+from core.audit import auditor
+from core.rollups import rollups
+from portal.badge_history import history
+from portal.leaderboard import compute_leaderboard
+from core.singleflight import flight
+from core.embed_cache import query_embeddings
+from core.admission import query_admission, ingest_admission
+from contracts.engine import engine
+from core.backends import backends
+from core.subscription import subs
+from functions.webhooks import webhooks
+from tenants.manager import tm
+from identity.admin import require_admin
 
-router = APIRouter(prefix="/admin", tags=["admin"])
+# Operator endpoints: every one needs the X-Admin-Token header
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
 
 @router.get("/dashboard")
 def dashboard():
@@ -10,3 +25,86 @@ def dashboard():
         "agents": d.get("agents", {}),
         "recent_txs": list(reversed(d.get("txs", [])))[:50]
     }
+
+@router.get("/coalescing")
+def coalescing():
+    return flight.stats()
+
+@router.get("/embedding-cache")
+def embedding_cache():
+    return query_embeddings.stats()
+
+@router.get("/admission")
+def admission():
+    return {"query": query_admission.stats(), "ingest": ingest_admission.stats()}
+
+@router.get("/webhooks")
+def webhook_stats():
+    return {**webhooks.stats(), "endpoints": webhooks.hooks()}
+
+@router.post("/rollups/rebuild")
+def rebuild_rollups():
+    """Recompute the portal rollups from the audit log and wallet history."""
+    try:
+        return {"events": rollups.rebuild(auditor.read_all(), _load().get("txs", []))}
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="rebuild_in_progress")
+
+@router.get("/leaderboard")
+def leaderboard(by: str = "spend", limit: int = Query(10, ge=1, le=100)):
+    """Agents ranked by any rollup counter, wallet totals included."""
+    try:
+        return {"by": by, "agents": compute_leaderboard(by, limit, private=True)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/badges/{agent_id}")
+def award_badge(agent_id: str, badge: str):
+    return history.award(agent_id, badge)
+
+@router.get("/sla")
+def sla():
+    return {
+        "thresholds": engine.get_thresholds(),
+        "tenants": engine.report_all()
+    }
+
+@router.post("/backends/{agent_id}")
+def assign_backends(agent_id: str, embedder: Optional[str] = None, reranker: Optional[str] = None):
+    try:
+        backends.assign(agent_id, embedder=embedder, reranker=reranker)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"agent_id": agent_id, "backends": backends.tenants.get(agent_id, {})}
+
+@router.get("/subscriptions/{agent_id}")
+def get_subscription(agent_id: str):
+    return {**subs.get(agent_id), "limits": dict(subs.get_limits(agent_id))}
+
+@router.post("/subscriptions/{agent_id}")
+def set_subscription(agent_id: str, plan: Optional[str] = None, suspend: bool = False):
+    """Activate (or change) an agent's plan, or suspend it."""
+    if suspend:
+        subs.suspend(agent_id)
+    else:
+        try:
+            subs.activate(agent_id, plan or subs.get_plan(agent_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="unknown_plan")
+    return subs.get(agent_id)
+
+@router.post("/tenants/{agent_id}/evict")
+def evict_tenant(agent_id: str):
+    """Persist and unload a tenant (used by the shard router when it moves)."""
+    return {"agent_id": agent_id, "evicted": tm.evict(agent_id)}
+
+@router.get("/footprint")
+def footprint():
+    """Memory footprint of every tenant loaded in this process, largest first."""
+    return tm.footprints()
+
+@router.get("/tenants/{agent_id}/footprint")
+def tenant_footprint(agent_id: str):
+    if not tm.exists(agent_id):
+        raise HTTPException(status_code=404, detail="tenant_not_loaded")
+    return {"agent_id": agent_id, **tm.tenants[agent_id].footprint()}
@@ -1,6 +1,168 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_DB = os.getenv("WEBHOOK_DB", os.path.join("data", "webhooks.db"))
+BACKOFF_BASE = 2.0  # seconds before the first retry
+BACKOFF_MAX = 3600.0
+MAX_ATTEMPTS = 12  # about a day of retries before an item is parked as dead
+LEASE_SECONDS = 60.0  # claimed items are invisible to other workers this long
+
+def backoff(attempts: int) -> float:
+    """
+    Delay before the next try, exponential with jitter.
+
+    Args:
+        attempts: Failed attempts so far (1 for the first failure)
+
+    Returns:
+        Seconds to wait
+    """
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+class RetryQueue:
+    """
+    Durable work queue with leases and exponential-backoff retries.
+
+    Items are rows in a SQLite database under ``data/`` keyed by a
+    destination (``key``), so they survive restarts and can be shared
+    by several worker processes: ``claim`` leases due items for
+    LEASE_SECONDS, and an item that is neither acked nor retried
+    before its lease runs out (e.g. the worker died) becomes due again.
+    Delivery is therefore at-least-once.
+    """
+
+    def __init__(self, path: str = WEBHOOK_DB, max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    def db(self) -> sqlite3.Connection:
+        """This thread's connection, creating the schema on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS queue ("
+                "id INTEGER PRIMARY KEY, key INTEGER NOT NULL, kind TEXT NOT NULL, body TEXT NOT NULL, "
+                "created_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_at REAL NOT NULL, "
+                "lease_until REAL NOT NULL DEFAULT 0, dead INTEGER NOT NULL DEFAULT 0, last_error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS queue_due ON queue (dead, next_at)")
+            self._local.conn = conn
+        return conn
+
+    def push(self, items: Iterable[tuple]) -> int:
+        """
+        Enqueue items for immediate delivery.
+
+        Args:
+            items: (key, kind, body) tuples
+
+        Returns:
+            Number of items enqueued
+        """
+        now = time.time()
+        rows = [(key, kind, body, now, now) for key, kind, body in items]
+        if rows:
+            self.db().executemany(
+                "INSERT INTO queue (key, kind, body, created_at, next_at) VALUES (?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def claim(self, limit: int, skip: Iterable[int] = ()) -> List[Dict[str, Any]]:
+        """
+        Lease due items, oldest first.
+
+        Args:
+            limit: Maximum number of items
+            skip: Keys not to claim items for (e.g. busy destinations)
+
+        Returns:
+            List of item dictionaries
+        """
+        now = time.time()
+        skip = list(skip)
+        conn = self.db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, key, kind, body, created_at, attempts FROM queue "
+                "WHERE dead = 0 AND next_at <= ? AND lease_until <= ? "
+                f"AND key NOT IN ({','.join('?' * len(skip))}) ORDER BY id LIMIT ?",
+                (now, now, *skip, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE queue SET lease_until = ? WHERE id = ?",
+                [(now + LEASE_SECONDS, r[0]) for r in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [
+            {"id": r[0], "key": r[1], "kind": r[2], "body": r[3], "created_at": r[4], "attempts": r[5]}
+            for r in rows
+        ]
+
+    def ack(self, ids: List[int]):
+        """Remove delivered items."""
+        self.db().executemany("DELETE FROM queue WHERE id = ?", [(i,) for i in ids])
+
+    def retry(self, items: List[Dict[str, Any]], error: str) -> int:
+        """
+        Schedule failed items again with backoff, or park them as dead.
+
+        Args:
+            items: Claimed items
+            error: Failure description
+
+        Returns:
+            Number of items parked as dead
+        """
+        now, dead, rows = time.time(), 0, []
+        for item in items:
+            attempts = item["attempts"] + 1
+            gave_up = attempts >= self.max_attempts
+            dead += gave_up
+            rows.append((attempts, now + backoff(attempts), int(gave_up), error[:500], item["id"]))
+        self.db().executemany(
+            "UPDATE queue SET attempts = ?, next_at = ?, lease_until = 0, dead = ?, last_error = ? "
+            "WHERE id = ?", rows
+        )
+        return dead
+
+    def next_due(self) -> Optional[float]:
+        """Earliest time an item becomes due, or None when the queue is empty."""
+        row = self.db().execute(
+            "SELECT MIN(MAX(next_at, lease_until)) FROM queue WHERE dead = 0"
+        ).fetchone()
+        return row[0]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Queue depth.
+
+        Returns:
+            Dictionary with pending, retrying and dead item counts
+        """
+        pending, retrying, dead = self.db().execute(
+            "SELECT COALESCE(SUM(dead = 0 AND attempts = 0), 0), "
+            "COALESCE(SUM(dead = 0 AND attempts > 0), 0), COALESCE(SUM(dead), 0) FROM queue"
+        ).fetchone()
+        return {"pending": pending, "retrying": retrying, "dead": dead}
 
-import threading, time
 def start():
-    def w():
-        while True: time.sleep(5)
-    threading.Thread(target=w, daemon=True).start()
+    """Start the webhook delivery worker (kept for app_init.boot)."""
+    from functions.webhooks import webhooks
+    webhooks.start()
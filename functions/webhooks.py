@@ -1,7 +1,390 @@
+"""
+Webhook registry and delivery engine.
 
-import json, os
-PATH="data/hooks.json"
-def register(url):
-    d=[]
-    if os.path.exists(PATH): d=json.load(open(PATH))
-    d.append(url); json.dump(d, open(PATH,'w'))
+Events are written to a durable queue (functions.retry_queue) when they
+are emitted and delivered by a background worker running its own event
+loop: one pooled keep-alive HTTP client, at most WEBHOOK_CONCURRENCY
+requests in flight per endpoint, up to WEBHOOK_BATCH events per POST,
+and exponential-backoff retries for failed deliveries.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+import logging
+
+import httpx
+
+from core.metrics import metrics
+from functions.retry_queue import RetryQueue
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ("ingest.complete", "balance.low", "sla.breach")
+
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "2"))  # in-flight POSTs per endpoint
+WEBHOOK_BATCH = int(os.getenv("WEBHOOK_BATCH", "50"))  # events per POST
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+HOOKS_TTL = 5.0  # seconds before the registry is re-read (other workers may register)
+IDLE_POLL = 1.0
+LEGACY_PATH = os.path.join("data", "hooks.json")
+# Local development only: lets hooks target loopback and private networks
+ALLOW_PRIVATE = os.getenv("WEBHOOK_ALLOW_PRIVATE", "0") == "1"
+
+def check_url(url: str):
+    """
+    Refuse webhook URLs that would have the server POST into private networks.
+
+    The host is resolved and every address must be globally routable:
+    loopback, RFC 1918 / unique-local, link-local (e.g. cloud metadata),
+    shared, multicast and reserved ranges are rejected.
+
+    Args:
+        url: Webhook URL
+
+    Raises:
+        ValueError: For a non-http(s) URL, a host that doesn't resolve or
+            one that resolves to a non-public address
+    """
+    parsed = urlparse(url)
+    try:
+        host, port = parsed.hostname, parsed.port
+    except ValueError:
+        raise ValueError("webhook url must be http(s)")
+    if parsed.scheme not in ("http", "https") or not host:
+        raise ValueError("webhook url must be http(s)")
+    if ALLOW_PRIVATE:
+        return
+    try:
+        infos = socket.getaddrinfo(host, port or (443 if parsed.scheme == "https" else 80),
+                                   type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"webhook host does not resolve: {host}") from e
+    for *_, sockaddr in infos:
+        ip = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"webhook host {host} resolves to a non-public address")
+
+class Webhooks:
+    """
+    Endpoints subscribed to platform events, and their delivery worker.
+
+    A hook belongs to an agent (or to every agent when ``agent`` is
+    None) and lists the event types it wants. ``emit`` is cheap and safe
+    to call from any thread: it only enqueues one row per matching hook
+    and wakes the worker. Each POST carries ``{"events": [...]}``; with
+    a secret the body is signed in the ``X-Instant-RAG-Signature`` header
+    (``sha256=<hex hmac>``). Events for one endpoint may arrive out of
+    order when several POSTs are in flight.
+    """
+
+    def __init__(self, queue: RetryQueue = None, concurrency: int = WEBHOOK_CONCURRENCY,
+                 batch: int = WEBHOOK_BATCH):
+        self.queue = queue or RetryQueue()
+        self.concurrency = concurrency
+        self.batch = batch
+        self._hooks: Dict[int, Dict[str, Any]] = {}
+        self._hooks_at = 0.0
+        self._inflight: Dict[int, int] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    # ─── Registry ────────────────────────────────────────────────────────
+
+    def _db(self):
+        conn = self.queue.db()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS hooks ("
+            "id INTEGER PRIMARY KEY, url TEXT NOT NULL, agent TEXT, events TEXT NOT NULL, "
+            "secret TEXT, created_at REAL NOT NULL)"
+        )
+        return conn
+
+    def register(self, url: str, agent: Optional[str] = None, events: Optional[List[str]] = None,
+                 secret: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Subscribe an endpoint to events.
+
+        Args:
+            url: http(s) URL to POST to
+            agent: Only events of this agent; None for all agents
+            events: Event types (see EVENTS); None for all
+            secret: Optional HMAC signing secret
+
+        Returns:
+            The hook record
+
+        Raises:
+            ValueError: For a non-http or non-public URL, or an unknown event type
+        """
+        check_url(url)
+        events = list(events or EVENTS)
+        unknown = set(events) - set(EVENTS)
+        if unknown:
+            raise ValueError(f"unknown event: {', '.join(sorted(unknown))}")
+        cur = self._db().execute(
+            "INSERT INTO hooks (url, agent, events, secret, created_at) VALUES (?, ?, ?, ?, ?)",
+            (url, agent, ",".join(events), secret, time.time())
+        )
+        self._hooks_at = 0.0
+        logger.info(f"Registered webhook {cur.lastrowid} for {agent or 'all agents'}: {url}")
+        return {"id": cur.lastrowid, "url": url, "agent": agent, "events": events}
+
+    def unregister(self, hook_id: int, agent: Optional[str] = None) -> bool:
+        """
+        Remove a hook and drop its queued events.
+
+        Args:
+            hook_id: Hook id
+            agent: If given, only remove the hook when it belongs to this agent
+
+        Returns:
+            True if a hook was removed
+        """
+        conn = self._db()
+        if agent is None:
+            cur = conn.execute("DELETE FROM hooks WHERE id = ?", (hook_id,))
+        else:
+            cur = conn.execute("DELETE FROM hooks WHERE id = ? AND agent = ?", (hook_id, agent))
+        if cur.rowcount:
+            conn.execute("DELETE FROM queue WHERE key = ?", (hook_id,))
+            self._hooks_at = 0.0
+        return bool(cur.rowcount)
+
+    def hooks(self, agent: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        List hooks, without their secrets.
+
+        Args:
+            agent: Only this agent's hooks; None for all
+
+        Returns:
+            List of hook records
+        """
+        return [
+            {"id": h["id"], "url": h["url"], "agent": h["agent"], "events": sorted(h["events"])}
+            for h in self._registry().values()
+            if agent is None or h["agent"] == agent
+        ]
+
+    def _registry(self) -> Dict[int, Dict[str, Any]]:
+        if time.monotonic() - self._hooks_at > HOOKS_TTL:
+            rows = self._db().execute("SELECT id, url, agent, events, secret FROM hooks").fetchall()
+            self._hooks = {
+                r[0]: {"id": r[0], "url": r[1], "agent": r[2], "events": set(r[3].split(",")), "secret": r[4]}
+                for r in rows
+            }
+            self._hooks_at = time.monotonic()
+        return self._hooks
+
+    def import_legacy(self, path: str = LEGACY_PATH) -> int:
+        """Register URLs from the old data/hooks.json list once, then rename it."""
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path) as f:
+                urls = json.load(f)
+            for url in urls:
+                self.register(url)
+            os.replace(path, path + ".imported")
+            return len(urls)
+        except Exception as e:
+            logger.error(f"Failed to import {path}: {e}")
+            return 0
+
+    # ─── Emitting ────────────────────────────────────────────────────────
+
+    def emit(self, event: str, agent: str, data: Dict[str, Any]) -> int:
+        """
+        Queue an event for every hook subscribed to it.
+
+        Args:
+            event: Event type (see EVENTS)
+            agent: Agent the event concerns
+            data: Event payload
+
+        Returns:
+            Number of deliveries queued
+        """
+        try:
+            hooks = [h for h in self._registry().values()
+                     if event in h["events"] and h["agent"] in (None, agent)]
+            if not hooks:
+                return 0
+            body = json.dumps({
+                "id": uuid.uuid4().hex,
+                "type": event,
+                "agent": agent,
+                "created_at": time.time(),
+                "data": data
+            })
+            queued = self.queue.push((h["id"], event, body) for h in hooks)
+            metrics.inc("webhook_events_total", queued, event=event)
+            self._notify()
+            return queued
+        except Exception as e:
+            # never fail the request that triggered the event
+            logger.error(f"Failed to queue {event} webhook for {agent}: {e}")
+            return 0
+
+    def _notify(self):
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                pass  # loop already closed
+
+    # ─── Delivery ────────────────────────────────────────────────────────
+
+    def start(self):
+        """Start the delivery worker thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self.import_legacy()
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name="webhooks", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker; undelivered events stay queued for the next start."""
+        self._stopping = True
+        self._notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self, ready: threading.Event):
+        loop = asyncio.new_event_loop()
+        self._loop = loop
+        try:
+            loop.run_until_complete(self._main(ready))
+        finally:
+            self._loop = self._wake = None
+            loop.close()
+
+    async def _main(self, ready: threading.Event):
+        self._wake = asyncio.Event()
+        ready.set()
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=100, keepalive_expiry=60)
+        tasks = set()
+        async with httpx.AsyncClient(limits=limits, timeout=WEBHOOK_TIMEOUT, follow_redirects=False) as client:
+            while not self._stopping:
+                self._wake.clear()
+                try:
+                    for hook, items in self._claim():
+                        task = asyncio.create_task(self._deliver(client, hook, items))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    due = self.queue.next_due()
+                except Exception as e:
+                    logger.error(f"Webhook worker error: {e}")
+                    due = None
+                wait = IDLE_POLL if due is None else min(max(due - time.time(), 0.01), IDLE_POLL)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            if tasks:
+                await asyncio.wait(tasks, timeout=WEBHOOK_TIMEOUT)
+
+    def _claim(self):
+        """Lease due events and split them into per-endpoint batches."""
+        busy = [k for k, n in self._inflight.items() if n >= self.concurrency]
+        items = self.queue.claim(self.batch * 16, skip=busy)
+        registry = self._registry()
+        by_hook: Dict[int, List[Dict[str, Any]]] = {}
+        for item in items:
+            by_hook.setdefault(item["key"], []).append(item)
+
+        batches = []
+        for key, hook_items in by_hook.items():
+            hook = registry.get(key)
+            if hook is None:
+                self.queue.ack([i["id"] for i in hook_items])  # hook was removed
+                continue
+            free = self.concurrency - self._inflight.get(key, 0)
+            chunks = [hook_items[i:i + self.batch] for i in range(0, len(hook_items), self.batch)]
+            for chunk in chunks[:free]:
+                self._inflight[key] = self._inflight.get(key, 0) + 1
+                batches.append((hook, chunk))
+            for chunk in chunks[free:]:
+                # over the endpoint's concurrency: release the lease, claim again later
+                self.queue.db().executemany(
+                    "UPDATE queue SET lease_until = 0 WHERE id = ?", [(i["id"],) for i in chunk]
+                )
+        return batches
+
+    async def _deliver(self, client: httpx.AsyncClient, hook: Dict[str, Any], items: List[Dict[str, Any]]):
+        body = '{"events": [' + ", ".join(i["body"] for i in items) + "]}"
+        headers = {"Content-Type": "application/json", "User-Agent": "Instant-RAG-Webhooks"}
+        if hook["secret"]:
+            sig = hmac.new(hook["secret"].encode(), body.encode(), hashlib.sha256).hexdigest()
+            headers["X-Instant-RAG-Signature"] = f"sha256={sig}"
+
+        start = time.perf_counter()
+        try:
+            # resolved again: the host may have been repointed since it was registered
+            await asyncio.get_running_loop().run_in_executor(None, check_url, hook["url"])
+            response = await client.post(hook["url"], content=body, headers=headers)
+            error = None if response.is_success else f"HTTP {response.status_code}"
+        except Exception as e:
+            # anything (e.g. httpx.InvalidURL) must count as an attempt, or the
+            # events would be re-leased forever without reaching dead
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            self._inflight[hook["id"]] -= 1
+        elapsed = time.perf_counter() - start
+
+        if error is None:
+            self.queue.ack([i["id"] for i in items])
+            metrics.observe("webhook_delivery_seconds", elapsed, outcome="ok")
+            now = time.time()
+            for item in items:
+                metrics.observe("webhook_lag_seconds", now - item["created_at"], event=item["kind"])
+            metrics.inc("webhook_deliveries_total", len(items), outcome="ok")
+        else:
+            dead = self.queue.retry(items, error)
+            metrics.observe("webhook_delivery_seconds", elapsed, outcome="error")
+            metrics.inc("webhook_deliveries_total", len(items) - dead, outcome="retry")
+            if dead:
+                metrics.inc("webhook_deliveries_total", dead, outcome="dead")
+            logger.warning(f"Webhook {hook['id']} delivery of {len(items)} events failed: {error}")
+        self._notify()  # the endpoint has a free slot again
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Registry size, queue depth and in-flight POSTs.
+
+        Returns:
+            Stats dictionary
+        """
+        return {
+            "hooks": len(self._registry()),
+            "running": self._thread is not None and self._thread.is_alive(),
+            "inflight": sum(self._inflight.values()),
+            **self.queue.stats()
+        }
+
+webhooks = Webhooks()
+
+def register(url, agent=None, events=None, secret=None):
+    """Subscribe ``url`` to events (module-level shortcut)."""
+    return webhooks.register(url, agent=agent, events=events, secret=secret)
@@ -0,0 +1,29 @@
+import os
+import secrets
+from typing import Optional
+import logging
+
+from fastapi import Header, HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Shared secret for the /admin endpoints; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+ADMIN_HEADER = "X-Admin-Token"
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    FastAPI dependency guarding operator endpoints.
+
+    Args:
+        x_admin_token: Value of the X-Admin-Token header
+
+    Raises:
+        HTTPException: 503 if ADMIN_TOKEN isn't configured, 401 if the
+            header is missing or wrong
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="admin_disabled")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        logger.warning("Rejected admin request with a missing or wrong token")
+        raise HTTPException(status_code=401, detail="invalid_admin_token")
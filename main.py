@@ -1,22 +1,43 @@
-from fastapi import FastAPI, UploadFile, HTTPException, Depends
+from core.startup import startup  # first, so import:app covers everything below
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, Dict, Any, List
+import asyncio
+import contextvars
+import json
 import logging
 import os
-
-from tenants.manager import tm
-from core.retriever import SimpleRetriever, chunk_text, weave_answer
+import threading
+import time
+
+from tenants.manager import Tenant, tm
+from core.retriever import SimpleRetriever, chunk_text, weave_answer, normalize_query
+from core.singleflight import flight
+from core.embed_pool import embed_pool
+from core.embed_cache import query_embeddings
+from core.metrics import metrics
+from core.result_cache import results_cache
 from core.ratelimit import limiter
 from core.subscription import subs
+from core.quota import quotas, UploadLimit
+from core.admission import query_admission, ingest_admission
 from core.audit import auditor
+from core.rollups import rollups
+from functions.webhooks import webhooks
 from contracts.engine import engine
 from explain.trace import build_trace
 from explain.scores import confidence_from_parts
 from ethics.judge import judge
 from identity.passport import passport
 from swarm.session import run as swarm_run
+from swarm.presets import PRESETS, DEFAULT_PRESET, DEFAULT_SIZE, MAX_SIZE
 from api_trust import router as trust_router
+from api_portal import router as portal_router
 
 # Configure logging
 logging.basicConfig(
@@ -25,10 +46,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Restore every snapshotted tenant before /ready; otherwise tenants are restored on first access
+RESTORE_ON_STARTUP = os.getenv("RESTORE_ON_STARTUP", "0") == "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.record("import:app", time.perf_counter() - startup.t0)
+    if RESTORE_ON_STARTUP:
+        startup.add_step("restore:tenants", tm.restore_all)
+    # Load and warm models in the background; /ready stays 503 until done
+    startup.start()
+    webhooks.start()
+    yield
+    webhooks.stop()
+    auditor.flush()
+    rollups.flush()
+    embed_pool.shutdown()
+
 app = FastAPI(
     title="Instant-RAG Platform",
     description="Production-ready multi-tenant RAG system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # ─── Public Site + Agent Discovery ───────────────────────────────────────
@@ -43,15 +82,12 @@ app.mount(
     StaticFiles(directory="static/.well-known"),
     name="wellknown"
 )
-
-# Serve landing page and public assets
-app.mount(
-    "/",
-    StaticFiles(directory="static", html=True),
-    name="public"
-)
 # ─────────────────────────────────────────────────────────────────────────
 
+# Reject uploads over the plan's file size before reading them. Added
+# before CORS so CORS wraps it and browsers can read its 413s.
+app.add_middleware(UploadLimit, paths=("/ingest",))
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -61,20 +97,74 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include trust router
+# Include trust and portal routers
 app.include_router(trust_router)
+app.include_router(portal_router)
 
 # ─── Models ──────────────────────────────────────────────────────────────
 
+MAX_BATCH = 200
+REDUCED_TOP_K = 3  # candidate pool when the SLA engine degrades a tenant
+PREFETCH_MIN_SECONDS = 0.001  # encode cost below which a query isn't encoded ahead
+
+class QueryFilters(BaseModel):
+    """Metadata scope for a search; all given conditions must hold."""
+    model_config = {"extra": "forbid"}  # a misspelled filter must not widen the search
+    source: Optional[List[str]] = Field(None, max_length=100)  # any of these files
+    tags: Optional[List[str]] = Field(None, max_length=20)  # all of these tags
+    after: Optional[float] = None  # document timestamp bounds, unix seconds
+    before: Optional[float] = None
+
 class QueryRequest(BaseModel):
     text: str = Field(..., max_length=10000, min_length=1)
     agent_id: str = Field(..., min_length=1, max_length=100)
     token: str = Field(..., min_length=1)
+    filters: Optional[QueryFilters] = None
+
+class BatchQueryRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1, max_length=MAX_BATCH)
+    agent_id: str = Field(..., min_length=1, max_length=100)
+    token: str = Field(..., min_length=1)
+    filters: Optional[QueryFilters] = None
+
+class SwarmQueryRequest(QueryRequest):
+    style: str = Field(DEFAULT_PRESET, max_length=50)
+    agents: int = Field(DEFAULT_SIZE, ge=1, le=MAX_SIZE)
 
 class IngestRequest(BaseModel):
     agent_id: str = Field(..., min_length=1, max_length=100)
     token: str = Field(..., min_length=1)
 
+def _filters(f: Optional[QueryFilters]) -> Optional[Dict[str, Any]]:
+    if f is None:
+        return None
+    return f.model_dump(exclude_none=True) or None
+
+def _filter_key(filters: Optional[Dict[str, Any]]) -> str:
+    return json.dumps(filters, sort_keys=True) if filters else ""
+
+async def _tenant(agent_id: str) -> Tenant:
+    """Get a tenant, restoring it on the thread pool if it isn't loaded."""
+    tenant = tm.loaded(agent_id)
+    if tenant is not None:
+        return tenant
+    return await run_in_threadpool(tm.get, agent_id)
+
+def _ingest_metadata(tags: Optional[str], timestamp: Optional[float], metadata: Optional[str]) -> Dict[str, Any]:
+    """Build document metadata from /ingest parameters."""
+    try:
+        meta = json.loads(metadata) if metadata else {}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid_metadata")
+    if not isinstance(meta, dict) or "source" in meta:
+        raise HTTPException(status_code=400, detail="invalid_metadata")
+    if "tags" in meta and not (isinstance(meta["tags"], list) and all(isinstance(t, str) for t in meta["tags"])):
+        raise HTTPException(status_code=400, detail="invalid_metadata: tags must be a list of strings")
+    if tags:
+        meta["tags"] = sorted({t.strip() for t in tags.split(",") if t.strip()})
+    meta["timestamp"] = timestamp if timestamp is not None else time.time()
+    return meta
+
 # ─── Core Endpoints ──────────────────────────────────────────────────────
 
 @app.get("/health")
@@ -82,35 +172,88 @@ def health():
     return {"status": "ok", "version": "1.0.0"}
 
 @app.post("/ingest")
-async def ingest(file: UploadFile, agent_id: str, token: str):
+async def ingest(file: UploadFile, agent_id: str, token: str, replace: bool = False,
+                 tags: Optional[str] = None, timestamp: Optional[float] = None,
+                 metadata: Optional[str] = None):
+    """
+    Index a UTF-8 text file. With ``replace`` the file's previous chunks
+    (same filename) are swapped for the new ones instead of duplicated.
+
+    ``tags`` (comma separated), ``timestamp`` (unix seconds, default now)
+    and ``metadata`` (JSON object) are attached to every chunk and can be
+    used as query filters.
+
+    Uploads are checked against the agent's plan (file size, document
+    count, storage); oversized bodies are refused before they are read.
+    """
+    with metrics.request("/ingest"):
+        return await _ingest(file, agent_id, token, replace, tags, timestamp, metadata)
+
+async def _ingest(file: UploadFile, agent_id: str, token: str, replace: bool = False,
+                  tags: Optional[str] = None, timestamp: Optional[float] = None,
+                  metadata: Optional[str] = None):
     try:
         if not passport.verify(agent_id, token):
             raise HTTPException(status_code=401, detail="invalid_passport")
+        metrics.authenticated(agent_id)
 
         if subs.check(agent_id) != "active":
             raise HTTPException(status_code=403, detail="subscription_inactive")
 
-        tenant = tm.get(agent_id)
-
-        try:
-            content = await file.read()
-            text = content.decode("utf-8")
-        except UnicodeDecodeError:
-            raise HTTPException(status_code=400, detail="file_must_be_utf8_text")
-
-        chunks = chunk_text(text)
-        tenant.retriever.add_documents(chunks, source_name=file.filename)
+        meta = _ingest_metadata(tags, timestamp, metadata)
+        async with ingest_admission.slot(agent_id):
+            tenant = await _tenant(agent_id)
+
+            # the body is spooled by now but not yet in memory
+            if file.size is not None and quotas.check_upload(agent_id, file.size):
+                raise HTTPException(status_code=413, detail="file_too_large")
+
+            try:
+                content = await file.read()
+                text = content.decode("utf-8")
+            except UnicodeDecodeError:
+                raise HTTPException(status_code=400, detail="file_must_be_utf8_text")
+
+            with metrics.stage("chunk"):
+                chunks = chunk_text(text)
+            kept = [c for c in chunks if c.strip()]
+            refused = quotas.check_ingest(
+                agent_id, tenant.retriever, file.filename, replace,
+                len(content), sum(len(c.encode("utf-8")) for c in kept), len(kept)
+            )
+            if refused:
+                raise HTTPException(status_code=413 if refused == "file_too_large" else 403, detail=refused)
+            replaced = 0
+            # Embedding a large upload takes a while; keep it off the event loop
+            with metrics.stage("index"):
+                if replace:
+                    replaced = await run_in_threadpool(
+                        tenant.retriever.replace_source, chunks, source_name=file.filename, metadata=meta
+                    )
+                else:
+                    await run_in_threadpool(
+                        tenant.retriever.add_documents, chunks, source_name=file.filename, metadata=meta
+                    )
+            with metrics.stage("snapshot"):
+                await run_in_threadpool(tm.persist, agent_id)
 
         auditor.record("ingest", agent_id, {
             "chunks": len(chunks),
             "filename": file.filename,
-            "size": len(text)
+            "size": len(text),
+            "replaced": replaced
+        })
+        webhooks.emit("ingest.complete", agent_id, {
+            "filename": file.filename,
+            "chunks": len(chunks),
+            "replaced": replaced
         })
 
         return {
             "status": "indexed",
             "chunks": len(chunks),
-            "filename": file.filename
+            "filename": file.filename,
+            "replaced": replaced
         }
 
     except HTTPException:
@@ -119,30 +262,207 @@ async def ingest(file: UploadFile, agent_id: str, token: str):
         logger.error(f"Error during ingestion: {str(e)}")
         raise HTTPException(status_code=500, detail="ingestion_failed")
 
+@app.delete("/documents")
+async def delete_document(agent_id: str, token: str, source: str):
+    """
+    Remove every chunk ingested from ``source`` (the uploaded filename).
+    """
+    try:
+        if not passport.verify(agent_id, token):
+            raise HTTPException(status_code=401, detail="invalid_passport")
+
+        if subs.check(agent_id) != "active":
+            raise HTTPException(status_code=403, detail="subscription_inactive")
+
+        retriever = (await _tenant(agent_id)).retriever
+        removed = await run_in_threadpool(retriever.delete_source, source)
+        if not removed:
+            raise HTTPException(status_code=404, detail="source_not_found")
+        await run_in_threadpool(tm.persist, agent_id)
+
+        auditor.record("delete", agent_id, {"filename": source, "chunks": removed})
+        return {"status": "deleted", "chunks": removed, "filename": source}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting document: {str(e)}")
+        raise HTTPException(status_code=500, detail="delete_failed")
+
+@app.get("/documents")
+async def list_documents(agent_id: str, token: str):
+    if not passport.verify(agent_id, token):
+        raise HTTPException(status_code=401, detail="invalid_passport")
+    return {"documents": (await _tenant(agent_id)).retriever.sources()}
+
+@app.post("/webhooks")
+async def register_webhook(agent_id: str, token: str, url: str, events: Optional[str] = None,
+                           secret: Optional[str] = None):
+    """
+    Subscribe ``url`` to this agent's events: ingest.complete,
+    balance.low and sla.breach (``events`` is a comma separated subset).
+    """
+    if not passport.verify(agent_id, token):
+        raise HTTPException(status_code=401, detail="invalid_passport")
+    wanted = [e.strip() for e in events.split(",") if e.strip()] if events else None
+    try:
+        return await run_in_threadpool(webhooks.register, url, agent_id, wanted, secret)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/webhooks")
+async def list_webhooks(agent_id: str, token: str):
+    if not passport.verify(agent_id, token):
+        raise HTTPException(status_code=401, detail="invalid_passport")
+    return {"webhooks": webhooks.hooks(agent_id)}
+
+@app.delete("/webhooks/{hook_id}")
+async def delete_webhook(hook_id: int, agent_id: str, token: str):
+    if not passport.verify(agent_id, token):
+        raise HTTPException(status_code=401, detail="invalid_passport")
+    if not await run_in_threadpool(webhooks.unregister, hook_id, agent_id):
+        raise HTTPException(status_code=404, detail="webhook_not_found")
+    return {"status": "deleted", "id": hook_id}
+
 @app.post("/query")
 async def query(request: QueryRequest):
+    start = time.perf_counter()
+    with metrics.request("/query"):
+        packet = await _query(request)
+    engine.record(
+        request.agent_id,
+        (time.perf_counter() - start) * 1000,
+        confidence=packet["confidence"]
+    )
+    return packet
+
+class _Prefetch:
+    """Question encoding started on the thread pool ahead of its search."""
+
+    def __init__(self, retriever: SimpleRetriever, text: str):
+        self.started = threading.Event()
+        self.done = threading.Event()
+        # submitted to a thread right away; run_in_threadpool would only start
+        # it at the next await, after the checks it is meant to overlap
+        self.task = asyncio.get_running_loop().run_in_executor(
+            None, contextvars.copy_context().run, self._run, retriever, text
+        )
+        # a failed prefetch only means the search encodes the question itself
+        self.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def _run(self, retriever: SimpleRetriever, text: str):
+        self.started.set()
+        try:
+            retriever.encode_queries([text])
+        finally:
+            self.done.set()
+
+    def join(self):
+        """
+        Wait for the encoding if it is running (call on a worker thread).
+
+        One still queued for a thread is not waited for: the search
+        encodes the question itself rather than depend on a free thread.
+        """
+        if self.started.is_set():
+            self.done.wait()
+
+    def cancel(self):
+        if not self.task.done():
+            self.task.cancel()
+
+def _prefetch_embedding(agent_id: str, text: str) -> Optional[_Prefetch]:
+    """
+    Start encoding a question while the ethics judge checks it.
+
+    The vector lands in the query embedding cache, where the search picks
+    it up. Only for tenants already in memory (loading one is the search
+    path's job) and while query admission has a free slot, so under load
+    encoding still waits behind admission like the rest of the search.
+    Skipped for cached questions and for embedders fast enough that the
+    thread hand-off would cost more than it hides.
+
+    Returns:
+        The prefetch, or None when not worth starting
+    """
+    tenant = tm.tenants.get(agent_id)
+    if tenant is None or query_admission.saturated or query_embeddings.max_bytes <= 0:
+        return None
+    model = tenant.retriever.model
+    cost = query_embeddings.encode_cost(model)
+    if (cost is not None and cost < PREFETCH_MIN_SECONDS) or query_embeddings.contains(model, normalize_query(text)):
+        return None
+    return _Prefetch(tenant.retriever, text)
+
+def _traced_search(retriever: SimpleRetriever, text: str, top_k: int, rerank: bool,
+                   filters: Optional[Dict[str, Any]], prefetch: Optional[_Prefetch] = None):
+    # waits on the worker thread, not via the event loop, to save a thread hop
+    if prefetch is not None:
+        with metrics.stage("prefetch"):
+            prefetch.join()
+    results, cites, scores = retriever.search(text, top_k, rerank, filters)
+    # built here so the trace is shared by coalesced and cached callers
+    with metrics.stage("trace"):
+        trace = build_trace(text, results, scores)
+    return results, cites, scores, trace
+
+async def _query(request: QueryRequest):
+    prefetch = None
     try:
-        if not passport.verify(request.agent_id, request.token):
+        with metrics.stage("passport"):
+            verified = passport.verify(request.agent_id, request.token)
+        if not verified:
             raise HTTPException(status_code=401, detail="invalid_passport")
+        metrics.authenticated(request.agent_id)
 
-        if subs.check(request.agent_id) != "active":
+        with metrics.stage("subscription"):
+            status = subs.check(request.agent_id)
+        if status != "active":
             raise HTTPException(status_code=403, detail="subscription_inactive")
 
-        ok, reason = judge.inspect(request.text)
+        with metrics.stage("ratelimit"):
+            allowed = limiter.allow(request.agent_id)
+        if not allowed:
+            raise HTTPException(status_code=429, detail="rate_limited")
+
+        # Encode while the ethics judge runs; only callers that passed the
+        # cheap checks above get to spend an encode
+        prefetch = _prefetch_embedding(request.agent_id, request.text)
+
+        with metrics.stage("judge"):
+            ok, reason = judge.inspect(request.text)
         if not ok:
-            auditor.record("ethics_block", request.agent_id, {
+            auditor.defer("ethics_block", request.agent_id, {
                 "query": request.text[:120],
                 "reason": reason
             })
             raise HTTPException(status_code=400, detail=f"ethics_block: {reason}")
 
-        if not limiter.allow(request.agent_id):
-            raise HTTPException(status_code=429, detail="rate_limited")
-
-        tenant = tm.get(request.agent_id)
-        results, cites, scores = tenant.retriever.search(request.text)
-
-        trace = build_trace(request.text, results, scores)
+        # CPU-bound from here on; queued by plan under overload
+        async with query_admission.slot(request.agent_id):
+            with metrics.stage("tenant"):
+                tenant = await _tenant(request.agent_id)
+            retriever = tenant.retriever
+            filters = _filters(request.filters)
+            key = (request.agent_id, normalize_query(request.text), retriever.version, _filter_key(filters))
+
+            # Degrade when the tenant's rolling latency puts the SLA at risk
+            mode = engine.mode(request.agent_id)
+            found = results_cache.get(key) if mode == "cache_only" else None
+            if found is None:
+                top_k = REDUCED_TOP_K if mode != "normal" else 5
+                rerank = mode in ("normal", "reduced_pool")
+                # Identical in-flight queries against the same index share one search
+                with metrics.stage("search"):
+                    found = await flight.do(
+                        key + (mode,), _traced_search, retriever, request.text, top_k, rerank, filters, prefetch
+                    )
+                # cache_only must serve full-quality answers, not degraded ones
+                if mode == "normal":
+                    results_cache.put(key, found)
+            results, cites, scores, trace = found
+
+        trace = {**trace, "query": request.text}
         packet = weave_answer(results, cites)
 
         packet["explanation"] = trace
@@ -151,8 +471,11 @@ async def query(request: QueryRequest):
             max(scores) if scores else 0,
             len(cites)
         )
+        if mode != "normal":
+            trace["sla_mode"] = mode
 
-        auditor.record("query", request.agent_id, {
+        # written by the audit thread after the response is on its way
+        auditor.defer("query", request.agent_id, {
             "q": request.text[:120],
             "results": len(results),
             "confidence": packet["confidence"]
@@ -165,28 +488,274 @@ async def query(request: QueryRequest):
     except Exception as e:
         logger.error(f"Error during query: {str(e)}")
         raise HTTPException(status_code=500, detail="query_failed")
+    finally:
+        if prefetch is not None:
+            prefetch.cancel()
+
+@app.post("/query/batch")
+async def query_batch(request: BatchQueryRequest):
+    with metrics.request("/query/batch"):
+        return await _query_batch(request)
+
+async def _query_batch(request: BatchQueryRequest):
+    """
+    Answer up to MAX_BATCH questions in one call.
+
+    Auth and rate limiting run once (the batch counts as one unit per
+    allowed question); retrieval is vectorized across the whole batch.
+    Questions blocked by the ethics guard get an error entry in place.
+    """
+    try:
+        if not passport.verify(request.agent_id, request.token):
+            raise HTTPException(status_code=401, detail="invalid_passport")
+        metrics.authenticated(request.agent_id)
+
+        if subs.check(request.agent_id) != "active":
+            raise HTTPException(status_code=403, detail="subscription_inactive")
+
+        if any(not t.strip() or len(t) > 10000 for t in request.texts):
+            raise HTTPException(status_code=422, detail="invalid_query_text")
+
+        verdicts = [judge.inspect(t) for t in request.texts]
+        allowed = [t for t, (ok, _) in zip(request.texts, verdicts) if ok]
+        for t, (ok, reason) in zip(request.texts, verdicts):
+            if not ok:
+                auditor.record("ethics_block", request.agent_id, {
+                    "query": t[:120],
+                    "reason": reason
+                })
+
+        if allowed and not limiter.allow(request.agent_id, units=len(allowed)):
+            raise HTTPException(status_code=429, detail="rate_limited")
+
+        async with query_admission.slot(request.agent_id):
+            tenant = await _tenant(request.agent_id)
+            found = iter(await run_in_threadpool(
+                tenant.retriever.search_batch, allowed, 5, _filters(request.filters)
+            ))
+
+        packets = []
+        for t, (ok, reason) in zip(request.texts, verdicts):
+            if not ok:
+                packets.append({"error": f"ethics_block: {reason}"})
+                continue
+            results, cites, scores = next(found)
+            packet = weave_answer(results, cites)
+            packet["explanation"] = build_trace(t, results, scores)
+            packet["confidence"] = confidence_from_parts(
+                0.7,
+                max(scores) if scores else 0,
+                len(cites)
+            )
+            packets.append(packet)
+
+        auditor.record("query_batch", request.agent_id, {
+            "queries": len(request.texts),
+            "answered": len(allowed)
+        })
+
+        return {"results": packets, "count": len(packets)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error during batch query: {str(e)}")
+        raise HTTPException(status_code=500, detail="batch_query_failed")
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream"
+}
+
+def _stream_event(fmt: str, event: str, data: Dict[str, Any]) -> str:
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, **data}) + "\n"
+
+def _stream_candidates(retriever: SimpleRetriever, q: str, filters: Optional[Dict[str, Any]]):
+    """
+    Dense candidates for /query/stream, copied out while rows are pinned.
+
+    The stream must not hold ``reading()`` across a yield: a slow client
+    would keep compaction (and every write queued behind it) waiting.
+    """
+    with retriever.reading():
+        if not retriever.docs or not q.strip():
+            return [], [], []
+        qv = retriever.encode_queries([q])[0]
+        idx = retriever.dense_search(qv, 5, retriever.select(filters))
+        return ([retriever.docs[i] for i in idx], [retriever.meta[i] for i in idx],
+                [float(x) for x in retriever.embeddings[idx] @ qv])
+
+def _stream_rerank(retriever: SimpleRetriever, q: str, results: List[str]):
+    """Rerank candidate texts; returns (positions best first, scores)."""
+    if not results:
+        return [], []
+    with metrics.stage("rerank"):
+        scores = [float(x) for x in retriever.reranker.predict([[q, r] for r in results])]
+    order = sorted(range(len(results)), key=lambda p: -scores[p])
+    return order, [scores[p] for p in order]
+
+_STREAM_END = object()
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest, format: str = "ndjson"):
+    """
+    Streaming variant of /query.
+
+    Emits events as each stage finishes: dense ``candidates``, ``reranked``
+    order and scores, ``answer`` with confidence, the ``trace``, then
+    ``done``. ``format`` selects NDJSON (default) or server-sent events.
+    """
+    if format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="unknown_stream_format")
+
+    # The search outlives this handler, so it runs as its own task; the
+    # response starts once it is admitted, or fails with its rejection
+    out: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(_query_stream(request, format, out))
+    try:
+        admitted = await out.get()
+    except BaseException:
+        task.cancel()  # client went away while queued
+        raise
+    if admitted is not None:
+        raise admitted
+
+    async def events():
+        try:
+            while (event := await out.get()) is not _STREAM_END:
+                yield event
+        finally:
+            task.cancel()
+
+    return StreamingResponse(events(), media_type=STREAM_MEDIA_TYPES[format])
+
+async def _query_stream(request: QueryRequest, fmt: str, out: asyncio.Queue):
+    """
+    Check, admit and answer a /query/stream request, putting its events on ``out``.
+
+    Timed and admitted like /query for the whole search, not just the
+    checks. Puts None once admitted (or the exception that rejected the
+    request, and stops), then the encoded events, then _STREAM_END.
+    """
+    try:
+        with metrics.request("/query/stream"):
+            if not passport.verify(request.agent_id, request.token):
+                raise HTTPException(status_code=401, detail="invalid_passport")
+            metrics.authenticated(request.agent_id)
+
+            if subs.check(request.agent_id) != "active":
+                raise HTTPException(status_code=403, detail="subscription_inactive")
+
+            ok, reason = judge.inspect(request.text)
+            if not ok:
+                auditor.record("ethics_block", request.agent_id, {
+                    "query": request.text[:120],
+                    "reason": reason
+                })
+                raise HTTPException(status_code=400, detail=f"ethics_block: {reason}")
+
+            if not limiter.allow(request.agent_id):
+                raise HTTPException(status_code=429, detail="rate_limited")
+
+            async with query_admission.slot(request.agent_id):
+                retriever = (await _tenant(request.agent_id)).retriever
+                out.put_nowait(None)
+                await _stream_events(retriever, request, fmt, out)
+    except Exception as e:
+        out.put_nowait(e)
+        return
+    out.put_nowait(_STREAM_END)
+
+async def _stream_events(retriever: SimpleRetriever, request: QueryRequest, fmt: str, out: asyncio.Queue):
+    q = request.text
+    try:
+        candidates, cand_cites, dense = await run_in_threadpool(
+            _stream_candidates, retriever, q, _filters(request.filters)
+        )
+        out.put_nowait(_stream_event(fmt, "candidates", {
+            "results": candidates,
+            "citations": cand_cites,
+            "scores": dense
+        }))
+
+        order, scores = await run_in_threadpool(_stream_rerank, retriever, q, candidates)
+        out.put_nowait(_stream_event(fmt, "reranked", {
+            "order": order,
+            "scores": scores
+        }))
+
+        results = [candidates[p] for p in order]
+        cites = [cand_cites[p] for p in order]
+        packet = weave_answer(results, cites)
+        packet["confidence"] = confidence_from_parts(
+            0.7,
+            max(scores) if scores else 0,
+            len(cites)
+        )
+        out.put_nowait(_stream_event(fmt, "answer", packet))
+        out.put_nowait(_stream_event(fmt, "trace", {"explanation": build_trace(q, results, scores)}))
+        out.put_nowait(_stream_event(fmt, "done", {}))
+
+        auditor.record("query", request.agent_id, {
+            "q": q[:120],
+            "results": len(results),
+            "confidence": packet["confidence"],
+            "stream": fmt
+        })
+    except Exception as e:
+        logger.error(f"Error during streaming query: {str(e)}")
+        out.put_nowait(_stream_event(fmt, "error", {"detail": "query_failed"}))
 
 @app.post("/swarm/query")
-async def swarm_query(request: QueryRequest):
+async def swarm_query(request: SwarmQueryRequest):
+    with metrics.request("/swarm/query"):
+        return await _swarm_query(request)
+
+async def _swarm_query(request: SwarmQueryRequest):
     try:
         if not passport.verify(request.agent_id, request.token):
             raise HTTPException(status_code=401, detail="invalid_passport")
+        metrics.authenticated(request.agent_id)
 
         if subs.check(request.agent_id) != "active":
             raise HTTPException(status_code=403, detail="subscription_inactive")
 
-        async def query_fn(text: str):
-            q = QueryRequest(
-                text=text,
-                agent_id=request.agent_id,
-                token=request.token
+        # a misspelled style must not silently run another preset
+        if request.style not in PRESETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"unknown_style: expected one of {', '.join(sorted(PRESETS))}"
             )
-            return await query(q)
 
-        result = await swarm_run(request.text, query_fn)
+        ok, reason = judge.inspect(request.text)
+        if not ok:
+            auditor.record("ethics_block", request.agent_id, {
+                "query": request.text[:120],
+                "reason": reason
+            })
+            raise HTTPException(status_code=400, detail=f"ethics_block: {reason}")
+
+        if not limiter.allow(request.agent_id):
+            raise HTTPException(status_code=429, detail="rate_limited")
+
+        async with query_admission.slot(request.agent_id):
+            tenant = await _tenant(request.agent_id)
+            # the swarm's searches are CPU-bound; keep them off the event loop
+            result = await run_in_threadpool(
+                swarm_run,
+                request.text,
+                tenant.retriever,
+                style=request.style,
+                size=request.agents,
+                filters=_filters(request.filters)
+            )
 
         auditor.record("swarm_query", request.agent_id, {
-            "q": request.text[:120]
+            "q": request.text[:120],
+            "swarm_size": result["swarm_size"],
+            "confidence": result["confidence"]
         })
 
         return result
@@ -203,7 +772,7 @@ async def get_stats(agent_id: str, token: str):
         if not passport.verify(agent_id, token):
             raise HTTPException(status_code=401, detail="invalid_passport")
 
-        tenant = tm.get(agent_id)
+        tenant = await _tenant(agent_id)
         logs = auditor.read_all()
 
         agent_logs = [l for l in logs if l.get("agent") == agent_id]
@@ -212,7 +781,9 @@ async def get_stats(agent_id: str, token: str):
             "agent_id": agent_id,
             "total_queries": len([l for l in agent_logs if l.get("event") == "query"]),
             "total_ingestions": len([l for l in agent_logs if l.get("event") == "ingest"]),
-            "total_documents": len(tenant.retriever.docs)
+            "total_documents": len(tenant.retriever.docs),
+            "footprint": tenant.footprint(),
+            "limits": dict(subs.get_limits(agent_id))
         }
 
     except HTTPException:
@@ -247,9 +818,26 @@ def wallet_spend(agent_id: str, action: str):
 from dashboard import router as admin_router
 app.include_router(admin_router)
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/ready")
 async def ready():
-    return {"status": "ok"}
+    report = startup.report()
+    if not startup.ready:
+        return JSONResponse(status_code=503, content={"status": report["state"], "startup": report})
+    return {"status": "ok", "startup": report}
+
+# ─── Public Site ─────────────────────────────────────────────────────────
+
+# Serve landing page and public assets. Mounted last: a mount at "/"
+# matches every path, so any route registered after it is unreachable.
+app.mount(
+    "/",
+    StaticFiles(directory="static", html=True),
+    name="public"
+)
 
 # ─── Run ─────────────────────────────────────────────────────────────────
 
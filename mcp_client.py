@@ -1,12 +1,23 @@
-import requests
+import os
 
-BASE = "https://instant-rag-ftpw.onrender.com"
+from client import InstantRAG
 
-def store(agent_id, text):
-    return requests.post(BASE+"/ingest", json={"agent_id":agent_id,"text":text}).json()
+BASE = os.getenv("INSTANT_RAG_URL", "https://instant-rag-ftpw.onrender.com")
 
-def query(agent_id, q):
-    return requests.post(BASE+"/query", json={"agent_id":agent_id,"query":q}).json()
+_clients = {}
 
-def swarm(agent_id, q, agents=3):
-    return requests.post(BASE+"/swarm/query", json={"agent_id":agent_id,"query":q,"agents":agents}).json()
+def _client(agent_id, token):
+    # one pooled client per identity, reused across calls
+    key = (agent_id, token)
+    if key not in _clients:
+        _clients[key] = InstantRAG(BASE, agent_id, token)
+    return _clients[key]
+
+def store(agent_id, token, text, filename="memory.txt"):
+    return _client(agent_id, token).ingest(text, filename)
+
+def query(agent_id, token, q):
+    return _client(agent_id, token).query(q)
+
+def swarm(agent_id, token, q, agents=3):
+    return _client(agent_id, token).swarm(q, agents=agents)
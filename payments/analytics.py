@@ -1,3 +1,28 @@
+from typing import Any, Dict, Optional
 
-def analyze(RECEIPT_STORE):
-    return {}
+from core.rollups import rollups, ALL
+
+def analyze(agent: Optional[str] = None, hours: int = 24) -> Dict[str, Any]:
+    """
+    Usage and spend analytics from the materialized rollups.
+
+    Args:
+        agent: Agent identifier; None for the whole platform
+        hours: Hourly buckets to include in the series
+
+    Returns:
+        Dictionary with all-time totals (per agent only) and the hourly series
+    """
+    series = rollups.series(agent or ALL, hours)
+    window = {
+        "queries": sum(b["queries"] for b in series),
+        "ingests": sum(b["ingests"] for b in series),
+        "spend": round(sum(b["spend"] for b in series), 6),
+        "credit": round(sum(b["credit"] for b in series), 6)
+    }
+    return {
+        "agent": agent,
+        "totals": rollups.agent(agent) if agent else None,
+        "window": {"hours": hours, **window},
+        "series": series
+    }
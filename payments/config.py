@@ -1,8 +1,19 @@
+import os
+
 TREASURY_ADDRESS = "0x581b3F06527983f611EF909B6Ae3804ff9400d40"
 
-POLYGON_RPC = "https://polygon-rpc.com"
+POLYGON_RPC = os.getenv("POLYGON_RPC", "https://polygon-rpc.com")
 
 USDC = "0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174"
 
 CONFIRMATIONS = 3
-SCAN_FROM = 0
+# First block to scan when there is no checkpoint; unset starts at the confirmed head
+SCAN_FROM = int(os.environ["SCAN_FROM"]) if os.getenv("SCAN_FROM") else None
+
+# Range scanner tuning (eth_getLogs block ranges)
+SCAN_RANGE = 2000
+SCAN_RANGE_MIN = 10
+SCAN_RANGE_MAX = 10000
+SCAN_CONCURRENCY = 4
+SCAN_INTERVAL = 15
+CHECKPOINT_FILE = "data/polygon_checkpoint.json"
@@ -1,7 +1,10 @@
 import json, os, time, threading
+from functions.webhooks import webhooks
+from core.rollups import rollups
 
 DB = "data/wallet.json"
 LOCK = threading.Lock()
+LOW_BALANCE = float(os.getenv("LOW_BALANCE", "0.01"))  # USDC; crossing it emits balance.low
 
 def _load():
     if not os.path.exists(DB):
@@ -12,9 +15,14 @@ def _save(d):
     os.makedirs(os.path.dirname(DB), exist_ok=True)
     json.dump(d, open(DB, "w"), indent=2)
 
+def credited(tx):
+    return any(t.get("tx") == tx for t in _load()["txs"])
+
 def credit(agent, amount, tx):
     with LOCK:
         d = _load()
+        if any(t.get("tx") == tx for t in d["txs"]):
+            return False
         a = d["agents"].setdefault(agent, {"balance": 0})
         a["balance"] += amount
         d["txs"].append({
@@ -24,15 +32,22 @@ def credit(agent, amount, tx):
             "time": time.time()
         })
         _save(d)
+    rollups.ledger("credit", agent, amount)
+    return True
 
 def spend(agent, amount):
     with LOCK:
         d = _load()
         if d["agents"].get(agent, {}).get("balance", 0) < amount:
             return False
+        before = d["agents"][agent]["balance"]
         d["agents"][agent]["balance"] -= amount
         _save(d)
-        return True
+    rollups.ledger("spend", agent, amount)
+    after = before - amount
+    if after < LOW_BALANCE <= before:
+        webhooks.emit("balance.low", agent, {"balance": after, "threshold": LOW_BALANCE})
+    return True
 
 def balance(agent):
     return _load()["agents"].get(agent, {}).get("balance", 0)
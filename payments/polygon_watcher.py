@@ -1,28 +1,251 @@
-from web3 import Web3
-from payments.config import POLYGON_RPC, TREASURY_ADDRESS, USDC
-from payments.ledger import credit
+import json
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
-w3 = Web3(Web3.HTTPProvider(POLYGON_RPC))
+from payments.config import (
+    POLYGON_RPC, TREASURY_ADDRESS, USDC, CONFIRMATIONS, SCAN_FROM,
+    SCAN_RANGE, SCAN_RANGE_MIN, SCAN_RANGE_MAX, SCAN_CONCURRENCY,
+    SCAN_INTERVAL, CHECKPOINT_FILE
+)
+from payments.ledger import credit, credited
+
+logger = logging.getLogger(__name__)
+
+# keccak256("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+_w3 = None
+
+def get_w3():
+    """Shared Web3 client, created on first use so importing this module stays cheap."""
+    global _w3
+    if _w3 is None:
+        from web3 import Web3
+        _w3 = Web3(Web3.HTTPProvider(POLYGON_RPC, request_kwargs={"timeout": 20}))
+    return _w3
+
+def _checksum(address: str) -> str:
+    from web3 import Web3
+    return Web3.to_checksum_address(address)
+
+def _hex(v) -> str:
+    """Normalize HexBytes / bytes / str values to a 0x-prefixed hex string."""
+    if isinstance(v, (bytes, bytearray)):
+        h = bytes(v).hex()
+    else:
+        h = str(v)
+    return h if h.startswith("0x") else "0x" + h
+
+def _topic_for(address: str) -> str:
+    return "0x" + address.lower()[2:].rjust(64, "0")
 
 def decode_agent(tx):
     data = tx.input or ""
+    if not isinstance(data, str):
+        data = _hex(data)
     return data[-8:] if len(data) >= 8 else "anonymous"
 
 def scan_block(block):
-    b = w3.eth.get_block(block, full_transactions=True)
+    """Scan a single block (kept for manual backfills)."""
+    return scanner.scan_range(block, block)
+
+class Checkpoint:
+    """
+    Persisted marker of the last fully scanned block.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_FILE):
+        self.path = path
+
+    def load(self) -> Optional[int]:
+        """Last scanned block, or None when nothing has been scanned yet."""
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    return int(json.load(f)["last_block"])
+        except Exception as e:
+            logger.error(f"Failed to load scan checkpoint: {e}")
+        return None
+
+    def save(self, block: int):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"last_block": block, "updated_at": time.time()}, f)
+        os.replace(tmp, self.path)
+
+class RangeScanner:
+    """
+    Incremental USDC deposit scanner.
+
+    Pulls Transfer logs to the treasury with eth_getLogs over block ranges
+    instead of fetching every block and receipt. Range size adapts to
+    provider limits, ranges are fetched with bounded concurrency, and the
+    last confirmed block is checkpointed so restarts resume where they left
+    off. Credits are keyed by tx hash, so rescanning a range is harmless.
+    """
+
+    def __init__(
+        self,
+        web3=None,
+        checkpoint: Checkpoint = None,
+        confirmations: int = CONFIRMATIONS,
+        range_size: int = SCAN_RANGE,
+        concurrency: int = SCAN_CONCURRENCY,
+        start_block: Optional[int] = SCAN_FROM
+    ):
+        self._w3 = web3
+        self.start_block = start_block
+        self.checkpoint = checkpoint or Checkpoint()
+        self.confirmations = confirmations
+        self.range_size = range_size
+        self.concurrency = max(1, concurrency)
+        self.pool = ThreadPoolExecutor(max_workers=self.concurrency)
+
+    @property
+    def w3(self):
+        return self._w3 or get_w3()
+
+    def _filter(self, start: int, end: int) -> Dict:
+        return {
+            "fromBlock": start,
+            "toBlock": end,
+            "address": _checksum(USDC),
+            "topics": [TRANSFER_TOPIC, None, _topic_for(TREASURY_ADDRESS)]
+        }
+
+    def _get_logs(self, start: int, end: int) -> List:
+        return self.w3.eth.get_logs(self._filter(start, end))
+
+    def _grow(self):
+        self.range_size = min(SCAN_RANGE_MAX, self.range_size * 2)
+
+    def fetch(self, start: int, end: int) -> Tuple[int, List]:
+        """
+        Fetch logs for [start, end], shrinking the range on provider errors.
+
+        Returns:
+            Tuple of (last block covered, logs)
+        """
+        while True:
+            try:
+                return end, self._get_logs(start, end)
+            except Exception as e:
+                if end - start + 1 <= SCAN_RANGE_MIN:
+                    raise
+                end = start + (end - start) // 2
+                self.range_size = max(SCAN_RANGE_MIN, min(self.range_size, end - start + 1))
+                logger.warning(f"get_logs failed, retrying {start}-{end}: {e}")
+
+    def credit_logs(self, logs: List) -> int:
+        """
+        Credit agents for treasury transfers, once per tx hash.
+
+        Returns:
+            Number of newly credited transactions
+        """
+        deposits: Dict[str, int] = {}
+        for log in logs:
+            if _hex(log["address"]).lower() != USDC.lower():
+                continue
+            data = _hex(log["data"])
+            if len(data) <= 2:
+                continue  # no amount (non-standard token event)
+            tx_hash = _hex(log["transactionHash"])
+            deposits[tx_hash] = deposits.get(tx_hash, 0) + int(data, 16)
+
+        count = 0
+        for tx_hash, raw in deposits.items():
+            if credited(tx_hash):
+                continue
+            tx = self.w3.eth.get_transaction(tx_hash)
+            if credit(decode_agent(tx), raw / 1e6, tx_hash):
+                count += 1
+        return count
+
+    def scan_range(self, start: int, end: int) -> int:
+        """
+        Scan [start, end] in concurrently fetched sub-ranges.
+
+        Returns:
+            Number of newly credited transactions
+        """
+        count = 0
+        while start <= end:
+            ranges = []
+            s = start
+            while s <= end and len(ranges) < self.concurrency:
+                e = min(end, s + self.range_size - 1)
+                ranges.append((s, e))
+                s = e + 1
+
+            futures = [self.pool.submit(self.fetch, s, e) for s, e in ranges]
+            failed = False
+            for (s, e), fut in zip(ranges, futures):
+                if failed:
+                    continue
+                try:
+                    covered, logs = fut.result()
+                except Exception as ex:
+                    logger.error(f"Failed to scan blocks {s}-{e}: {ex}")
+                    raise
+                count += self.credit_logs(logs)
+                start = covered + 1
+                if covered < e:
+                    # range was shrunk; re-plan from the first uncovered block
+                    failed = True
+
+            if not failed:
+                self._grow()
+        return count
+
+    def head(self) -> int:
+        return self.w3.eth.block_number - self.confirmations
+
+    def run_once(self) -> int:
+        """
+        Scan from the checkpoint up to the confirmed head and advance it.
+
+        Returns:
+            Number of newly credited transactions
+        """
+        end = self.head()
+        last = self.checkpoint.load()
+        if last is not None:
+            start = last + 1
+        elif self.start_block is not None:
+            start = self.start_block
+        else:
+            # first run without a configured start: follow from the head
+            # rather than walk the chain from genesis
+            start = end
+            logger.info(f"No scan checkpoint; starting at block {start}")
+        if end < start:
+            return 0
+
+        count = 0
+        while start <= end:
+            chunk_end = min(end, start + self.range_size * self.concurrency - 1)
+            count += self.scan_range(start, chunk_end)
+            self.checkpoint.save(chunk_end)
+            start = chunk_end + 1
 
-    for tx in b.transactions:
-        if not tx.to:
-            continue
+        logger.info(f"Scanned to block {end}: {count} new deposits")
+        return count
 
-        if tx.to.lower() == USDC.lower():
-            receipt = w3.eth.get_transaction_receipt(tx.hash)
+    def watch(self, interval: float = SCAN_INTERVAL):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Polygon scan failed: {e}")
+            time.sleep(interval)
 
-            for log in receipt.logs:
-                if log.address.lower() == USDC.lower():
-                    to = "0x" + log.topics[2].hex()[-40:]
+scanner = RangeScanner()
 
-                    if to.lower() == TREASURY_ADDRESS.lower():
-                        amount = int(log.data, 16) / 1e6
-                        agent = decode_agent(tx)
-                        credit(agent, amount, tx.hash.hex())
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    scanner.watch()
@@ -1,6 +1,194 @@
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import logging
 
-import json, os
-PATH="data/badge_history.json"
-def timeline(agent=None):
-    if os.path.exists(PATH): return json.load(open(PATH))
-    return []
+logger = logging.getLogger(__name__)
+
+PATH = os.path.join("data", "badge_history.jsonl")
+LEGACY_PATH = os.path.join("data", "badge_history.json")
+
+class BadgeHistory:
+    """
+    Append-only badge log with an in-memory time index.
+
+    Awards are appended as JSON lines (any worker may append). Readers
+    tail the file from the last offset they indexed, so each new line
+    is parsed once per process, and keep per-agent ``(time, position)``
+    lists sorted by time for bisecting ``since`` queries. Workers' clocks
+    and appends interleave, so file order is not time order; per-agent
+    append-order lists let readers pin a snapshot by count (``head``)
+    and fetch exactly what was appended after it (``appended``).
+    """
+
+    def __init__(self, path: str = PATH):
+        self.path = path
+        self.entries: List[Dict[str, Any]] = []
+        self._all: List[tuple] = []  # (time, position)
+        self._by_agent: Dict[str, List[tuple]] = {}
+        self._appended: Dict[Optional[str], List[int]] = {None: []}  # positions in file order
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._migrated = False
+
+    def _migrate(self):
+        # the old store rewrote one JSON list; carry it over once
+        self._migrated = True
+        if os.path.exists(LEGACY_PATH) and not os.path.exists(self.path):
+            try:
+                with open(LEGACY_PATH) as f:
+                    old = json.load(f)
+                with open(self.path, "a") as f:
+                    for entry in old:
+                        f.write(json.dumps(entry) + "\n")
+                os.replace(LEGACY_PATH, LEGACY_PATH + ".imported")
+                logger.info(f"Imported {len(old)} badge entries from {LEGACY_PATH}")
+            except Exception as e:
+                logger.error(f"Failed to import {LEGACY_PATH}: {e}")
+
+    def refresh(self) -> int:
+        """
+        Index lines appended since the last call.
+
+        Returns:
+            Total number of entries
+        """
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        if not self._migrated:
+            self._migrate()
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return len(self.entries)
+        if size <= self._offset:
+            return len(self.entries)
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        end = data.rfind(b"\n") + 1  # a line still being written is read next time
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logger.error(f"Skipping corrupt badge history line at {self._offset}")
+                continue
+            pos = len(self.entries)
+            self.entries.append(entry)
+            key = (float(entry.get("time", 0)), pos)
+            bisect.insort(self._all, key)
+            bisect.insort(self._by_agent.setdefault(entry.get("agent"), []), key)
+            self._appended[None].append(pos)
+            self._appended.setdefault(entry.get("agent"), []).append(pos)
+        self._offset += end
+        return len(self.entries)
+
+    def award(self, agent: str, badge: str, detail: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Append a badge award.
+
+        Args:
+            agent: Agent identifier
+            badge: Badge name
+            detail: Optional extra fields
+
+        Returns:
+            The stored entry
+        """
+        entry = {"time": time.time(), "agent": agent, "badge": badge, **(detail or {})}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # one write per line on an O_APPEND descriptor, so workers don't interleave
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(entry) + "\n").encode())
+        finally:
+            os.close(fd)
+        logger.info(f"Awarded {badge} to {agent}")
+        return entry
+
+    def head(self, agent: Optional[str] = None) -> Tuple[int, Optional[float]]:
+        """
+        Entry count and newest entry time for an agent (or overall).
+
+        Both come from one refresh, so they describe the same snapshot;
+        pass the count on as ``upto`` / ``stop`` to read exactly it.
+
+        Returns:
+            Tuple of (count, time of the newest entry or None)
+        """
+        with self._lock:
+            self._refresh()
+            index = self._all if agent is None else self._by_agent.get(agent, [])
+            return len(index), index[-1][0] if index else None
+
+    def count(self, agent: Optional[str] = None) -> int:
+        """Number of entries for an agent (or in total), after a refresh."""
+        return self.head(agent)[0]
+
+    def last_time(self, agent: Optional[str] = None) -> Optional[float]:
+        """Time of the newest entry for an agent (or overall)."""
+        index = self._all if agent is None else self._by_agent.get(agent, [])
+        return index[-1][0] if index else None
+
+    def appended(self, agent: Optional[str], start: int, stop: int) -> List[Dict[str, Any]]:
+        """
+        Entries in the order they were appended, by per-agent count.
+
+        Args:
+            agent: Only this agent's entries; None for all
+            start: Number of the agent's entries already seen
+            stop: Count from ``head`` to read up to
+
+        Returns:
+            List of entries, oldest appended first
+        """
+        with self._lock:
+            order = self._appended.get(agent, [])
+            return [self.entries[pos] for pos in order[start:stop]]
+
+    def timeline(self, agent: Optional[str] = None, since: Optional[float] = None,
+                 limit: Optional[int] = None, upto: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Badge entries, oldest first.
+
+        Args:
+            agent: Only this agent's entries; None for all
+            since: Only entries strictly after this unix time
+            limit: Keep only the newest ``limit`` entries
+            upto: Only the agent's first ``upto`` appended entries (a
+                count from ``head``); the file isn't re-read
+
+        Returns:
+            List of entries
+        """
+        with self._lock:
+            if upto is None:
+                self._refresh()
+            index = self._all if agent is None else self._by_agent.get(agent, [])
+            start = 0 if since is None else bisect.bisect_right(index, (float(since), float("inf")))
+            order = self._appended.get(agent, [])
+            if upto is None or upto >= len(order):
+                if limit is not None:
+                    start = max(start, len(index) - limit)
+                return [self.entries[pos] for _, pos in index[start:]]
+            # entries appended after the snapshot can sort anywhere by time
+            cutoff = order[upto - 1] if upto > 0 else -1
+            picked = []
+            for _, pos in reversed(index[start:]):
+                if limit is not None and len(picked) >= limit:
+                    break
+                if pos <= cutoff:
+                    picked.append(self.entries[pos])
+            return picked[::-1]
+
+history = BadgeHistory()
+
+def timeline(agent=None, since=None):
+    return history.timeline(agent, since)
@@ -1,3 +1,31 @@
+from typing import Any, Dict, List
 
-def compute_leaderboard(RECEIPT_STORE, cache, auditor):
-    return []
+from core.rollups import rollups, RANKABLE
+
+# Wallet totals are private to their agent; only /admin ranks by or shows them
+PRIVATE = ("spend", "credit")
+PUBLIC_RANKABLE = tuple(c for c in RANKABLE if c not in PRIVATE)
+
+def compute_leaderboard(by: str = "queries", limit: int = 10, private: bool = False) -> List[Dict[str, Any]]:
+    """
+    Top agents by an all-time counter, from the materialized rollups.
+
+    Args:
+        by: queries, swarm_queries, ingests, chunks or confidence; spend
+            and credit only with ``private``
+        limit: Number of agents
+        private: Include wallet totals (admin only)
+
+    Returns:
+        Ranked list of agent totals
+
+    Raises:
+        ValueError: If ``by`` can't be ranked publicly
+    """
+    if not private and by in PRIVATE:
+        raise ValueError(f"cannot rank by {by}")
+    ranked = rollups.top(by, limit)
+    if private:
+        return ranked
+    # rows are shared with the rollups cache; copy rather than mutate
+    return [{k: v for k, v in row.items() if k not in PRIVATE} for row in ranked]
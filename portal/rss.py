@@ -1,9 +1,101 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict, deque
+from email.utils import formatdate
+from typing import Any, Dict, Optional
+from xml.sax.saxutils import escape
 
-try:
-    from portal.badge_history import timeline
-except Exception:
-    def timeline(agent=None):
-        return []
+from portal.badge_history import BadgeHistory, history
 
-def feed(base_url="http://localhost"):
-    return "<?xml version='1.0'?><rss></rss>"
+FEED_ITEMS = 50  # newest entries kept in each feed
+FEED_CACHE_SIZE = 1024  # agents whose feeds are kept rendered
+# Links in feeds point here, never at the Host header a request came with
+PUBLIC_URL = os.getenv("PUBLIC_URL", "https://instant-rag-ftpw.onrender.com").rstrip("/")
+
+def _item(entry: Dict[str, Any], base_url: str) -> str:
+    agent, badge = str(entry.get("agent")), str(entry.get("badge"))
+    guid = hashlib.sha1(f"{entry.get('time')}|{agent}|{badge}".encode()).hexdigest()
+    return (
+        "<item>"
+        f"<title>{escape(agent)} earned {escape(badge)}</title>"
+        f"<link>{escape(base_url)}/portal/badges?agent={escape(agent)}</link>"
+        f"<guid isPermaLink=\"false\">{guid}</guid>"
+        f"<pubDate>{formatdate(float(entry.get('time', 0)), usegmt=True)}</pubDate>"
+        "</item>"
+    )
+
+class FeedCache:
+    """
+    Per-agent RSS documents built incrementally from the badge history.
+
+    Each feed remembers how many of its agent's entries it has rendered;
+    a request renders only the entries appended since, prepends them to
+    the kept items and re-joins the document. When nothing changed the
+    cached bytes and their ETag / Last-Modified are returned as they
+    are, so conditional GETs can be answered with 304 without touching
+    XML. Only agents with badges are cached, in an LRU of ``max_feeds``.
+    """
+
+    def __init__(self, source: BadgeHistory = history, size: int = FEED_ITEMS,
+                 base_url: str = PUBLIC_URL, max_feeds: int = FEED_CACHE_SIZE):
+        self.source = source
+        self.size = size
+        self.base_url = base_url
+        self.max_feeds = max_feeds
+        self._feeds: "OrderedDict[Optional[str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, agent: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Current feed for an agent (None for every agent).
+
+        Returns:
+            Dictionary with 'body' (bytes), 'etag', 'last_modified' (unix time or None)
+        """
+        count, last = self.source.head(agent)
+        with self._lock:
+            feed = self._feeds.get(agent)
+            if feed is not None and feed["count"] == count:
+                self._feeds.move_to_end(agent)
+                return feed
+        if feed is None:
+            feed = {"count": 0, "items": deque(maxlen=self.size)}
+        items = deque(feed["items"], maxlen=self.size)
+        for entry in self.source.appended(agent, max(feed["count"], count - self.size), count):
+            items.appendleft(_item(entry, self.base_url))
+        title = f"Instant-RAG badges for {agent}" if agent else "Instant-RAG badges"
+        body = (
+            "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+            "<rss version=\"2.0\"><channel>"
+            f"<title>{escape(title)}</title>"
+            f"<link>{escape(self.base_url)}</link>"
+            "<description>Badges earned by agents</description>"
+            + (f"<lastBuildDate>{formatdate(last, usegmt=True)}</lastBuildDate>" if last else "")
+            + "".join(items)
+            + "</channel></rss>"
+        ).encode()
+        feed = {
+            "count": count,
+            "items": items,
+            "body": body,
+            "etag": f"\"{hashlib.sha1(f'{agent}|{count}|{self.base_url}'.encode()).hexdigest()[:16]}\"",
+            "last_modified": last
+        }
+        if agent is not None and not count:
+            return feed  # unknown agent: cheap to build, not worth a slot
+        with self._lock:
+            current = self._feeds.get(agent)
+            if current is None or current["count"] < count:
+                self._feeds[agent] = feed
+                self._feeds.move_to_end(agent)
+                while len(self._feeds) > self.max_feeds:
+                    self._feeds.popitem(last=False)
+        return feed
+
+feeds = FeedCache()
+
+def feed(base_url=None, agent=None):
+    if base_url is None or base_url.rstrip("/") == feeds.base_url:
+        return feeds.get(agent)["body"].decode()
+    return FeedCache(base_url=base_url.rstrip("/")).get(agent)["body"].decode()
@@ -0,0 +1,410 @@
+"""
+Sharded deployment front end.
+
+Runs N copies of ``main:app`` as shard processes, each listening on a
+Unix socket under SHARD_DIR, and forwards every request to the shard
+that owns its tenant (``agent_id`` from the query string, path or JSON
+body) by consistent hashing. Requests without a tenant go to the first
+shard. Tenant data lives in the shared snapshot directory, so a tenant
+that moves to another shard is restored there on first access.
+
+Usage:
+    SHARDS=4 uvicorn router:app --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import json
+import os
+import secrets
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set, Tuple
+import logging
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from identity.admin import ADMIN_HEADER, ADMIN_TOKEN, require_admin
+from tenants.ring import HashRing
+from tenants.snapshot import snapshots
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+SHARDS = int(os.getenv("SHARDS", "2"))
+SHARD_DIR = os.getenv("SHARD_DIR", os.path.join("data", "shards"))
+START_TIMEOUT = 120.0  # seconds for a shard to accept connections
+READY_TIMEOUT = 600.0  # seconds for a new shard to load its models
+MOVE_TIMEOUT = 30.0  # seconds to wait for in-flight requests of moving tenants
+
+# Path prefixes whose next segment is the tenant id
+TENANT_PATHS = ("/stats/", "/admin/backends/", "/admin/tenants/")
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "upgrade", "host"}
+# Shards take the router's own /admin calls (evictions, footprints) with
+# this token; a random one when ADMIN_TOKEN is unset keeps them private
+SHARD_ADMIN_TOKEN = ADMIN_TOKEN or secrets.token_hex(16)
+
+class Shard:
+    """
+    One ``main:app`` worker process serving HTTP on a Unix socket.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.socket = os.path.abspath(os.path.join(SHARD_DIR, f"{name}.sock"))
+        self.proc: Optional[subprocess.Popen] = None
+        self.client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=self.socket),
+            base_url="http://shard",
+            timeout=None
+        )
+
+    def start(self):
+        """Spawn the shard process."""
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        if os.path.exists(self.socket):
+            os.remove(self.socket)
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--uds", self.socket],
+            env={**os.environ, "SHARD_ID": self.name, "ADMIN_TOKEN": SHARD_ADMIN_TOKEN}
+        )
+        logger.info(f"Started {self.name} (pid {self.proc.pid}) on {self.socket}")
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    async def wait(self, path: str, timeout: float) -> bool:
+        """
+        Poll an endpoint until it answers 200.
+
+        Args:
+            path: '/health' (accepting connections) or '/ready' (models warm)
+            timeout: Seconds to wait
+
+        Returns:
+            True if the shard answered in time
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self.alive:
+            try:
+                if (await self.client.get(path)).status_code == 200:
+                    return True
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+        return False
+
+    async def stop(self):
+        """Terminate the shard process."""
+        await self.client.aclose()
+        if self.alive:
+            self.proc.terminate()
+            try:
+                await asyncio.to_thread(self.proc.wait, 10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        logger.info(f"Stopped {self.name}")
+
+class ShardResponse(StreamingResponse):
+    """
+    Streams a shard's response and releases its tenant however it ends.
+
+    A background task would be skipped when the client disconnects, which
+    would leave the tenant counted in flight and stall every later move.
+    """
+
+    def __init__(self, release, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._release()
+
+class ShardRouter:
+    """
+    Routes tenants to shards and moves them when shards are added.
+
+    Moving tenants are held at the router until their in-flight requests
+    have finished and the old shard has persisted and unloaded them; only
+    then does the ring switch, so a tenant is never live on two shards.
+    If that doesn't happen within MOVE_TIMEOUT, or an old shard fails to
+    evict, the move is aborted and the ring left as it was.
+    """
+
+    def __init__(self):
+        self.shards: Dict[str, Shard] = {}
+        self.ring = HashRing()
+        self.seen: Set[str] = set()  # tenants routed since startup
+        self.inflight: Dict[str, int] = {}
+        self.moving: Set[str] = set()
+        self._moved = asyncio.Event()
+        self._moved.set()
+        self._add_lock = asyncio.Lock()
+
+    async def start(self, n: int):
+        """
+        Start ``n`` shards and wait until they accept connections.
+
+        Args:
+            n: Number of shards
+        """
+        for i in range(n):
+            shard = Shard(f"shard-{i}")
+            shard.start()
+            self.shards[shard.name] = shard
+            self.ring.add(shard.name)
+        results = await asyncio.gather(*(s.wait("/health", START_TIMEOUT) for s in self.shards.values()))
+        if not all(results):
+            raise RuntimeError("shards failed to start")
+
+    async def stop(self):
+        await asyncio.gather(*(s.stop() for s in self.shards.values()))
+
+    def tenant_of(self, request: Request, body: bytes) -> Optional[str]:
+        """
+        Find the tenant a request belongs to.
+
+        Args:
+            request: Incoming request
+            body: Request body if it was read, else b''
+
+        Returns:
+            Tenant id, or None for tenant-less requests
+        """
+        agent = request.query_params.get("agent_id")
+        if agent:
+            return agent
+        path = request.url.path
+        for prefix in TENANT_PATHS:
+            if path.startswith(prefix):
+                return path[len(prefix):].split("/", 1)[0] or None
+        if body and request.headers.get("content-type", "").startswith("application/json"):
+            try:
+                data = json.loads(body)
+                if isinstance(data, dict) and isinstance(data.get("agent_id"), str):
+                    return data["agent_id"]
+            except ValueError:
+                pass
+        return None
+
+    def _has_tenant_outside_body(self, request: Request) -> bool:
+        return "agent_id" in request.query_params or request.url.path.startswith(TENANT_PATHS)
+
+    async def forward(self, request: Request):
+        """
+        Proxy a request to the owning shard, streaming both bodies.
+
+        Returns:
+            Streaming response from the shard
+        """
+        if self._has_tenant_outside_body(request):
+            # e.g. /ingest uploads: do not buffer the file at the router
+            body, content = b"", request.stream()
+        else:
+            body = await request.body()
+            content = body
+        tenant = self.tenant_of(request, body)
+
+        if tenant is not None:
+            while tenant in self.moving:
+                await self._moved.wait()
+            self.seen.add(tenant)
+        shard = self.shards[self.ring.owner(tenant) if tenant else self.ring.shards[0]]
+
+        headers = [(k, v) for k, v in request.headers.raw if k.decode().lower() not in HOP_HEADERS]
+        upstream = shard.client.build_request(
+            request.method,
+            request.url.path,
+            params=request.url.query,
+            headers=headers,
+            content=content
+        )
+        self._start(tenant)
+        try:
+            response = await shard.client.send(upstream, stream=True)
+        except httpx.TransportError as e:
+            self._done(tenant)
+            logger.error(f"Forwarding to {shard.name} failed: {e}")
+            if not shard.alive:
+                logger.error(f"{shard.name} exited with {shard.proc.returncode}; restarting")
+                shard.start()
+            raise HTTPException(status_code=502, detail="shard_unavailable")
+        except BaseException:
+            self._done(tenant)
+            raise
+
+        async def close():
+            try:
+                await response.aclose()
+            finally:
+                self._done(tenant)
+
+        return ShardResponse(
+            close,
+            response.aiter_raw(),
+            status_code=response.status_code,
+            headers={k: v for k, v in response.headers.items() if k.lower() not in HOP_HEADERS}
+        )
+
+    def _start(self, tenant: Optional[str]):
+        if tenant is not None:
+            self.inflight[tenant] = self.inflight.get(tenant, 0) + 1
+
+    def _done(self, tenant: Optional[str]):
+        if tenant is not None:
+            self.inflight[tenant] -= 1
+            if not self.inflight[tenant]:
+                del self.inflight[tenant]
+
+    async def add_shard(self) -> Dict[str, object]:
+        """
+        Start a new shard and move the tenants the ring assigns to it.
+
+        Returns:
+            Summary with the shard name and moved tenants
+
+        Raises:
+            HTTPException: 503 if the shard didn't become ready or the move
+                was aborted; the new shard is stopped and nothing moves
+        """
+        async with self._add_lock:
+            name = f"shard-{len(self.shards)}"
+            shard = Shard(name)
+            shard.start()
+            if not await shard.wait("/ready", READY_TIMEOUT):
+                await shard.stop()
+                raise HTTPException(status_code=503, detail="shard_not_ready")
+            self.shards[name] = shard
+
+            ring = self.ring.copy()
+            ring.add(name)
+            known = self.seen | set(await asyncio.to_thread(snapshots.list_tenants))
+            moves = self.ring.moves(ring, known)
+
+            self._moved.clear()
+            self.moving = set(moves)
+            try:
+                failure = await self._drain(moves)
+                if failure is None:
+                    self.ring = ring
+            finally:
+                self.moving = set()
+                self._moved.set()
+
+            if failure is not None:
+                # Tenants already evicted are restored from their snapshots
+                # on the old shard, which still owns them under the old ring
+                logger.error(f"Aborted adding {name}: {failure}")
+                del self.shards[name]
+                await shard.stop()
+                raise HTTPException(status_code=503, detail=f"move_aborted: {failure}")
+
+            logger.info(f"Added {name}; moved {len(moves)} of {len(known)} known tenants")
+            return {"shard": name, "moved": sorted(moves), "known_tenants": len(known)}
+
+    async def _drain(self, moves: Dict[str, Tuple[str, str]]) -> Optional[str]:
+        """
+        Wait out moving tenants' requests, then have their old shards evict them.
+
+        Evicting a tenant with a request still running would lose that
+        request's writes (an ingest persists after it finishes), so a
+        timeout gives up instead of evicting.
+
+        Returns:
+            None when every tenant was evicted, else why the move failed
+        """
+        deadline = time.monotonic() + MOVE_TIMEOUT
+        while any(self.inflight.get(t) for t in moves):
+            if time.monotonic() >= deadline:
+                busy = sorted(t for t in moves if self.inflight.get(t))
+                return f"requests still in flight for {', '.join(busy)}"
+            await asyncio.sleep(0.01)
+        for tenant, (old, _) in moves.items():
+            try:
+                r = await self.shards[old].client.post(
+                    f"/admin/tenants/{tenant}/evict", headers={ADMIN_HEADER: SHARD_ADMIN_TOKEN}
+                )
+            except httpx.TransportError as e:
+                return f"{old} unreachable evicting {tenant}: {e}"
+            if r.status_code != 200:
+                return f"{old} answered {r.status_code} evicting {tenant}"
+        return None
+
+shard_router = ShardRouter()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await shard_router.start(SHARDS)
+    yield
+    await shard_router.stop()
+
+app = FastAPI(title="Instant-RAG Shard Router", lifespan=lifespan)
+
+@app.get("/ready")
+async def ready():
+    async def probe(shard: Shard):
+        try:
+            r = await shard.client.get("/ready")
+            return r.status_code, r.json()
+        except (httpx.TransportError, ValueError):
+            return 503, {"status": "unreachable"}
+
+    results = await asyncio.gather(*(probe(s) for s in shard_router.shards.values()))
+    shards = {name: body for name, (_, body) in zip(shard_router.shards, results)}
+    if any(code != 200 for code, _ in results):
+        return JSONResponse(status_code=503, content={"status": "starting", "shards": shards})
+    return {"status": "ok", "shards": shards}
+
+@app.get("/admin/shards", dependencies=[Depends(require_admin)])
+def list_shards():
+    ring = shard_router.ring
+    owned: Dict[str, List[str]] = {name: [] for name in shard_router.shards}
+    for tenant in shard_router.seen:
+        owned[ring.owner(tenant)].append(tenant)
+    return {
+        "shards": [
+            {"name": s.name, "pid": s.proc.pid if s.proc else None, "alive": s.alive,
+             "tenants_seen": len(owned[s.name])}
+            for s in shard_router.shards.values()
+        ],
+        "inflight": sum(shard_router.inflight.values())
+    }
+
+@app.post("/admin/shards", dependencies=[Depends(require_admin)])
+async def add_shard():
+    return await shard_router.add_shard()
+
+@app.get("/admin/footprint", dependencies=[Depends(require_admin)])
+async def footprint():
+    async def fetch(shard: Shard):
+        try:
+            r = await shard.client.get("/admin/footprint", headers={ADMIN_HEADER: SHARD_ADMIN_TOKEN})
+            return r.json() if r.status_code == 200 else None
+        except (httpx.TransportError, ValueError):
+            return None
+
+    results = await asyncio.gather(*(fetch(s) for s in shard_router.shards.values()))
+    shards = {name: body for name, body in zip(shard_router.shards, results)}
+    totals: Dict[str, int] = {}
+    for body in filter(None, results):
+        for key, value in body["totals"].items():
+            totals[key] = totals.get(key, 0) + value
+    return {
+        "totals": totals,
+        "shards": {name: body["totals"] if body else None for name, body in shards.items()},
+        "tenants": {name: body["tenants"] for name, body in shards.items() if body}
+    }
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"])
+async def proxy(request: Request):
+    return await shard_router.forward(request)
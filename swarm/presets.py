@@ -1,2 +1,29 @@
+"""
+Swarm presets.
 
-PRESETS={"scholar":{},"explorer":{}}
+Each preset lists the query-variant strategies a swarm fans out over (in
+priority order; the swarm size takes the first N), how many dense
+candidates each variant contributes, the RRF constant used to fuse them
+and how many fused chunks go to the reranker.
+"""
+
+PRESETS = {
+    "scholar": {
+        "strategies": ["original", "keywords", "definition", "clauses", "focus"],
+        "per_variant_k": 20,
+        "rrf_k": 60,
+        "rerank_pool": 20,
+        "top_k": 5
+    },
+    "explorer": {
+        "strategies": ["original", "clauses", "keywords", "focus", "definition"],
+        "per_variant_k": 40,
+        "rrf_k": 20,
+        "rerank_pool": 30,
+        "top_k": 8
+    }
+}
+
+DEFAULT_PRESET = "scholar"
+DEFAULT_SIZE = 3
+MAX_SIZE = len(PRESETS[DEFAULT_PRESET]["strategies"])
@@ -1,45 +1,152 @@
-import asyncio
-from typing import Callable, Dict, Any
+import json
+import re
+from typing import Dict, Any, List, Optional
 
-async def run(query: str, engine: Callable) -> Dict[str, Any]:
+from core.retriever import SimpleRetriever, weave_answer
+from explain.trace import build_trace
+from explain.scores import confidence_from_parts
+from swarm.presets import PRESETS, DEFAULT_PRESET, DEFAULT_SIZE, MAX_SIZE
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "to", "in",
+    "on", "for", "and", "or", "with", "what", "which", "who", "how", "why",
+    "when", "where", "does", "do", "did", "can", "could", "should", "would",
+    "about", "this", "that", "these", "those", "it", "its", "me", "i", "you"
+}
+
+def _words(query: str) -> List[str]:
+    return re.findall(r"[\w'-]+", query.lower())
+
+def _keywords(query: str) -> List[str]:
+    return [w for w in _words(query) if w not in STOPWORDS]
+
+def _strategy(name: str, query: str) -> List[str]:
+    """Produce the query variants for one retrieval strategy."""
+    kw = _keywords(query)
+    if name == "original":
+        return [query]
+    if name == "keywords":
+        return [" ".join(kw)] if kw else []
+    if name == "definition":
+        return [f"definition of {' '.join(kw)}"] if kw else []
+    if name == "clauses":
+        parts = re.split(r"[?;,.]|\band\b|\bor\b", query)
+        return [p.strip() for p in parts if len(_keywords(p)) >= 2]
+    if name == "focus":
+        longest = sorted(set(kw), key=len, reverse=True)[:3]
+        return [" ".join(longest)] if longest else []
+    return []
+
+def variants(query: str, preset: Dict[str, Any], size: int) -> List[str]:
+    """
+    Generate up to ``size`` distinct query variants for a preset.
+
+    Args:
+        query: The query text
+        preset: Swarm preset
+        size: Swarm size (number of variants)
+
+    Returns:
+        Distinct variants, the original query first
+    """
+    out, seen = [], set()
+    for name in preset["strategies"]:
+        for v in _strategy(name, query):
+            key = " ".join(_words(v))
+            if key and key not in seen:
+                seen.add(key)
+                out.append(v)
+    return out[:size]
+
+def fuse(rankings: List[List[int]], k: int = 60) -> List[int]:
+    """
+    Reciprocal rank fusion of several ranked lists of chunk indices.
+
+    Args:
+        rankings: Ranked index lists, best first
+        k: RRF damping constant
+
+    Returns:
+        Deduplicated indices ordered by fused score
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking):
+            scores[i] = scores.get(i, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+def _dedupe_citations(cites: List[Dict]) -> List[Dict]:
+    out, seen = [], set()
+    for c in cites:
+        key = json.dumps(c, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            out.append(c)
+    return out
+
+def run(
+    query: str,
+    retriever: SimpleRetriever,
+    style: str = DEFAULT_PRESET,
+    size: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
     """
     Run a swarm collaboration query.
-    Executes the query multiple times and combines results.
-    
+
+    Fans the query out into distinct variants, encodes them in one batch,
+    searches the tenant index once per variant, fuses the rankings with
+    RRF and reranks the merged pool once against the original query.
+
     Args:
         query: The query text
-        engine: Async callable that processes the query
-        
+        retriever: Tenant retriever to search
+        style: Preset name from swarm.presets
+        size: Number of variants (defaults to DEFAULT_SIZE)
+        filters: Metadata filters scoping every variant's search
+
     Returns:
-        Combined results from multiple executions
+        Answer packet with citations, confidence and fusion trace
+
+    Raises:
+        ValueError: If ``style`` is not a preset name
     """
-    # Run query twice in parallel for swarm collaboration
-    results = await asyncio.gather(
-        engine(query),
-        engine(query)
-    )
-    
-    r1, r2 = results
-    
-    # Combine answers
-    combined_answer = r1.get("answer", "") + "\n\n" + r2.get("answer", "")
-    
-    # Merge citations (deduplicate)
-    citations = r1.get("citations", []) + r2.get("citations", [])
-    
-    # Take higher confidence
-    confidence = max(
-        r1.get("confidence", 0),
-        r2.get("confidence", 0)
+    if style not in PRESETS:
+        raise ValueError(f"unknown swarm style: {style}")
+    preset = PRESETS[style]
+    size = max(1, min(size or DEFAULT_SIZE, MAX_SIZE))
+    qs = variants(query, preset, size)
+
+    results, cites, scores = [], [], []
+    if retriever.docs and qs:
+        qvs = retriever.encode_queries(qs)
+        with retriever.reading():
+            rows = retriever.select(filters)
+            rankings = [retriever.dense_search(qv, preset["per_variant_k"], rows) for qv in qvs]
+            pool, seen = [], set()
+            for i in fuse(rankings, preset["rrf_k"]):
+                # re-ingested files leave identical chunks under new indices
+                if retriever.docs[i] not in seen:
+                    seen.add(retriever.docs[i])
+                    pool.append(i)
+                    if len(pool) == preset["rerank_pool"]:
+                        break
+            idx, scores = retriever.rerank(query, pool)
+            idx, scores = idx[:preset["top_k"]], scores[:preset["top_k"]]
+            results = [retriever.docs[i] for i in idx]
+            cites = [retriever.meta[i] for i in idx]
+
+    packet = weave_answer(results, _dedupe_citations(cites))
+    packet["confidence"] = confidence_from_parts(
+        0.7,
+        max(scores) if scores else 0,
+        len(packet["citations"])
     )
-    
-    return {
-        "answer": combined_answer,
-        "citations": citations,
-        "confidence": confidence,
-        "swarm_size": 2,
-        "explanation": {
-            "method": "parallel_execution",
-            "runs": 2
-        }
-    }
+    packet["swarm_size"] = len(qs)
+
+    trace = build_trace(query, results, scores)
+    trace["method"] = "swarm_rrf_fusion"
+    trace["preset"] = style
+    trace["variants"] = qs
+    packet["explanation"] = trace
+    return packet
@@ -1,5 +1,8 @@
 from core.retriever import SimpleRetriever
-from typing import Dict
+from core.backends import backends
+from tenants.snapshot import SnapshotStore, snapshots
+from typing import Any, Dict, Callable, Optional
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,22 +12,63 @@ class Tenant:
     Represents a single tenant (agent) with isolated resources.
     """
     
-    def __init__(self, id: str):
+    def __init__(self, id: str, retriever: SimpleRetriever = None):
         self.id = id
-        self.retriever = SimpleRetriever()
+        self.retriever = retriever or SimpleRetriever(*backends.for_tenant(id))
         logger.info(f"Created tenant: {id}")
     
+    def footprint(self) -> Dict[str, int]:
+        """
+        Resources held by the tenant's index.
+        
+        Returns:
+            Dictionary of chunk counts and byte sizes
+        """
+        return self.retriever.footprint()
+    
     def __repr__(self):
         return f"Tenant(id={self.id}, docs={len(self.retriever.docs)})"
 
+def default_factory(id: str) -> SimpleRetriever:
+    """Build a retriever on the backends selected for the tenant."""
+    return SimpleRetriever(*backends.for_tenant(id))
+
 class Manager:
     """
     Multi-tenant manager.
-    Handles tenant lifecycle and isolation.
+    Handles tenant lifecycle and isolation; tenants with a snapshot on
+    disk are restored from it when first accessed.
+    
+    Loading, evicting and deleting a tenant are serialized per id, so the
+    warmup thread, request threads and the shard router never restore
+    the same tenant twice or evict one mid-restore. A restore can take
+    seconds (re-embedding on a backend change); async callers should run
+    ``get`` on the thread pool unless ``loaded`` already has the tenant.
     """
     
-    def __init__(self):
+    def __init__(self, factory: Callable[[str], SimpleRetriever] = default_factory,
+                 store: Optional[SnapshotStore] = snapshots):
         self.tenants: Dict[str, Tenant] = {}
+        self.factory = factory  # builds the retriever for a new tenant id
+        self.store = store  # None keeps tenants in memory only
+        self._lock = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+    
+    def _lock_for(self, id: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(id, threading.Lock())
+    
+    def loaded(self, id: str) -> Optional[Tenant]:
+        """
+        Get a tenant only if it is already in memory.
+        
+        Args:
+            id: Tenant identifier
+            
+        Returns:
+            Tenant instance, or None if it would have to be created or restored
+        """
+        return self.tenants.get(id)
     
     def get(self, id: str) -> Tenant:
         """
@@ -36,11 +80,19 @@ class Manager:
         Returns:
             Tenant instance
         """
-        if id not in self.tenants:
-            self.tenants[id] = Tenant(id)
-            logger.info(f"Created new tenant: {id}")
-        
-        return self.tenants[id]
+        tenant = self.tenants.get(id)
+        if tenant is not None:
+            return tenant
+        with self._lock_for(id):
+            tenant = self.tenants.get(id)
+            if tenant is None:
+                tenant = Tenant(id, self.factory(id))
+                if self.store is not None and self.store.load(tenant):
+                    logger.info(f"Restored tenant from snapshot: {id}")
+                else:
+                    logger.info(f"Created new tenant: {id}")
+                self.tenants[id] = tenant
+        return tenant
     
     def exists(self, id: str) -> bool:
         """
@@ -64,11 +116,66 @@ class Manager:
         Returns:
             True if tenant was deleted
         """
-        if id in self.tenants:
-            del self.tenants[id]
+        with self._lock_for(id):
+            removed = self.store is not None and self.store.delete(id)
+            if self.tenants.pop(id, None) is not None:
+                removed = True
+        if removed:
             logger.warning(f"Deleted tenant: {id}")
-            return True
-        return False
+        return removed
+    
+    def evict(self, id: str) -> bool:
+        """
+        Persist a tenant and drop it from memory, keeping its snapshot.
+        
+        Used when another process takes over the tenant; it is restored
+        from the snapshot if it is accessed here again.
+        
+        Args:
+            id: Tenant identifier
+            
+        Returns:
+            True if the tenant was loaded here
+        """
+        with self._lock_for(id):
+            if id not in self.tenants:
+                return False
+            self.persist(id)
+            del self.tenants[id]
+            if self.store is not None:
+                self.store.forget(id)
+        logger.info(f"Evicted tenant: {id}")
+        return True
+    
+    def persist(self, id: str) -> int:
+        """
+        Write a tenant's new chunks to its snapshot.
+        
+        Args:
+            id: Tenant identifier
+            
+        Returns:
+            Number of chunks written
+        """
+        if self.store is None or id not in self.tenants:
+            return 0
+        return self.store.save(self.tenants[id])
+    
+    def restore_all(self) -> int:
+        """
+        Restore every tenant that has a snapshot on disk.
+        
+        Returns:
+            Number of tenants restored
+        """
+        if self.store is None:
+            return 0
+        restored = 0
+        for id in self.store.list_tenants():
+            if id not in self.tenants:
+                self.get(id)
+                restored += 1
+        return restored
     
     def list_tenants(self):
         """
@@ -79,6 +186,25 @@ class Manager:
         """
         return list(self.tenants.keys())
     
+    def footprints(self) -> Dict[str, Any]:
+        """
+        Resource usage of every loaded tenant and their total.
+        
+        Returns:
+            Dictionary with per-tenant footprints, largest first, and totals
+        """
+        tenants = {tid: tenant.footprint() for tid, tenant in list(self.tenants.items())}
+        totals: Dict[str, int] = {}
+        for usage in tenants.values():
+            for key, value in usage.items():
+                totals[key] = totals.get(key, 0) + value
+        ranked = sorted(tenants.items(), key=lambda kv: kv[1]["total_bytes"], reverse=True)
+        return {
+            "total_tenants": len(tenants),
+            "totals": totals,
+            "tenants": [{"id": tid, **usage} for tid, usage in ranked]
+        }
+    
     def get_stats(self):
         """
         Get statistics about all tenants.
@@ -0,0 +1,91 @@
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+
+VNODES = 128  # virtual nodes per shard; evens out the key space
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+class HashRing:
+    """
+    Consistent-hash ring mapping tenant ids to shard names.
+
+    Each shard owns ``vnodes`` points on a 64-bit ring and a tenant
+    belongs to the first point clockwise from its hash, so adding a
+    shard only moves the tenants that land on its new points (about
+    1/N of them) and leaves every other assignment unchanged.
+    """
+
+    def __init__(self, shards: Iterable[str] = (), vnodes: int = VNODES):
+        self.vnodes = vnodes
+        self._points: List[Tuple[int, str]] = []
+        self._keys: List[int] = []
+        for shard in shards:
+            self.add(shard)
+
+    @property
+    def shards(self) -> List[str]:
+        return sorted({s for _, s in self._points})
+
+    def add(self, shard: str):
+        """
+        Add a shard to the ring.
+
+        Args:
+            shard: Shard name
+        """
+        if shard in self.shards:
+            return
+        for v in range(self.vnodes):
+            bisect.insort(self._points, (_hash(f"{shard}#{v}"), shard))
+        self._keys = [h for h, _ in self._points]
+
+    def remove(self, shard: str):
+        """
+        Remove a shard; its tenants fall to the next shard clockwise.
+
+        Args:
+            shard: Shard name
+        """
+        self._points = [p for p in self._points if p[1] != shard]
+        self._keys = [h for h, _ in self._points]
+
+    def owner(self, tenant: str) -> str:
+        """
+        Get the shard that owns a tenant.
+
+        Args:
+            tenant: Tenant identifier
+
+        Returns:
+            Shard name
+        """
+        if not self._points:
+            raise LookupError("hash ring has no shards")
+        i = bisect.bisect(self._keys, _hash(tenant)) % len(self._keys)
+        return self._points[i][1]
+
+    def copy(self) -> "HashRing":
+        ring = HashRing(vnodes=self.vnodes)
+        ring._points = list(self._points)
+        ring._keys = list(self._keys)
+        return ring
+
+    def moves(self, other: "HashRing", tenants: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+        """
+        Tenants whose owner differs between this ring and another.
+
+        Args:
+            other: Ring after the change
+            tenants: Tenant identifiers to check
+
+        Returns:
+            Dictionary mapping tenant to (old shard, new shard)
+        """
+        out = {}
+        for t in tenants:
+            old, new = self.owner(t), other.owner(t)
+            if old != new:
+                out[t] = (old, new)
+        return out
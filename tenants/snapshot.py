@@ -0,0 +1,348 @@
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+import numpy as np
+
+from core.chunkstore import ChunkStore
+from core.metadata import MetadataIndex
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join("data", "tenants"))
+FORMAT_VERSION = 2  # 2: metadata stored per document run instead of per chunk
+MAX_SEGMENTS = 8  # compact into one segment beyond this
+
+class SnapshotError(ValueError):
+    """A snapshot's files are truncated or don't match its manifest."""
+
+# What reading a damaged snapshot raises (bad JSON or .npy headers, missing
+# keys or files); only these set a snapshot aside
+PARSE_ERRORS = (ValueError, KeyError, TypeError, IndexError, EOFError, FileNotFoundError)
+
+class SnapshotStore:
+    """
+    Durable per-tenant index snapshots.
+
+    Layout (one directory per tenant)::
+
+        manifest.json              format version, backend, segment list
+        seg-000001.emb.npy         float32 embeddings, one row per chunk
+        seg-000001.text.bin        UTF-8 chunk text arena
+        seg-000001.offsets.npy     int64 byte offsets into the arena (n + 1)
+        seg-000001.meta.json       [metadata, rows, record id] runs
+        tombstones-<n>.npy         int64 indices of deleted rows
+
+    Each ingest appends a segment holding only the new rows and then
+    atomically rewrites the manifest, so a crash never exposes a partial
+    segment. Deletes only rewrite the tombstone list; once the index has
+    been compacted (rows renumbered) the snapshot is rewritten in full.
+    Restores memory-map the embeddings; multiple segments are
+    merged once and rewritten as a single segment so the next restore is
+    a plain mmap.
+    """
+
+    def __init__(self, root: str = SNAPSHOT_DIR):
+        self.root = root
+        self.persisted: Dict[str, int] = {}  # rows on disk per tenant
+        self._lock = threading.Lock()
+        self._stale: List[str] = []
+
+    def _dir(self, tenant_id: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", tenant_id)[:64]
+        digest = hashlib.sha1(tenant_id.encode()).hexdigest()[:8]
+        return os.path.join(self.root, f"{safe}-{digest}")
+
+    def _read_manifest(self, path: str) -> Optional[Dict[str, Any]]:
+        mpath = os.path.join(path, "manifest.json")
+        if not os.path.exists(mpath):
+            return None
+        with open(mpath, "r") as f:
+            return json.load(f)
+
+    def _write_manifest(self, path: str, manifest: Dict[str, Any]):
+        mpath = os.path.join(path, "manifest.json")
+        with open(mpath + ".tmp", "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(mpath + ".tmp", mpath)
+        # Files the previous manifest referenced are unreachable only now
+        for stale in self._stale:
+            if os.path.exists(stale):
+                os.remove(stale)
+        self._stale = []
+
+    def _write_segment(self, path: str, seg_id: int, retriever, start: int, end: int) -> Dict[str, Any]:
+        base = os.path.join(path, f"seg-{seg_id:06d}")
+        arena, offsets = retriever.docs.arena(start, end)
+
+        np.save(base + ".emb.npy", np.ascontiguousarray(retriever.embeddings[start:end]))
+        np.save(base + ".offsets.npy", offsets)
+        with open(base + ".text.bin", "wb") as f:
+            f.write(arena)
+        with open(base + ".meta.json", "w") as f:
+            json.dump(retriever.meta.runs(start, end), f)
+        return {"id": seg_id, "rows": end - start}
+
+    def _remove_segment(self, path: str, seg_id: int):
+        base = os.path.join(path, f"seg-{seg_id:06d}")
+        for ext in (".emb.npy", ".offsets.npy", ".text.bin", ".meta.json"):
+            if os.path.exists(base + ext):
+                os.remove(base + ext)
+
+    def save(self, tenant) -> int:
+        """
+        Persist rows added since the last save as a new segment.
+
+        Args:
+            tenant: Tenant whose retriever to persist
+
+        Returns:
+            Number of rows written
+        """
+        retriever = tenant.retriever
+        with self._lock:
+            try:
+                return self._save(tenant.id, retriever)
+            except Exception as e:
+                # Rows stay unpersisted and are retried by the next save
+                logger.error(f"Failed to snapshot {tenant.id}: {e}")
+                return 0
+
+    def _save(self, tenant_id: str, retriever) -> int:
+        path = self._dir(tenant_id)
+        os.makedirs(path, exist_ok=True)
+        manifest = self._read_manifest(path) or {
+            "format": FORMAT_VERSION,
+            "tenant_id": tenant_id,
+            "embedder": retriever.model.name,
+            "dim": 0,
+            "segments": []
+        }
+        with retriever.reading():
+            if manifest["segments"] and manifest.get("generation", 0) != retriever.generation:
+                return self._compact(path, manifest, retriever)
+
+            start = self.persisted.get(tenant_id, sum(s["rows"] for s in manifest["segments"]))
+            end = len(retriever.docs)
+            if end <= start and manifest.get("deleted", 0) == retriever.deleted:
+                return 0
+
+            if len(manifest["segments"]) >= MAX_SEGMENTS:
+                return self._compact(path, manifest, retriever)
+
+            if end > start:
+                seg_id = max((s["id"] for s in manifest["segments"]), default=0) + 1
+                manifest["segments"].append(self._write_segment(path, seg_id, retriever, start, end))
+                manifest["dim"] = int(retriever.embeddings.shape[1])
+            self._write_tombstones(path, manifest, retriever)
+            manifest["version"] = retriever.version
+            manifest["generation"] = retriever.generation
+            manifest["updated_at"] = time.time()
+            self._write_manifest(path, manifest)
+            self.persisted[tenant_id] = end
+            logger.info(f"Snapshot for {tenant_id}: +{max(end - start, 0)} rows, {retriever.deleted} tombstones")
+            return max(end - start, 0)
+
+    def _write_tombstones(self, path: str, manifest: Dict[str, Any], retriever):
+        """Write the tombstone list under a new name; the manifest switches to it."""
+        old = manifest.get("tombstones")
+        manifest["tombstones"] = None
+        manifest["deleted"] = retriever.deleted
+        if retriever.deleted:
+            name = f"tombstones-{retriever.version}.npy"
+            np.save(os.path.join(path, name), retriever.tombstones)
+            manifest["tombstones"] = name
+        if old and old != manifest["tombstones"]:
+            self._stale.append(os.path.join(path, old))
+
+    def _compact(self, path: str, manifest: Dict[str, Any], retriever) -> int:
+        """Rewrite all rows as one segment and drop the old ones."""
+        old = [s["id"] for s in manifest["segments"]]
+        seg_id = max(old, default=0) + 1
+        end = len(retriever.docs)
+        manifest["segments"] = [self._write_segment(path, seg_id, retriever, 0, end)]
+        manifest["format"] = FORMAT_VERSION
+        manifest["embedder"] = retriever.model.name
+        manifest["dim"] = int(retriever.embeddings.shape[1]) if end else 0
+        self._write_tombstones(path, manifest, retriever)
+        manifest["version"] = retriever.version
+        manifest["generation"] = retriever.generation
+        manifest["updated_at"] = time.time()
+        self._write_manifest(path, manifest)
+        for sid in old:
+            self._remove_segment(path, sid)
+        written = max(end - self.persisted.get(manifest["tenant_id"], 0), 0)
+        self.persisted[manifest["tenant_id"]] = end
+        logger.info(f"Compacted snapshot for {manifest['tenant_id']}: {end} rows")
+        return written
+
+    def load(self, tenant) -> bool:
+        """
+        Restore a tenant's retriever from its snapshot, if one exists.
+
+        A snapshot that can't be parsed is moved aside and the tenant
+        starts empty. Any other failure (e.g. the embedder failing while
+        re-embedding) is raised, leaving the snapshot for the next try.
+
+        Args:
+            tenant: Freshly created tenant
+
+        Returns:
+            True if a snapshot was restored
+        """
+        retriever = tenant.retriever
+        path = self._dir(tenant.id)
+        start = time.perf_counter()
+        try:
+            manifest = self._read_manifest(path)
+            if manifest is None or not manifest["segments"]:
+                return False
+            if manifest["tenant_id"] != tenant.id:
+                raise SnapshotError(f"manifest belongs to {manifest['tenant_id']}")
+            docs, runs, embs, tombstones = self._read_segments(path, manifest)
+        except PARSE_ERRORS as e:
+            # Keep the files for inspection but start the tenant from scratch
+            aside = f"{path}.unreadable-{int(time.time())}"
+            logger.error(f"Failed to restore snapshot for {tenant.id}, moved to {aside}: {e}")
+            os.replace(path, aside)
+            self.persisted.pop(tenant.id, None)
+            return False
+
+        reembed = manifest.get("embedder") != retriever.model.name
+        if reembed:
+            # Vectors from another backend are not comparable; rebuild them
+            logger.warning(
+                f"Snapshot for {tenant.id} was built with {manifest.get('embedder')}, "
+                f"re-embedding {len(docs)} chunks with {retriever.model.name}"
+            )
+            emb = retriever.encode(list(docs))
+        elif len(embs) == 1:
+            emb = embs[0]
+        else:
+            emb = np.concatenate(embs)
+
+        retriever.restore(docs, MetadataIndex.from_runs(runs), emb, manifest.get("version", 1),
+                          tombstones, manifest.get("generation", 0))
+        self.persisted[tenant.id] = len(docs)
+        if reembed or len(embs) > 1 or manifest["format"] != FORMAT_VERSION:
+            try:
+                with self._lock, retriever.reading():
+                    self._compact(path, manifest, retriever)
+            except Exception as e:
+                # The tenant is restored either way; the next restore retries
+                logger.error(f"Failed to compact snapshot for {tenant.id}: {e}")
+
+        logger.info(
+            f"Restored {tenant.id}: {len(docs)} chunks from {len(embs)} segment(s) "
+            f"in {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+        return True
+
+    def _read_segments(self, path: str, manifest: Dict[str, Any]):
+        """
+        Read a snapshot's segments and check them against its manifest.
+
+        Returns:
+            Tuple of (ChunkStore, metadata runs, per-segment embeddings, tombstones)
+
+        Raises:
+            SnapshotError: A segment is truncated or doesn't match the manifest
+        """
+        fmt = manifest.get("format")
+        if fmt not in (1, FORMAT_VERSION):
+            raise SnapshotError(f"unsupported snapshot format {fmt}")
+
+        arena, offsets = bytearray(), [np.zeros(1, dtype=np.int64)]
+        runs: List[List[Any]] = []
+        embs = []
+        for seg in manifest["segments"]:
+            base = os.path.join(path, f"seg-{seg['id']:06d}")
+            rows = seg["rows"]
+            emb = np.load(base + ".emb.npy", mmap_mode="r")
+            if emb.ndim != 2 or len(emb) != rows or (manifest.get("dim") and emb.shape[1] != manifest["dim"]):
+                raise SnapshotError(f"segment {seg['id']}: embeddings {emb.shape} for {rows} rows")
+            embs.append(emb)
+
+            with open(base + ".text.bin", "rb") as f:
+                text = f.read()
+            seg_offsets = np.load(base + ".offsets.npy")
+            if (len(seg_offsets) != rows + 1 or seg_offsets[0] != 0 or seg_offsets[-1] != len(text)
+                    or np.any(np.diff(seg_offsets) < 0)):
+                raise SnapshotError(f"segment {seg['id']}: text offsets don't match its {len(text)}-byte arena")
+            arena += text
+            # rebase onto the end of the previous segment's text
+            offsets.append(seg_offsets[1:] + offsets[-1][-1])
+
+            with open(base + ".meta.json", "r") as f:
+                seg_meta = json.load(f)
+            if fmt == 1:
+                # one dict per chunk; consecutive equal dicts form a document
+                seg_meta = [
+                    [m, len(list(group)), f"{seg['id']}:{n}"]
+                    for n, (m, group) in enumerate(itertools.groupby(seg_meta))
+                ]
+            if sum(run[1] for run in seg_meta) != rows:
+                raise SnapshotError(f"segment {seg['id']}: metadata doesn't cover its {rows} rows")
+            runs.extend(seg_meta)
+
+        docs = ChunkStore(arena, np.concatenate(offsets))
+        tombstones = []
+        if manifest.get("tombstones"):
+            tombstones = np.load(os.path.join(path, manifest["tombstones"]))
+            if len(tombstones) and (tombstones.min() < 0 or tombstones.max() >= len(docs)):
+                raise SnapshotError("tombstones outside the snapshot's rows")
+        return docs, runs, embs, tombstones
+
+    def delete(self, tenant_id: str) -> bool:
+        """
+        Remove a tenant's snapshot.
+
+        Args:
+            tenant_id: Tenant identifier
+
+        Returns:
+            True if a snapshot was removed
+        """
+        path = self._dir(tenant_id)
+        self.persisted.pop(tenant_id, None)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+            return True
+        return False
+
+    def forget(self, tenant_id: str):
+        """Drop cached state for a tenant this process no longer owns."""
+        with self._lock:
+            self.persisted.pop(tenant_id, None)
+
+    def list_tenants(self) -> List[str]:
+        """
+        List tenants that have a snapshot on disk.
+
+        Returns:
+            List of tenant identifiers
+        """
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for name in os.listdir(self.root):
+            if ".unreadable-" in name:
+                continue
+            try:
+                manifest = self._read_manifest(os.path.join(self.root, name))
+                if manifest:
+                    out.append(manifest["tenant_id"])
+            except Exception as e:
+                logger.warning(f"Skipping unreadable snapshot {name}: {e}")
+        return out
+
+snapshots = SnapshotStore()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+import pytest
+
+# App modules pick their backends at import, so they're settled first
+os.environ.setdefault("EMBEDDER_BACKEND", "hashing")
+os.environ.setdefault("RERANKER_BACKEND", "overlap")
+os.environ.setdefault("ADMIN_TOKEN", "test-admin-token")
+
+def pytest_sessionstart(session):
+    # App modules resolve data/ paths against the working directory; moving
+    # only once the session starts keeps pytest.ini's testpaths resolvable
+    os.chdir(tempfile.mkdtemp(prefix="instant-rag-tests-"))
+    os.makedirs("static/.well-known", exist_ok=True)
+
+@pytest.fixture
+def client():
+    """TestClient on the app with offline backends and in-memory tenants."""
+    from fastapi.testclient import TestClient
+    import main
+    from bench.harness import offline_factory
+
+    main.tm.factory = offline_factory()
+    main.tm.store = None
+    main.tm.tenants.clear()
+    main.results_cache._data.clear()
+    with TestClient(main.app) as c:
+        yield c
+
+@pytest.fixture
+def agent():
+    """A fresh enterprise agent; returns (agent_id, token)."""
+    import uuid
+    from core.subscription import subs
+    from identity.passport import passport
+
+    agent_id = f"test-{uuid.uuid4().hex[:8]}"
+    subs.activate(agent_id, "enterprise")
+    return agent_id, passport.issue(agent_id)
+
+@pytest.fixture
+def admin():
+    """Headers authorizing /admin requests."""
+    from identity.admin import ADMIN_HEADER, ADMIN_TOKEN
+
+    return {ADMIN_HEADER: ADMIN_TOKEN}
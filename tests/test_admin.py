@@ -0,0 +1,51 @@
+import pytest
+
+from core.subscription import subs
+
+@pytest.fixture
+def victim():
+    subs.activate("victim", "free")
+    return "victim"
+
+def test_subscription_writes_need_admin_token(client, admin, victim):
+    url = f"/admin/subscriptions/{victim}"
+    assert client.post(url, params={"plan": "enterprise"}).status_code == 401
+    assert client.post(url, params={"suspend": "true"},
+                       headers={"X-Admin-Token": "guess"}).status_code == 401
+    assert client.get(url).status_code == 401
+    assert subs.get(victim)["plan"] == "free"
+    assert subs.check(victim) == "active"
+
+    r = client.post(url, params={"plan": "pro"}, headers=admin)
+    assert r.status_code == 200
+    assert r.json()["plan"] == "pro"
+
+def test_admin_disabled_without_configured_token(client, monkeypatch):
+    from identity import admin
+
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "")
+    r = client.get("/admin/dashboard", headers={"X-Admin-Token": ""})
+    assert r.status_code == 503
+    assert r.json()["detail"] == "admin_disabled"
+
+def test_backend_pinning_needs_admin_token(client, admin):
+    from core.backends import backends
+
+    url = "/admin/backends/pinned-tenant"
+    assert client.post(url, params={"embedder": "hashing"}).status_code == 401
+    assert "pinned-tenant" not in backends.tenants
+    r = client.post(url, params={"embedder": "hashing"}, headers=admin)
+    assert r.status_code == 200
+    assert backends.tenants["pinned-tenant"]["embedder"] == "hashing"
+
+def test_evict_needs_admin_token(client, admin, agent):
+    import main
+
+    agent_id, token = agent
+    client.post("/query", json={"text": "anything", "agent_id": agent_id, "token": token})
+    assert main.tm.loaded(agent_id) is not None
+    assert client.post(f"/admin/tenants/{agent_id}/evict").status_code == 401
+    assert main.tm.loaded(agent_id) is not None
+    r = client.post(f"/admin/tenants/{agent_id}/evict", headers=admin)
+    assert r.json() == {"agent_id": agent_id, "evicted": True}
+    assert main.tm.loaded(agent_id) is None
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from core.admission import Admission
+from core.subscription import SubscriptionPlan
+
+LIMITS = {plan: 2 for plan in SubscriptionPlan}
+
+class Plans:
+    """Subscription stand-in: an agent's plan is its name before the dash."""
+
+    def get_plan(self, agent):
+        return agent.split("-")[0]
+
+def _admission(**kwargs):
+    return Admission("test", kwargs.pop("concurrency", 1), subscriptions=Plans(),
+                     **{"queue_limits": LIMITS, "timeout": 5.0, **kwargs})
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_freed_slot_goes_to_highest_plan():
+    async def run():
+        adm = _admission()
+        order = []
+        release = asyncio.Event()
+
+        async def request(agent):
+            async with adm.slot(agent):
+                order.append(agent)
+                if agent == "free-0":
+                    await release.wait()
+
+        holder = asyncio.ensure_future(request("free-0"))
+        await _settle()
+        waiters = [asyncio.ensure_future(request(a)) for a in ("free-1", "basic-1", "pro-1", "enterprise-1", "pro-2")]
+        await _settle()
+        assert adm.stats()["queued"] == {"enterprise": 1, "pro": 2, "basic": 1, "free": 1}
+        release.set()
+        await asyncio.gather(holder, *waiters)
+        return order, adm
+
+    order, adm = asyncio.run(run())
+    assert order == ["free-0", "enterprise-1", "pro-1", "pro-2", "basic-1", "free-1"]
+    assert adm.active == 0
+
+def test_full_queue_and_timeout_shed_with_retry_after():
+    async def run():
+        adm = _admission(timeout=0.05)
+        release = asyncio.Event()
+
+        async def hold():
+            async with adm.slot("pro-0"):
+                await release.wait()
+
+        async def request(agent):
+            async with adm.slot(agent):
+                pass
+
+        holder = asyncio.ensure_future(hold())
+        await _settle()
+        queued = [asyncio.ensure_future(request("free-1")) for _ in range(2)]
+        await _settle()
+        with pytest.raises(HTTPException) as full:
+            await request("free-2")  # two free requests already queued
+        timed_out = await asyncio.gather(*queued, return_exceptions=True)
+        release.set()
+        await holder
+        return adm, full.value, timed_out
+
+    adm, full, timed_out = asyncio.run(run())
+    for e in [full, *timed_out]:
+        assert isinstance(e, HTTPException)
+        assert (e.status_code, e.detail) == (503, "overloaded")
+        assert int(e.headers["Retry-After"]) >= 1
+    assert adm.shed == 3
+    assert adm.active == 0
+    assert adm.stats()["queued"]["free"] == 0
+
+def test_cancelled_requests_give_their_slot_back():
+    async def run():
+        adm = _admission()
+        running = asyncio.Event()
+        served = []
+
+        async def request(agent, block=False):
+            async with adm.slot(agent):
+                served.append(agent)
+                if block:
+                    running.set()
+                    await asyncio.Event().wait()
+
+        holder = asyncio.ensure_future(request("pro-0", block=True))
+        await running.wait()
+        waiting = asyncio.ensure_future(request("enterprise-1"))
+        later = asyncio.ensure_future(request("free-1"))
+        await _settle()
+
+        waiting.cancel()  # left while queued: dropped from its queue
+        await _settle()
+        assert adm.stats()["queued"] == {"enterprise": 0, "pro": 0, "basic": 0, "free": 1}
+
+        holder.cancel()  # left while running: the slot passes on
+        await asyncio.gather(holder, waiting, return_exceptions=True)
+        await later
+        return adm, served
+
+    adm, served = asyncio.run(run())
+    assert served == ["pro-0", "free-1"]
+    assert adm.active == 0
+
+def test_slot_handed_over_as_waiter_is_cancelled():
+    async def run():
+        adm = _admission()
+        release = asyncio.Event()
+        served = []
+
+        async def request(agent):
+            async with adm.slot(agent):
+                served.append(agent)
+                if agent == "pro-0":
+                    await release.wait()
+
+        holder = asyncio.ensure_future(request("pro-0"))
+        await _settle()
+        first = asyncio.ensure_future(request("pro-1"))
+        second = asyncio.ensure_future(request("pro-2"))
+        await _settle()
+
+        release.set()
+        while len(adm.queues[SubscriptionPlan.PRO]) == 2:
+            await asyncio.sleep(0)
+        # the slot was just handed to ``first``, which hasn't resumed yet
+        first.cancel()
+        await asyncio.gather(holder, first, second, return_exceptions=True)
+        return adm, served
+
+    adm, served = asyncio.run(run())
+    assert "pro-2" in served
+    assert adm.active == 0
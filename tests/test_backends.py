@@ -0,0 +1,48 @@
+import threading
+import time
+
+import numpy as np
+
+from core import backends as backends_mod
+from core.backends import Backends, HashingEmbedder, OverlapReranker
+
+def test_hashing_bucket_cache_is_bounded():
+    emb = HashingEmbedder()
+    backends_mod._bucket.cache_clear()
+    emb.encode([f"tok{i}" for i in range(backends_mod.BUCKET_CACHE_SIZE + 100)])
+    assert backends_mod._bucket.cache_info().currsize <= backends_mod.BUCKET_CACHE_SIZE
+    # encoding stays deterministic across evictions
+    a = emb.encode(["falcons nest high"])
+    backends_mod._bucket.cache_clear()
+    assert np.array_equal(a, emb.encode(["falcons nest high"]))
+
+def test_slow_load_does_not_block_other_backends(tmp_path):
+    release = threading.Event()
+    loads = []
+
+    class SlowEmbedder(HashingEmbedder):
+        name = "slow"
+
+        def __init__(self):
+            loads.append(1)
+            release.wait(5)
+            super().__init__()
+
+    registry = Backends(str(tmp_path / "tenants.json"))
+    table = {"slow": SlowEmbedder}
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(registry._get("embedder", "slow", table, "")))
+               for _ in range(3)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+
+    start = time.perf_counter()
+    assert isinstance(registry.reranker("overlap"), OverlapReranker)
+    assert time.perf_counter() - start < 1.0
+
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(loads) == 1
+    assert all(g is got[0] for g in got)
@@ -0,0 +1,81 @@
+import json
+import re
+
+import pytest
+
+from portal.badge_history import BadgeHistory
+from portal.rss import FeedCache
+
+@pytest.fixture
+def history(tmp_path):
+    return BadgeHistory(str(tmp_path / "badges.jsonl"))
+
+def _append(history, agent, badge, t):
+    # what another worker with a skewed clock writes
+    with open(history.path, "a") as f:
+        f.write(json.dumps({"time": t, "agent": agent, "badge": badge}) + "\n")
+
+def _titles(feed):
+    return re.findall(r"<item><title>([^<]*)</title>", feed["body"].decode())
+
+def test_out_of_order_append_reaches_feed(history):
+    feeds = FeedCache(history, base_url="https://rag.example")
+    _append(history, "a", "first", 100.0)
+    _append(history, "a", "second", 200.0)
+    assert _titles(feeds.get("a")) == ["a earned second", "a earned first"]
+
+    _append(history, "a", "late", 150.0)  # appended last, older timestamp
+    titles = _titles(feeds.get("a"))
+    assert sorted(titles) == ["a earned first", "a earned late", "a earned second"]
+    assert len(titles) == 3
+
+def test_feed_links_use_configured_url_and_cache_is_bounded(history):
+    feeds = FeedCache(history, base_url="https://rag.example", max_feeds=2)
+    for agent in ("a", "b", "c"):
+        _append(history, agent, "x", 100.0)
+        assert "https://rag.example/portal/badges?agent=" in feeds.get(agent)["body"].decode()
+    assert list(feeds._feeds) == ["b", "c"]
+
+    for i in range(50):
+        feeds.get(f"stranger-{i}")  # no badges: never cached
+    assert list(feeds._feeds) == ["b", "c"]
+
+def test_timeline_pinned_to_head(history):
+    _append(history, "a", "one", 100.0)
+    _append(history, "a", "two", 300.0)
+    count, last = history.head("a")
+    _append(history, "a", "three", 200.0)
+    _append(history, "a", "four", 400.0)
+    pinned = history.timeline("a", upto=count)
+    assert [e["badge"] for e in pinned] == ["one", "two"]
+    assert last == 300.0
+    assert [e["badge"] for e in history.timeline("a", limit=2)] == ["two", "four"]
+
+def test_badges_endpoint_etag_matches_body(client, monkeypatch, tmp_path):
+    import api_portal
+
+    h = BadgeHistory(str(tmp_path / "badges.jsonl"))
+    monkeypatch.setattr(api_portal, "history", h)
+    h.award("a", "x")
+    r = client.get("/portal/badges", params={"agent": "a"})
+    assert r.json()["count"] == 1
+    assert client.get("/portal/badges", params={"agent": "a"},
+                      headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+    h.award("a", "y")
+    assert client.get("/portal/badges", params={"agent": "a"},
+                      headers={"If-None-Match": r.headers["etag"]}).json()["count"] == 2
+
+def test_rss_ignores_host_header(client):
+    r = client.get("/portal/rss", headers={"Host": "evil.example"})
+    assert r.status_code == 200
+    assert b"evil.example" not in r.content
+
+def test_only_admins_award_badges(client, admin, monkeypatch, tmp_path):
+    import dashboard
+
+    h = BadgeHistory(str(tmp_path / "badges.jsonl"))
+    monkeypatch.setattr(dashboard, "history", h)
+    assert client.post("/admin/badges/a", params={"badge": "forged"}).status_code == 401
+    assert h.head("a")[0] == 0
+    assert client.post("/admin/badges/a", params={"badge": "earned"}, headers=admin).status_code == 200
+    assert [e["badge"] for e in h.timeline("a")] == ["earned"]
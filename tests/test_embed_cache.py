@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from core import retriever as retriever_module
+from core.backends import HashingEmbedder
+from core.embed_cache import QueryEmbeddingCache
+from core.retriever import SimpleRetriever
+
+def _vec(i, dim=16):
+    return np.full((1, dim), i, dtype=np.float32)
+
+def test_evicts_least_recently_used_past_byte_budget():
+    probe = QueryEmbeddingCache()
+    entry = probe._size("q0", _vec(0)[0])
+    cache = QueryEmbeddingCache(max_bytes=3 * entry)
+    model = object()
+    for i in range(3):
+        cache.put_many(model, [f"q{i}"], _vec(i))
+    cache.get_many(model, ["q0"])  # q0 is now the most recent
+    cache.put_many(model, ["q3"], _vec(3))
+
+    assert cache.get_many(model, ["q1"]) == [None]
+    assert [v[0] for v in cache.get_many(model, ["q0", "q2", "q3"])] == [0, 2, 3]
+    stats = cache.stats()
+    assert stats["entries"] == 3 and stats["evictions"] == 1
+    assert stats["bytes"] == 3 * entry <= stats["max_bytes"]
+
+    cache.put_many(model, ["big"], np.zeros((1, 4096), dtype=np.float32))
+    assert cache.nbytes <= cache.max_bytes
+    assert QueryEmbeddingCache(max_bytes=0).put_many(model, ["q"], _vec(1)) is None
+    assert QueryEmbeddingCache(max_bytes=0).stats()["entries"] == 0
+
+def test_hit_and_miss_counters():
+    from core.metrics import metrics
+
+    def counted(outcome):
+        return sum(c["value"] for c in metrics.snapshot()["counters"].values()
+                   if c["name"] == "query_embedding_cache_total" and c["labels"]["outcome"] == outcome)
+
+    cache = QueryEmbeddingCache()
+    model = object()
+    hits, misses = counted("hit"), counted("miss")
+    assert cache.get_many(model, ["a", "b"]) == [None, None]
+    cache.put_many(model, ["a"], _vec(1))
+    cache.get_many(model, ["a", "b", "a"])
+    assert cache.contains(model, "a") and not cache.contains(model, "b")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 3, 0.4)
+    assert (counted("hit") - hits, counted("miss") - misses) == (2, 3)
+
+def test_vectors_are_keyed_by_embedder_instance(monkeypatch):
+    cache = QueryEmbeddingCache()
+    monkeypatch.setattr(retriever_module, "query_embeddings", cache)
+    small, large = HashingEmbedder(dim=16), HashingEmbedder(dim=32)
+    retriever = SimpleRetriever(model=small, reranker=None)
+
+    first = retriever.encode_queries(["Where do falcons nest?"])
+    assert first.shape == (1, 16)
+    # another spelling of the same question is a hit for the same embedder
+    np.testing.assert_array_equal(retriever.encode_queries(["WHERE do  falcons nest?"]), first)
+    assert cache.stats()["hits"] == 1
+
+    retriever.model = large  # e.g. the tenant was re-pinned to another backend
+    swapped = retriever.encode_queries(["Where do falcons nest?"])
+    assert swapped.shape == (1, 32)
+    assert cache.stats()["entries"] == 2
+    with pytest.raises(ValueError):
+        cache.get_many(small, ["where do falcons nest?"])[0][0] = 1.0  # shared entries are read-only
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pytest
+
+from core.backends import HashingEmbedder
+from core.embed_pool import EmbedPool
+
+class CrashingEmbedder(HashingEmbedder):
+    """Kills any worker process it runs in; encodes normally in its parent."""
+
+    name = "crashing"
+
+    def __init__(self):
+        super().__init__()
+        self.parent = os.getpid()
+
+    def encode(self, texts, **kwargs):
+        if os.getpid() != self.parent:
+            os._exit(1)
+        return super().encode(texts, **kwargs)
+
+TEXTS = [f"falcon {i} nests on canyon wall {i % 7}" for i in range(64)]
+
+def test_workers_match_in_process_encoding():
+    embedder = HashingEmbedder()
+    pool = EmbedPool(workers=2, batch=8, start_method="spawn")
+    try:
+        assert np.allclose(pool.encode(embedder, TEXTS), embedder.encode(TEXTS))
+    finally:
+        pool.shutdown()
+
+def test_broken_pool_falls_back_and_is_rebuilt():
+    embedder = CrashingEmbedder()
+    pool = EmbedPool(workers=2, batch=8, start_method="spawn")
+    try:
+        got = pool.encode(embedder, TEXTS)
+        assert np.allclose(got, HashingEmbedder().encode(TEXTS))
+        assert "crashing" not in pool._pools
+    finally:
+        pool.shutdown()
+
+def test_fork_is_refused():
+    with pytest.raises(ValueError):
+        EmbedPool(workers=2, start_method="fork")
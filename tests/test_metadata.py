@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from core.metadata import MetadataIndex
+
+def test_append_rejects_bad_tags_without_side_effects():
+    index = MetadataIndex()
+    index.append({"source": "good.txt", "tags": ["a"]}, 3)
+    before = (list(index.records), list(index.starts), dict(index._postings), len(index), index.nbytes)
+    with pytest.raises(ValueError):
+        index.append({"source": "bad.txt", "tags": [{"x": 1}]}, 3)
+    with pytest.raises(ValueError):
+        index.append({"source": "bad.txt", "tags": "a"}, 3)
+    assert (index.records, index.starts, index._postings, len(index), index.nbytes) == before
+    index.append({"source": "other.txt"}, 3)
+    assert [index[r]["source"] for r in (0, 3)] == ["good.txt", "other.txt"]
+
+def _ingest(client, agent_id, token, name, text, metadata=None):
+    params = {"agent_id": agent_id, "token": token}
+    if metadata is not None:
+        params["metadata"] = json.dumps(metadata)
+    return client.post("/ingest", params=params, files={"file": (name, text, "text/plain")})
+
+def test_bad_tags_do_not_corrupt_later_deletes(client, agent):
+    import main
+
+    agent_id, token = agent
+    assert _ingest(client, agent_id, token, "good.txt", b"falcons nest on canyon walls.").status_code == 200
+    r = _ingest(client, agent_id, token, "bad.txt", b"herons wade in marshes.", {"tags": [{"x": 1}]})
+    assert r.status_code == 400
+    assert _ingest(client, agent_id, token, "other.txt", b"owls hunt at night.").status_code == 200
+
+    meta = main.tm.loaded(agent_id).retriever.meta
+    assert [(m["source"], s) for m, s in zip(meta.records, meta.starts)] == [("good.txt", 0), ("other.txt", 1)]
+
+    params = {"agent_id": agent_id, "token": token}
+    assert client.delete("/documents", params={**params, "source": "bad.txt"}).status_code == 404
+    assert client.delete("/documents", params={**params, "source": "other.txt"}).status_code == 200
+    assert client.get("/documents", params=params).json()["documents"] == {"good.txt": 1}
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+
+from core.metrics import UNAUTHENTICATED, Metrics, metrics
+
+def _tenants(endpoint):
+    return {
+        h["labels"]["tenant"]
+        for h in metrics.snapshot()["histograms"].values()
+        if h["name"] == "request_seconds" and h["labels"]["endpoint"] == endpoint
+    }
+
+def test_tenant_label_only_after_passport(client, agent):
+    agent_id, token = agent
+    r = client.post("/query", json={"text": "falcons", "agent_id": "forged-tenant", "token": "nope"})
+    assert r.status_code == 401
+    assert "forged-tenant" not in _tenants("/query")
+    assert UNAUTHENTICATED in _tenants("/query")
+
+    r = client.post("/query", json={"text": "falcons", "agent_id": agent_id, "token": token})
+    assert r.status_code == 200
+    assert agent_id in _tenants("/query")
+
+def test_dead_worker_totals_carry_forward(tmp_path):
+    m = Metrics(str(tmp_path))
+    m.inc("webhook_events_total", 3, event="ingest")
+
+    # a worker that flushed and exited
+    proc = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                          capture_output=True, text=True, check=True)
+    dead = int(proc.stdout)
+    other = Metrics(str(tmp_path))
+    other.inc("webhook_events_total", 5, event="ingest")
+    with open(os.path.join(str(tmp_path), f"worker-{dead}.json"), "w") as f:
+        json.dump(other.snapshot(), f)
+
+    def total():
+        return sum(c["value"] for c in m.merged()["counters"].values())
+
+    assert total() == 8
+    assert not os.path.exists(os.path.join(str(tmp_path), f"worker-{dead}.json"))
+    assert total() == 8  # still counted once the file is retired
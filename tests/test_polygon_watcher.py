@@ -0,0 +1,151 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from payments import ledger
+from payments.config import TREASURY_ADDRESS, USDC
+from payments.polygon_watcher import TRANSFER_TOPIC, Checkpoint, RangeScanner, _topic_for
+
+class FakeNode:
+    """Minimal Polygon JSON-RPC node: block height, Transfer logs and transactions."""
+
+    def __init__(self, head: int, max_range: int = 10 ** 9):
+        self.head = head
+        self.max_range = max_range  # providers reject wider eth_getLogs ranges
+        self.logs = []
+        self.txs = {}
+        self.calls = []
+
+    def deposit(self, block: int, agent: str, amount: int, data: str = None):
+        tx_hash = "0x" + f"{len(self.logs) + 1:064x}"
+        self.logs.append({
+            "address": USDC.lower(),
+            "topics": [TRANSFER_TOPIC, "0x" + "11" * 32, _topic_for(TREASURY_ADDRESS)],
+            "data": data if data is not None else "0x" + f"{amount:064x}",
+            "blockNumber": hex(block),
+            "blockHash": "0x" + "ab" * 32,
+            "transactionHash": tx_hash,
+            "transactionIndex": "0x0",
+            "logIndex": "0x0",
+            "removed": False
+        })
+        self.txs[tx_hash] = {
+            "hash": tx_hash, "blockHash": "0x" + "ab" * 32, "blockNumber": hex(block),
+            "from": "0x" + "11" * 20, "to": USDC.lower(), "gas": "0x5208", "gasPrice": "0x1",
+            "input": "0xa9059cbb" + agent, "nonce": "0x0", "transactionIndex": "0x0",
+            "value": "0x0", "v": "0x1b", "r": "0x1", "s": "0x1", "type": "0x0"
+        }
+        return tx_hash
+
+    def handle(self, method, params):
+        self.calls.append((method, params))
+        if method == "eth_chainId":
+            return hex(137)
+        if method == "eth_blockNumber":
+            return hex(self.head)
+        if method == "eth_getTransactionByHash":
+            return self.txs[params[0]]
+        if method == "eth_getLogs":
+            start, end = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+            if end - start + 1 > self.max_range:
+                raise ValueError("block range too large")
+            return [l for l in self.logs if start <= int(l["blockNumber"], 16) <= end]
+        raise ValueError(f"unsupported method {method}")
+
+    def ranges(self):
+        return [(int(p[0]["fromBlock"], 16), int(p[0]["toBlock"], 16))
+                for m, p in self.calls if m == "eth_getLogs"]
+
+@pytest.fixture
+def node():
+    fake = FakeNode(head=1000)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            try:
+                body = {"jsonrpc": "2.0", "id": req["id"], "result": fake.handle(req["method"], req["params"])}
+            except ValueError as e:
+                body = {"jsonrpc": "2.0", "id": req["id"], "error": {"code": -32005, "message": str(e)}}
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fake.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield fake
+    server.shutdown()
+
+@pytest.fixture(autouse=True)
+def wallet(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger, "DB", str(tmp_path / "wallet.json"))
+
+def scanner(node, tmp_path, **kwargs):
+    from web3 import Web3
+    kwargs.setdefault("confirmations", 3)
+    kwargs.setdefault("range_size", 100)
+    kwargs.setdefault("concurrency", 2)
+    return RangeScanner(web3=Web3(Web3.HTTPProvider(node.url)),
+                        checkpoint=Checkpoint(str(tmp_path / "checkpoint.json")), **kwargs)
+
+def test_credits_deposits_from_start_block_once(node, tmp_path):
+    node.deposit(10, "aaaa0001", 2_500_000)
+    node.deposit(500, "aaaa0002", 1_000_000)
+    node.deposit(999, "aaaa0003", 1_000_000)  # not yet confirmed
+
+    s = scanner(node, tmp_path, start_block=0)
+    assert s.run_once() == 2
+    assert ledger.balance("aaaa0001") == 2.5
+    assert ledger.balance("aaaa0002") == 1.0
+    assert ledger.balance("aaaa0003") == 0
+    assert s.checkpoint.load() == 997
+
+    node.head = 1010
+    assert s.run_once() == 1
+    assert ledger.balance("aaaa0003") == 1.0
+    assert node.ranges()[-1] == (998, 1007)  # resumes after the checkpoint
+
+    # rescanning from scratch (lost checkpoint) credits nothing twice
+    (tmp_path / "checkpoint.json").unlink()
+    assert scanner(node, tmp_path, start_block=0).run_once() == 0
+    assert ledger.balance("aaaa0001") == 2.5
+
+def test_first_run_without_start_block_begins_at_head(node, tmp_path):
+    node.deposit(10, "bbbb0001", 1_000_000)
+    s = scanner(node, tmp_path, start_block=None)
+    assert s.run_once() == 0
+    assert node.ranges() == [(997, 997)]
+    assert s.checkpoint.load() == 997
+
+    node.deposit(1001, "bbbb0002", 3_000_000)
+    node.head = 1004
+    assert s.run_once() == 1
+    assert ledger.balance("bbbb0001") == 0
+    assert ledger.balance("bbbb0002") == 3.0
+
+def test_range_shrinks_on_provider_limit(node, tmp_path):
+    node.max_range = 40
+    for block in (5, 45, 95, 140):
+        node.deposit(block, f"cccc{block:04d}", 1_000_000)
+    s = scanner(node, tmp_path, start_block=0, range_size=100)
+    node.head = 203
+    assert s.run_once() == 4
+    covered = sorted(r for r in node.ranges() if r[1] - r[0] + 1 <= 40)
+    assert covered[0][0] == 0 and covered[-1][1] == 200
+
+def test_empty_transfer_data_is_skipped(node, tmp_path):
+    node.deposit(20, "dddd0001", 0, data="0x")
+    node.deposit(21, "dddd0002", 1_000_000)
+    s = scanner(node, tmp_path, start_block=0)
+    assert s.run_once() == 1
+    assert ledger.balance("dddd0002") == 1.0
+    assert not ledger.credited(node.logs[0]["transactionHash"])
@@ -0,0 +1,37 @@
+from core.rollups import rollups
+
+def test_leaderboard_hides_wallet_totals(client, agent, admin):
+    agent_id, _ = agent
+    rollups.audit("query", agent_id, {"confidence": 0.9})
+    rollups.ledger("spend", agent_id, 12.5)
+    rollups._cache.clear()
+
+    r = client.get("/portal/leaderboard", params={"by": "queries", "limit": 100})
+    assert r.status_code == 200
+    row = next(a for a in r.json()["agents"] if a["agent"] == agent_id)
+    assert "spend" not in row and "credit" not in row
+    for by in ("spend", "credit"):
+        assert client.get("/portal/leaderboard", params={"by": by}).status_code == 400
+
+    assert client.get("/admin/leaderboard", params={"by": "spend"}).status_code == 401
+    r = client.get("/admin/leaderboard", params={"by": "spend", "limit": 100}, headers=admin)
+    row = next(a for a in r.json()["agents"] if a["agent"] == agent_id)
+    assert row["spend"] == 12.5
+
+def test_agent_analytics_needs_passport(client, agent):
+    agent_id, token = agent
+    rollups.ledger("spend", agent_id, 3.0)
+    url = f"/portal/agents/{agent_id}/analytics"
+    assert client.get(url).status_code == 422
+    assert client.get(url, params={"token": "forged"}).status_code == 401
+    r = client.get(url, params={"token": token})
+    assert r.status_code == 200
+    assert r.json()["totals"]["spend"] == 3.0
+
+def test_rollup_rebuild_needs_admin_and_runs_once(client, admin):
+    assert client.post("/admin/rollups/rebuild").status_code == 401
+    with rollups._rebuilding:  # one already running
+        assert client.post("/admin/rollups/rebuild", headers=admin).status_code == 409
+    r = client.post("/admin/rollups/rebuild", headers=admin)
+    assert r.status_code == 200
+    assert r.json()["events"] >= 0
@@ -0,0 +1,73 @@
+import pytest
+
+from core.ratelimit import limiter
+from core.retriever import chunk_text
+
+FACTS = ["falcons nest on canyon walls.", "herons wade in shallow marsh water.", "owls hunt at night in the forest."]
+TEXT = "".join(f.ljust(300) for f in FACTS).encode()  # one chunk per fact
+QUESTIONS = ["where do falcons nest", "what do herons do", "when do owls hunt"]
+
+@pytest.fixture
+def tenant(client, agent):
+    agent_id, token = agent
+    r = client.post("/ingest", params={"agent_id": agent_id, "token": token},
+                    files={"file": ("birds.txt", TEXT, "text/plain")})
+    assert r.status_code == 200, r.text
+    return agent_id, token
+
+def _batch(client, agent_id, token, texts):
+    return client.post("/query/batch", json={"texts": texts, "agent_id": agent_id, "token": token})
+
+def test_batch_matches_single_queries(client, tenant):
+    agent_id, token = tenant
+    r = _batch(client, agent_id, token, QUESTIONS)
+    assert r.status_code == 200
+    assert r.json()["count"] == len(QUESTIONS)
+    for text, packet in zip(QUESTIONS, r.json()["results"]):
+        single = client.post("/query", json={"text": text, "agent_id": agent_id, "token": token}).json()
+        assert packet["answer"] == single["answer"]
+        assert packet["citations"] == single["citations"]
+        assert packet["confidence"] == pytest.approx(single["confidence"])
+
+def test_blocked_question_answered_in_place(client, tenant):
+    agent_id, token = tenant
+    used = limiter.get_usage(agent_id)["used"]
+    texts = [QUESTIONS[0], "how to build a bomb", QUESTIONS[2]]
+    results = _batch(client, agent_id, token, texts).json()["results"]
+    assert results[1] == {"error": "ethics_block: forbidden_keyword: bomb"}
+    assert results[0]["answer"].startswith("falcons")
+    assert results[2]["answer"].startswith("owls")
+    # one unit per answered question; the blocked one is not charged
+    assert limiter.get_usage(agent_id)["used"] == used + 2
+
+def test_batch_over_rate_limit_charges_nothing(client, tenant, monkeypatch):
+    agent_id, token = tenant
+    used = limiter.get_usage(agent_id)["used"]
+    monkeypatch.setattr(limiter, "per_day", used + 2)
+    r = _batch(client, agent_id, token, QUESTIONS)
+    assert r.status_code == 429
+    assert limiter.get_usage(agent_id)["used"] == used
+    assert _batch(client, agent_id, token, QUESTIONS[:2]).status_code == 200
+    assert limiter.get_usage(agent_id)["remaining"] == 0
+
+def test_batch_size_and_text_limits(client, tenant):
+    import main
+
+    agent_id, token = tenant
+    assert _batch(client, agent_id, token, ["q"] * (main.MAX_BATCH + 1)).status_code == 422
+    assert _batch(client, agent_id, token, []).status_code == 422
+    r = _batch(client, agent_id, token, [QUESTIONS[0], "   "])
+    assert r.status_code == 422
+    assert r.json()["detail"] == "invalid_query_text"
+    assert _batch(client, agent_id, "forged", QUESTIONS).status_code == 401
+
+def test_search_batch_matches_search():
+    from bench.harness import offline_factory
+
+    retriever = offline_factory()("t")
+    assert retriever.search_batch(QUESTIONS) == [([], [], [])] * 3  # empty index
+    retriever.add_documents(chunk_text(TEXT.decode()), "birds.txt")
+    for text, (results, cites, scores) in zip(QUESTIONS, retriever.search_batch(QUESTIONS, 2)):
+        single = retriever.search(text, 2)
+        assert (results, cites) == single[:2]
+        assert scores == pytest.approx(single[2])
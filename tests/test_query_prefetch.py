@@ -0,0 +1,36 @@
+import pytest
+
+from core.ratelimit import limiter
+from core.subscription import subs
+
+@pytest.fixture
+def prefetches(monkeypatch):
+    """Records the questions /query starts encoding ahead of the search."""
+    import main
+
+    started = []
+    real = main._prefetch_embedding
+
+    def counting(agent_id, text):
+        started.append(text)
+        return real(agent_id, text)
+
+    monkeypatch.setattr(main, "_prefetch_embedding", counting)
+    return started
+
+def _query(client, agent_id, token, text="where do falcons nest"):
+    return client.post("/query", json={"text": text, "agent_id": agent_id, "token": token})
+
+def test_prefetch_starts_for_admitted_query(client, agent, prefetches):
+    assert _query(client, *agent).status_code == 200
+    assert prefetches == ["where do falcons nest"]
+
+def test_no_prefetch_for_suspended_agent(client, agent, prefetches):
+    subs.suspend(agent[0])
+    assert _query(client, *agent).status_code == 403
+    assert prefetches == []
+
+def test_no_prefetch_when_rate_limited(client, agent, prefetches, monkeypatch):
+    monkeypatch.setattr(limiter, "per_day", limiter.get_usage(agent[0])["used"])
+    assert _query(client, *agent).status_code == 429
+    assert prefetches == []
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+TEXT = b"falcons nest on canyon walls.\nherons wade in shallow marsh water.\nowls hunt at night in the forest."
+
+def _ingest(client, agent_id, token, name="birds.txt"):
+    r = client.post("/ingest", params={"agent_id": agent_id, "token": token},
+                    files={"file": (name, TEXT, "text/plain")})
+    assert r.status_code == 200, r.text
+
+def test_stream_events_match_query(client, agent):
+    agent_id, token = agent
+    _ingest(client, agent_id, token)
+    body = {"text": "where do falcons nest", "agent_id": agent_id, "token": token}
+
+    r = client.post("/query/stream", json=body)
+    events = [json.loads(line) for line in r.text.splitlines()]
+    assert [e["event"] for e in events] == ["candidates", "reranked", "answer", "trace", "done"]
+    candidates, reranked, answer = events[0], events[1], events[2]
+    assert sorted(reranked["order"]) == list(range(len(candidates["results"])))
+    assert candidates["results"][reranked["order"][0]].startswith("falcons")
+    assert answer["answer"] == client.post("/query", json=body).json()["answer"]
+
+def test_stream_does_not_pin_readers_while_paused(client, agent):
+    import main
+
+    agent_id, token = agent
+    _ingest(client, agent_id, token)
+    retriever = main.tm.loaded(agent_id).retriever
+    request = main.QueryRequest(text="where do falcons nest", agent_id=agent_id, token=token)
+
+    async def first_event():
+        response = await main.query_stream(request)
+        body = response.body_iterator
+        first = await body.__anext__()
+        # a client that stops reading here must not block compaction
+        readers = retriever._readers
+        await body.aclose()
+        return first, readers
+
+    first, readers = asyncio.run(first_event())
+    assert json.loads(first)["event"] == "candidates"
+    assert readers == 0
+
+def test_delete_document(client, agent):
+    agent_id, token = agent
+    _ingest(client, agent_id, token)
+    params = {"agent_id": agent_id, "token": token, "source": "birds.txt"}
+    r = client.delete("/documents", params=params)
+    assert r.status_code == 200
+    assert r.json()["chunks"] > 0
+    assert client.delete("/documents", params=params).status_code == 404
+
+def test_stream_is_admitted_and_timed(client, agent, monkeypatch):
+    import main
+    from core.metrics import metrics
+
+    agent_id, token = agent
+    _ingest(client, agent_id, token)
+    body = {"text": "where do falcons nest", "agent_id": agent_id, "token": token}
+    assert client.post("/query/stream", json=body).status_code == 200
+    labels = [h["labels"] for h in metrics.snapshot()["histograms"].values()]
+    assert {"endpoint": "/query/stream", "tenant": agent_id} in labels
+    assert {"endpoint": "/query/stream", "stage": "rerank"} in labels
+    assert main.query_admission.active == 0
+
+    # every slot taken: the stream queues like /query and is shed on timeout
+    monkeypatch.setattr(main.query_admission, "timeout", 0.05)
+    monkeypatch.setattr(main.query_admission, "active", main.query_admission.concurrency)
+    r = client.post("/query/stream", json=body)
+    assert r.status_code == 503
+    assert r.headers["retry-after"]
+
+def test_stream_frees_its_slot_when_client_leaves(client, agent):
+    import main
+
+    agent_id, token = agent
+    _ingest(client, agent_id, token)
+    request = main.QueryRequest(text="where do falcons nest", agent_id=agent_id, token=token)
+
+    async def leave_after_first_event():
+        response = await main.query_stream(request)
+        await response.body_iterator.__anext__()
+        await response.body_iterator.aclose()
+        await asyncio.sleep(0)
+
+    asyncio.run(leave_after_first_event())
+    assert main.query_admission.active == 0
@@ -0,0 +1,43 @@
+import uuid
+
+import pytest
+
+from core.quota import UPLOAD_SLACK
+
+@pytest.fixture
+def free_agent():
+    from core.subscription import subs
+    from identity.passport import passport
+
+    agent_id = f"test-{uuid.uuid4().hex[:8]}"
+    subs.activate(agent_id, "free")
+    return agent_id, passport.issue(agent_id)
+
+def _ingest(client, agent_id, token, name, body, **params):
+    return client.post("/ingest", params={"agent_id": agent_id, "token": token, **params},
+                       files={"file": (name, body, "text/plain")},
+                       headers={"Origin": "https://example.com"})
+
+def test_oversized_upload_is_refused_with_cors_headers(client, free_agent):
+    agent_id, token = free_agent
+    r = _ingest(client, agent_id, token, "big.txt", b"a" * (1024 * 1024 + UPLOAD_SLACK + 1))
+    assert r.status_code == 413
+    assert r.json()["detail"] == "file_too_large"
+    assert r.headers.get("access-control-allow-origin")
+
+def test_file_just_over_plan_size_is_refused(client, free_agent):
+    agent_id, token = free_agent
+    # under the middleware's slack, caught by the endpoint's own check
+    r = _ingest(client, agent_id, token, "big.txt", b"word " * (1024 * 1024 // 5 + 10))
+    assert r.status_code == 413
+    assert r.headers.get("access-control-allow-origin")
+
+def test_document_limit(client, free_agent):
+    agent_id, token = free_agent
+    for i in range(10):
+        assert _ingest(client, agent_id, token, f"doc-{i}.txt", b"falcons nest high").status_code == 200
+    r = _ingest(client, agent_id, token, "doc-10.txt", b"falcons nest high")
+    assert r.status_code == 403
+    assert r.json()["detail"] == "document_limit_reached"
+    # replacing an existing document doesn't count as a new one
+    assert _ingest(client, agent_id, token, "doc-0.txt", b"owls hunt", replace=True).status_code == 200
@@ -0,0 +1,126 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import router
+
+class FakeShard:
+    """Shard stand-in answering over an in-process transport."""
+
+    evict_status = 200
+
+    def __init__(self, name):
+        self.name = name
+        self.evicted = []
+        self.stopped = False
+        self.proc = None
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(self.handle), base_url="http://shard")
+
+    def handle(self, request):
+        if request.url.path.endswith("/evict"):
+            if request.headers.get("X-Admin-Token") != router.SHARD_ADMIN_TOKEN:
+                return httpx.Response(401, json={"detail": "invalid_admin_token"})
+            self.evicted.append(request.url.path.split("/")[3])
+            return httpx.Response(self.evict_status, json={"evicted": True})
+        return httpx.Response(200, json={"ok": True})
+
+    def start(self):
+        pass
+
+    @property
+    def alive(self):
+        return not self.stopped
+
+    async def wait(self, path, timeout):
+        return True
+
+    async def stop(self):
+        self.stopped = True
+        await self.client.aclose()
+
+@pytest.fixture
+def shard_router(monkeypatch):
+    monkeypatch.setattr(router, "Shard", FakeShard)
+    monkeypatch.setattr(router.snapshots, "list_tenants", lambda: [])
+    monkeypatch.setattr(router, "MOVE_TIMEOUT", 0.2)
+    r = router.ShardRouter()
+    for name in ("shard-0", "shard-1"):
+        r.shards[name] = FakeShard(name)
+        r.ring.add(name)
+    r.seen = {f"tenant-{i}" for i in range(60)}
+    return r
+
+def _moving(r):
+    ring = r.ring.copy()
+    ring.add("shard-2")
+    return r.ring.moves(ring, r.seen)
+
+def test_add_shard_moves_and_evicts(shard_router):
+    moves = _moving(shard_router)
+    assert moves
+    summary = asyncio.run(shard_router.add_shard())
+    assert set(summary["moved"]) == set(moves)
+    evicted = shard_router.shards["shard-0"].evicted + shard_router.shards["shard-1"].evicted
+    assert sorted(evicted) == sorted(moves)
+    assert all(shard_router.ring.owner(t) == "shard-2" for t in moves)
+
+def test_add_shard_aborts_instead_of_evicting_busy_tenant(shard_router):
+    ring_before = shard_router.ring
+    busy = next(iter(_moving(shard_router)))
+    shard_router.inflight[busy] = 1  # e.g. a long ingest
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(shard_router.add_shard())
+    assert exc.value.status_code == 503
+    assert shard_router.ring is ring_before
+    assert "shard-2" not in shard_router.shards
+    assert not shard_router.shards["shard-0"].evicted and not shard_router.shards["shard-1"].evicted
+    assert not shard_router.moving
+
+def test_add_shard_aborts_when_evict_fails(shard_router, monkeypatch):
+    ring_before = shard_router.ring
+    monkeypatch.setattr(FakeShard, "evict_status", 500)
+    with pytest.raises(HTTPException):
+        asyncio.run(shard_router.add_shard())
+    assert shard_router.ring is ring_before
+    assert "shard-2" not in shard_router.shards
+
+def test_inflight_released_when_client_disconnects(shard_router):
+    from starlette.requests import Request
+
+    async def run():
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"},
+            "method": "GET", "path": "/documents", "raw_path": b"/documents",
+            "query_string": b"agent_id=tenant-1&token=x", "headers": [],
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            raise OSError("client went away")
+
+        response = await shard_router.forward(Request(scope, receive))
+        assert shard_router.inflight == {"tenant-1": 1}
+        with pytest.raises(Exception):
+            await response(scope, receive, send)
+
+    asyncio.run(run())
+    assert shard_router.inflight == {}
+
+def test_router_admin_endpoints_need_admin_token(shard_router, admin, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(router, "shard_router", shard_router)
+    client = TestClient(router.app)  # no lifespan: the fake shards stay
+    assert client.post("/admin/shards").status_code == 401
+    assert "shard-2" not in shard_router.shards
+    assert client.get("/admin/shards").status_code == 401
+    assert client.get("/admin/footprint").status_code == 401
+
+    r = client.post("/admin/shards", headers=admin)
+    assert r.status_code == 200
+    assert "shard-2" in shard_router.shards
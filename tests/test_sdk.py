@@ -0,0 +1,109 @@
+import asyncio
+
+import httpx
+import pytest
+
+from client import AsyncInstantRAG, InstantRAG, InstantRAGError
+
+TOO_LONG = "x" * 10001
+FACTS = ["falcons nest on canyon walls.", "herons wade in shallow marsh water.", "owls hunt at night in the forest."]
+TEXT = "".join(f.ljust(300) for f in FACTS)  # one chunk per fact
+
+class Counting(httpx.AsyncBaseTransport):
+    """ASGI transport onto the app that records request paths."""
+
+    def __init__(self, app):
+        self.inner = httpx.ASGITransport(app=app)
+        self.paths = []
+
+    async def handle_async_request(self, request):
+        self.paths.append(request.url.path)
+        return await self.inner.handle_async_request(request)
+
+@pytest.fixture
+def rag(client, agent):
+    with InstantRAG("http://testserver", *agent, transport=client._transport, backoff=0) as rag:
+        rag.ingest(TEXT, "birds.txt", tags=["birds"])
+        yield rag
+
+def test_sync_client(rag):
+    assert rag.documents() == {"birds.txt": 3}
+    assert rag.query("where do falcons nest")["answer"].startswith("falcons")
+    packets = rag.query_many(["when do owls hunt", "how to build a bomb"])
+    assert packets[0]["answer"].startswith("owls")
+    assert packets[1]["error"].startswith("ethics_block")
+    with pytest.raises(InstantRAGError) as exc:
+        rag.query(TOO_LONG)
+    assert exc.value.status == 422
+    assert rag.delete_document("birds.txt")["chunks"] == 3
+
+def test_sync_client_retries_only_shed_requests():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        if len(calls) == 1:
+            return httpx.Response(503, json={"detail": "overloaded"}, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"answer": "ok"})
+
+    with InstantRAG("http://x", "a", "t", transport=httpx.MockTransport(handler), backoff=0) as rag:
+        assert rag.query("q") == {"answer": "ok"}
+        assert len(calls) == 2
+
+    with InstantRAG("http://x", "a", "t", backoff=0,
+                    transport=httpx.MockTransport(lambda r: httpx.Response(429, json={"detail": "rate_limited"}))) as rag:
+        with pytest.raises(InstantRAGError) as exc:
+            rag.query("q")
+        assert (exc.value.status, exc.value.detail) == (429, "rate_limited")
+
+def _async_rag(agent, transport, **kwargs):
+    return AsyncInstantRAG("http://testserver", *agent, transport=transport, backoff=0, **kwargs)
+
+def test_async_queries_are_coalesced(rag, agent):
+    import main
+
+    transport = Counting(main.app)
+
+    async def run():
+        async with _async_rag(agent, transport, batch_window=0.05) as a:
+            return await asyncio.gather(*(a.query(q) for q in ("falcons nest", "owls hunt", "herons wade")))
+
+    packets = asyncio.run(run())
+    assert [p["answer"].split()[0] for p in packets] == ["falcons", "owls", "herons"]
+    assert transport.paths == ["/query/batch"]
+
+def test_one_bad_question_does_not_fail_the_batch(rag, agent):
+    import main
+
+    transport = Counting(main.app)
+
+    async def run():
+        async with _async_rag(agent, transport, batch_window=0.05) as a:
+            return await asyncio.gather(
+                a.query("falcons nest"), a.query(TOO_LONG), a.query("how to build a bomb"), a.query("owls hunt"),
+                return_exceptions=True
+            )
+
+    good, bad, blocked, other = asyncio.run(run())
+    assert good["answer"].startswith("falcons")
+    assert other["answer"].startswith("owls")
+    assert isinstance(bad, InstantRAGError) and bad.status == 422
+    assert isinstance(blocked, InstantRAGError) and blocked.status == 400
+    # the batch was refused as a whole, then each question asked on its own
+    assert transport.paths[0] == "/query/batch"
+    assert sorted(transport.paths[1:]) == ["/query"] * 4
+
+def test_batch_over_rate_limit_answers_what_fits(rag, agent, monkeypatch):
+    import main
+    from core.ratelimit import limiter
+
+    monkeypatch.setattr(limiter, "per_day", limiter.get_usage(agent[0])["used"] + 2)
+
+    async def run():
+        async with _async_rag(agent, Counting(main.app), batch_window=0.05, retries=0) as a:
+            return await asyncio.gather(*(a.query(q) for q in ("falcons", "owls", "herons")),
+                                        return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert sum(isinstance(r, dict) for r in results) == 2
+    assert [r.status for r in results if isinstance(r, InstantRAGError)] == [429]
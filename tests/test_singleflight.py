@@ -0,0 +1,65 @@
+import asyncio
+import threading
+
+import anyio
+import pytest
+
+from core.singleflight import SingleFlight
+
+def test_identical_calls_share_one_thread():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def search(q):
+        calls.append(q)
+        release.wait(5)
+        return q.upper()
+
+    async def main():
+        tasks = [asyncio.ensure_future(flight.do("k", search, "falcon")) for _ in range(50)]
+        await asyncio.sleep(0.05)
+        borrowed = anyio.to_thread.current_default_thread_limiter().borrowed_tokens
+        release.set()
+        return borrowed, await asyncio.gather(*tasks)
+
+    borrowed, results = asyncio.run(main())
+    assert borrowed == 1
+    assert calls == ["falcon"]
+    assert results == ["FALCON"] * 50
+    assert flight.stats()["executed"] == 1 and flight.stats()["coalesced"] == 49
+    assert flight.stats()["in_flight"] == 0
+
+def test_error_reaches_every_caller_and_key_is_released():
+    flight = SingleFlight()
+
+    def boom():
+        raise RuntimeError("index gone")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", boom) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.stats()["in_flight"] == 0
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return 42
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == 42
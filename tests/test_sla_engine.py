@@ -0,0 +1,23 @@
+import logging
+
+from contracts.engine import Engine
+
+def test_low_confidence_is_not_a_violation(caplog):
+    engine = Engine()
+    with caplog.at_level(logging.WARNING, logger="contracts.engine"):
+        for _ in range(10):
+            assert engine.record("t", 5.0, confidence=0.1)
+    assert not caplog.records
+    report = engine.report("t")
+    assert report["compliance"] == 1.0
+    assert report["confidence_mean"] == 0.1
+
+def test_slow_requests_count_against_compliance_quietly(caplog):
+    engine = Engine()
+    with caplog.at_level(logging.WARNING, logger="contracts.engine"):
+        for _ in range(5):
+            assert not engine.record("t", 900.0)
+    # below MIN_SAMPLES: no mode change, so nothing worth a warning
+    assert not caplog.records
+    assert engine.report("t")["compliance"] == 0.0
+    assert engine.report("t")["confidence_mean"] is None
@@ -0,0 +1,32 @@
+from contracts.engine import TenantWindow, engine
+from core.result_cache import results_cache
+
+TEXT = " ".join(f"falcon fact {i}: falcons nest on ledge {i}." for i in range(200)).encode()
+
+def _set_mode(agent_id, mode):
+    engine.windows.setdefault(agent_id, TenantWindow()).mode = mode
+
+def test_cache_only_serves_full_quality_results(client, agent):
+    agent_id, token = agent
+    r = client.post("/ingest", params={"agent_id": agent_id, "token": token},
+                    files={"file": ("falcons.txt", TEXT, "text/plain")})
+    assert r.status_code == 200
+    body = {"text": "where do falcons nest", "agent_id": agent_id, "token": token}
+
+    try:
+        _set_mode(agent_id, "reduced_pool")
+        reduced = client.post("/query", json=body).json()
+        assert reduced["explanation"]["sla_mode"] == "reduced_pool"
+        assert not any(k[0] == agent_id for k in results_cache._data)
+
+        _set_mode(agent_id, "normal")
+        full = client.post("/query", json=body).json()
+        stored = [v for k, v in results_cache._data.items() if k[0] == agent_id]
+        assert [len(results) for results, _, _, _ in stored] == [5]
+
+        _set_mode(agent_id, "cache_only")
+        cached = client.post("/query", json=body).json()
+        assert cached["answer"] == full["answer"]
+        assert cached["explanation"]["sla_mode"] == "cache_only"
+    finally:
+        engine.windows.pop(agent_id, None)
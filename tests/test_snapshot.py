@@ -0,0 +1,135 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from bench.harness import offline_factory
+from core.chunkstore import ChunkStore
+from tenants.manager import Tenant
+from tenants.snapshot import SnapshotStore
+
+TEXTS = {
+    "birds.txt": ["falcons nest on canyon walls", "herons wade in marsh water"],
+    "cafés.txt": ["crème brûlée at the café", "東京の夜は静かです", "emoji 🦉 owls hunt at night"],
+}
+
+def _tenant(id="t"):
+    return Tenant(id, offline_factory()(id))
+
+def _ingest(tenant, source):
+    tenant.retriever.add_documents(TEXTS[source], source, {"tags": [source[:4]]})
+
+def _sources(tenant, q):
+    return [c["source"] for c in tenant.retriever.search(q, 5)[1]]
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path))
+
+def test_round_trip_merges_segments(store):
+    tenant = _tenant()
+    _ingest(tenant, "birds.txt")
+    assert store.save(tenant) == 2
+    _ingest(tenant, "cafés.txt")
+    assert store.save(tenant) == 3
+    assert len(store._read_manifest(store._dir("t"))["segments"]) == 2
+
+    restored = _tenant()
+    assert store.load(restored)
+    assert list(restored.retriever.docs) == TEXTS["birds.txt"] + TEXTS["cafés.txt"]
+    assert restored.retriever.meta.runs(0, 5) == tenant.retriever.meta.runs(0, 5)
+    np.testing.assert_array_equal(restored.retriever.embeddings, tenant.retriever.embeddings)
+    assert _sources(restored, "crème brûlée") == _sources(tenant, "crème brûlée")
+    # two segments are merged into one on restore
+    assert len(store._read_manifest(store._dir("t"))["segments"]) == 1
+
+def test_tombstones_and_compaction_survive_restore(store):
+    tenant = _tenant()
+    _ingest(tenant, "birds.txt")
+    _ingest(tenant, "cafés.txt")
+    store.save(tenant)
+
+    assert tenant.retriever.delete_source("birds.txt") == 2
+    store.save(tenant)
+    restored = _tenant()
+    assert store.load(restored)
+    assert restored.retriever.deleted == 2
+    assert "birds.txt" not in _sources(restored, "falcons nest")
+
+    assert tenant.retriever.compact()
+    store.save(tenant)  # renumbered rows: the snapshot is rewritten in full
+    restored = _tenant()
+    assert store.load(restored)
+    assert list(restored.retriever.docs) == TEXTS["cafés.txt"]
+    assert restored.retriever.deleted == 0
+    assert restored.retriever.generation == tenant.retriever.generation
+
+@pytest.mark.parametrize("damage", ["truncated_text", "bad_magic", "missing_segment", "tenant_mismatch"])
+def test_damaged_snapshot_is_set_aside(store, damage):
+    tenant = _tenant()
+    _ingest(tenant, "cafés.txt")
+    store.save(tenant)
+    path = store._dir("t")
+    base = os.path.join(path, "seg-000001")
+    if damage == "truncated_text":
+        with open(base + ".text.bin", "r+b") as f:
+            f.truncate(10)
+    elif damage == "bad_magic":
+        with open(base + ".emb.npy", "r+b") as f:
+            f.write(b"garbage!")
+    elif damage == "missing_segment":
+        os.remove(base + ".offsets.npy")
+    else:
+        manifest = store._read_manifest(path)
+        store._write_manifest(path, {**manifest, "tenant_id": "someone-else"})
+
+    restored = _tenant()
+    assert not store.load(restored)
+    assert len(restored.retriever.docs) == 0
+    assert not os.path.exists(path)
+    assert [n for n in os.listdir(store.root) if ".unreadable-" in n]
+
+def test_failed_reembed_keeps_snapshot(store, monkeypatch):
+    tenant = _tenant()
+    _ingest(tenant, "birds.txt")
+    store.save(tenant)
+    path = store._dir("t")
+    manifest = store._read_manifest(path)
+    store._write_manifest(path, {**manifest, "embedder": "some-other-model"})
+
+    restored = _tenant()
+
+    def unavailable(texts):
+        raise RuntimeError("model server unavailable")
+    monkeypatch.setattr(restored.retriever, "encode", unavailable)
+    with pytest.raises(RuntimeError):
+        store.load(restored)
+    assert os.path.exists(os.path.join(path, "manifest.json"))
+
+    # once the backend is back the snapshot restores (and is re-embedded)
+    assert store.load(_tenant())
+    assert store._read_manifest(path)["embedder"] == tenant.retriever.model.name
+
+def test_chunkstore_slices_multibyte_rows():
+    texts = TEXTS["cafés.txt"]
+    docs = ChunkStore.from_texts(texts)
+    assert list(docs) == texts
+    assert docs[-1] == texts[-1]
+    assert docs[1:] == texts[1:]
+    arena, offsets = docs.arena(1, 3)
+    assert offsets[0] == 0 and offsets[-1] == len(arena)
+    assert arena.decode("utf-8") == "".join(texts[1:])
+    assert docs.nbytes == sum(len(t.encode()) for t in texts) + 8 * 4
+    with pytest.raises(IndexError):
+        docs[3]
+
+def test_chunkstore_take_then_extend():
+    docs = ChunkStore.from_texts(["α" * 3, "b", "🦉", "dé"])
+    kept = docs.take(np.array([0, 2]))  # what compaction keeps
+    assert list(kept) == ["α" * 3, "🦉"]
+    assert kept.nbytes == len("ααα🦉".encode()) + 8 * 3
+    kept.extend(["new", "ünï"] * 600)  # grows the offsets past their initial capacity
+    assert len(kept) == 1202
+    assert kept[1] == "🦉" and kept[2] == "new" and kept[-1] == "ünï"
+    assert list(docs) == ["α" * 3, "b", "🦉", "dé"]  # the original is untouched
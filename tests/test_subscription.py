@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from core.subscription import Subs
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "subscriptions.db")
+
+def test_records_survive_restart(path):
+    Subs(path).activate("a", "pro")
+    restarted = Subs(path)
+    assert restarted.check("a") == "active"
+    assert restarted.get_plan("a") == "pro"
+    assert restarted.get("a")["stored"]
+
+def test_unknown_agent_gets_defaults(path):
+    s = Subs(path)
+    assert (s.check("nobody"), s.get_plan("nobody")) == ("active", "free")
+    assert not s.get("nobody")["stored"]
+    with pytest.raises(ValueError):
+        s.activate("a", "platinum")
+
+def test_suspend_needs_a_record(path):
+    s = Subs(path)
+    s.suspend("nobody")
+    assert not s.get("nobody")["stored"]
+    s.activate("a", "basic")
+    s.suspend("a")
+    assert s.check("a") == "suspended"
+    assert s.get_plan("a") == "basic"
+
+def test_other_worker_sees_change_within_ttl(path):
+    writer, reader = Subs(path, ttl=0.2), Subs(path, ttl=0.2)
+    writer.activate("a", "basic")
+    assert reader.get_plan("a") == "basic"  # now cached by the reader
+
+    writer.activate("a", "enterprise")
+    assert writer.get_plan("a") == "enterprise"  # own writes are immediate
+    assert reader.get_plan("a") == "basic"  # stale until its TTL runs out
+    time.sleep(0.25)
+    assert reader.get_plan("a") == "enterprise"
+    assert reader.get_limits("a")["documents"] == -1
+
+def test_lookup_racing_a_write_does_not_cache_stale_record(path):
+    s = Subs(path)
+    s.activate("a", "pro")
+    s.records.clear()
+    conn = s._db()
+
+    class RacingConnection:
+        """Lets a suspend commit between a lookup's read and its cache insert."""
+        raced = False
+
+        def execute(self, sql, *args):
+            cur = conn.execute(sql, *args)
+            if sql.startswith("SELECT status, plan") and not self.raced:
+                self.raced = True
+                row = cur.fetchone()
+                s.suspend("a")
+                return type("Cursor", (), {"fetchone": lambda _: row})()
+            return cur
+
+    s._local.conn = RacingConnection()
+    assert s.check("a") == "active"  # the row it read before the suspend
+    s._local.conn = conn
+    assert s.check("a") == "suspended"
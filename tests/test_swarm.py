@@ -0,0 +1,28 @@
+import pytest
+
+from bench.harness import offline_factory
+from core.retriever import chunk_text
+from swarm.presets import DEFAULT_PRESET, PRESETS
+from swarm.session import run
+
+def test_run_rejects_unknown_style():
+    retriever = offline_factory()("t")
+    retriever.add_documents(chunk_text("falcons nest on canyon walls. " * 20), "birds.txt")
+    assert run("where do falcons nest", retriever, style=DEFAULT_PRESET)["explanation"]["preset"] == DEFAULT_PRESET
+    with pytest.raises(ValueError):
+        run("where do falcons nest", retriever, style="scholr")
+
+def test_endpoint_lists_valid_styles(client, agent):
+    agent_id, token = agent
+    r = client.post("/swarm/query", json={
+        "text": "where do falcons nest", "agent_id": agent_id, "token": token, "style": "scholr"
+    })
+    assert r.status_code == 400
+    assert r.json()["detail"].startswith("unknown_style")
+    for name in PRESETS:
+        assert name in r.json()["detail"]
+
+    r = client.post("/swarm/query", json={
+        "text": "where do falcons nest", "agent_id": agent_id, "token": token, "style": DEFAULT_PRESET
+    })
+    assert r.status_code == 200
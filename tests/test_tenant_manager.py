@@ -0,0 +1,54 @@
+import asyncio
+import threading
+import time
+
+from bench.harness import offline_factory
+from tenants.manager import Manager
+
+def _slow_factory(calls, delay=0.2):
+    build = offline_factory()
+
+    def factory(id):
+        calls.append(id)
+        time.sleep(delay)
+        return build(id)
+    return factory
+
+def test_concurrent_get_builds_once():
+    calls = []
+    manager = Manager(_slow_factory(calls), store=None)
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(manager.get("t"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ["t"]
+    assert all(g is got[0] for g in got)
+
+def test_restore_runs_off_the_event_loop(monkeypatch):
+    import main
+
+    calls = []
+    monkeypatch.setattr(main.tm, "factory", _slow_factory(calls, delay=0.3))
+    monkeypatch.setattr(main.tm, "store", None)
+    main.tm.tenants.pop("slow-restore", None)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        tenant = await main._tenant("slow-restore")
+        task.cancel()
+        return tenant, ticks
+
+    tenant, ticks = asyncio.run(run())
+    assert tenant is main.tm.loaded("slow-restore")
+    assert ticks >= 10  # the loop kept running during the 0.3 s build
+    main.tm.tenants.pop("slow-restore", None)
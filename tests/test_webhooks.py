@@ -0,0 +1,184 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import asyncio
+
+import httpx
+import pytest
+
+from functions import retry_queue, webhooks
+from functions.retry_queue import RetryQueue
+from functions.webhooks import Webhooks
+
+class Receiver:
+    """Local webhook endpoint; answers with the queued statuses, then 200."""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.posts = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                receiver.posts.append((dict(self.headers), body))
+                status = receiver.statuses.pop(0) if receiver.statuses else 200
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def events(self):
+        return [e for _, body in self.posts for e in json.loads(body)["events"]]
+
+    def wait(self, n, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while len(self.events()) < n and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return self.events()
+
+@pytest.fixture
+def receiver():
+    r = Receiver()
+    yield r
+    r.server.shutdown()
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(retry_queue, "BACKOFF_BASE", 0.05)
+    monkeypatch.setattr(webhooks, "ALLOW_PRIVATE", True)  # receivers listen on 127.0.0.1
+    return str(tmp_path / "webhooks.db")
+
+def test_queue_leases_retries_and_parks(db, monkeypatch):
+    q = RetryQueue(db, max_attempts=2)
+    q.push([(1, "ingest.complete", "{}"), (2, "ingest.complete", "{}")])
+    items = q.claim(10)
+    assert len(items) == 2
+    assert q.claim(10) == []  # leased
+
+    assert q.retry(items[:1], "HTTP 500") == 0
+    time.sleep(0.06)
+    again = q.claim(10)
+    assert [i["id"] for i in again] == [items[0]["id"]]
+    assert q.retry(again, "HTTP 500") == 1
+    assert q.stats() == {"pending": 1, "retrying": 0, "dead": 1}
+
+    # a worker that died holding a lease: the item comes back when it expires
+    monkeypatch.setattr(retry_queue, "LEASE_SECONDS", 0.05)
+    q2 = RetryQueue(db)
+    q2.db().execute("UPDATE queue SET lease_until = 0")
+    assert len(q2.claim(10)) == 1
+    time.sleep(0.06)
+    assert len(q2.claim(10)) == 1
+
+def test_delivers_signed_batch(db, receiver):
+    hooks = Webhooks(RetryQueue(db))
+    hooks.register(receiver.url, agent="a", events=["ingest.complete"], secret="s3cret")
+    hooks.start()
+    try:
+        assert hooks.emit("ingest.complete", "a", {"filename": "x.txt"}) == 1
+        assert hooks.emit("ingest.complete", "someone-else", {}) == 0
+        assert hooks.emit("balance.low", "a", {}) == 0
+        events = receiver.wait(1)
+    finally:
+        hooks.stop()
+    assert [e["data"] for e in events] == [{"filename": "x.txt"}]
+    headers, body = receiver.posts[0]
+    expected = hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()
+    assert headers["X-Instant-RAG-Signature"] == f"sha256={expected}"
+    assert hooks.queue.stats() == {"pending": 0, "retrying": 0, "dead": 0}
+
+def test_failed_delivery_is_retried(db):
+    receiver = Receiver(statuses=[500, 503])
+    hooks = Webhooks(RetryQueue(db))
+    hooks.register(receiver.url, agent="a", events=["sla.breach"])
+    hooks.start()
+    try:
+        hooks.emit("sla.breach", "a", {"mode": "no_rerank"})
+        deadline = time.monotonic() + 5
+        while len(receiver.posts) < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        hooks.stop()
+        receiver.server.shutdown()
+    assert len(receiver.posts) == 3
+    assert hooks.queue.stats()["pending"] == hooks.queue.stats()["retrying"] == 0
+
+def test_events_queued_while_stopped_survive_restart(db, receiver):
+    first = Webhooks(RetryQueue(db))
+    first.register(receiver.url, events=["ingest.complete"])
+    first.emit("ingest.complete", "a", {"n": 1})
+    first.emit("ingest.complete", "b", {"n": 2})
+    assert first.queue.stats()["pending"] == 2
+
+    restarted = Webhooks(RetryQueue(db))
+    restarted.start()
+    try:
+        events = receiver.wait(2)
+    finally:
+        restarted.stop()
+    assert sorted(e["data"]["n"] for e in events) == [1, 2]
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8000/hook", "http://localhost/hook", "http://10.0.0.5/hook",
+    "http://192.168.1.1/hook", "http://169.254.169.254/latest/meta-data", "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook", "http://100.64.0.1/hook", "http://0.0.0.0/hook",
+    "http://host.invalid/hook", "ftp://93.184.216.34/hook", "http://93.184.216.34:99999/hook",
+])
+def test_register_refuses_private_targets(tmp_path, url):
+    hooks = Webhooks(RetryQueue(str(tmp_path / "webhooks.db")))
+    with pytest.raises(ValueError):
+        hooks.register(url)
+    assert hooks.hooks() == []
+    assert hooks.register("https://93.184.216.34/hook")["id"]
+
+class Client:
+    """Stands in for the worker's pooled client."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.posts = []
+
+    async def post(self, url, **kwargs):
+        self.posts.append(url)
+        if self.error:
+            raise self.error
+        return httpx.Response(200)
+
+def _deliver_once(hooks, client):
+    (hook, items), = hooks._claim()
+    asyncio.run(hooks._deliver(client, hook, items))
+
+def test_unexpected_errors_count_as_attempts(tmp_path, monkeypatch):
+    monkeypatch.setattr(retry_queue, "BACKOFF_BASE", 0)
+    hooks = Webhooks(RetryQueue(str(tmp_path / "webhooks.db"), max_attempts=2))
+    hooks.register("http://93.184.216.34/hook")
+    hooks.emit("ingest.complete", "a", {})
+    client = Client(error=httpx.InvalidURL("bad url"))
+    _deliver_once(hooks, client)
+    assert hooks.queue.stats() == {"pending": 0, "retrying": 1, "dead": 0}
+    _deliver_once(hooks, client)
+    assert hooks.queue.stats() == {"pending": 0, "retrying": 0, "dead": 1}
+    assert hooks._inflight == {1: 0}
+
+def test_delivery_rechecks_the_target(tmp_path, monkeypatch):
+    hooks = Webhooks(RetryQueue(str(tmp_path / "webhooks.db")))
+    hooks.register("http://93.184.216.34/hook")
+    hooks.emit("ingest.complete", "a", {})
+    # the name now resolves somewhere internal
+    hooks._db().execute("UPDATE hooks SET url = 'http://127.0.0.1/hook'")
+    hooks._hooks_at = 0.0
+    client = Client()
+    _deliver_once(hooks, client)
+    assert client.posts == []
+    assert hooks.queue.stats()["retrying"] == 1